@@ -1,5 +1,7 @@
 from django.contrib import admin
-from .models import Category, Supplier, Product, StockMovement, Sale
+from .models import (Category, Supplier, Product, StockMovement, Sale, Job, Reservation, AuditEntry, StockLedgerEntry,
+                     ProductForecast, PurchaseOrder, PurchaseOrderLine, Location, LocationStock, StockTransfer)
+from .services import record_movement, record_sale, transfer_stock
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
@@ -15,21 +17,163 @@ class SupplierAdmin(admin.ModelAdmin):
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'category', 'supplier', 'sku', 'price', 'quantity', 'reorder_level', 'created_at', 'updated_at')
-    list_filter = ('category', 'supplier', 'created_at', 'updated_at')
+    list_display = ('name', 'category', 'supplier', 'sku', 'price', 'quantity', 'reorder_level', 'low_stock', 'created_at', 'updated_at')
+    list_filter = ('low_stock', 'category', 'supplier', 'created_at', 'updated_at')
     search_fields = ('name', 'description', 'sku')
     readonly_fields = ('created_at', 'updated_at')
 
+    def get_readonly_fields(self, request, obj=None):
+        # Opening stock only; later changes are adjustment movements.
+        return self.readonly_fields + (('quantity',) if obj else ())
+
 @admin.register(StockMovement)
 class StockMovementAdmin(admin.ModelAdmin):
-    list_display = ('product', 'movement_type', 'quantity', 'reference_number', 'created_by', 'created_at')
-    list_filter = ('movement_type', 'created_at', 'created_by')
+    list_display = ('product', 'location', 'movement_type', 'quantity', 'reference_number', 'created_by', 'created_at')
+    list_filter = ('movement_type', 'location', 'created_at', 'created_by')
     search_fields = ('product__name', 'reference_number', 'notes')
     readonly_fields = ('created_at',)
 
+    # Saved through the stock service; edits and deletes would leave stock and the ledger behind.
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        record_movement(obj, guard=False)
+
 @admin.register(Sale)
 class SaleAdmin(admin.ModelAdmin):
-    list_display = ('product', 'quantity', 'unit_price', 'total_amount', 'sale_date', 'created_by', 'created_at')
-    list_filter = ('sale_date', 'created_by', 'created_at')
+    list_display = ('product', 'location', 'quantity', 'unit_price', 'total_amount', 'sale_date', 'created_by',
+                    'created_at')
+    list_filter = ('sale_date', 'location', 'created_by', 'created_at')
     search_fields = ('product__name',)
-    readonly_fields = ('total_amount', 'created_at') 
\ No newline at end of file
+    readonly_fields = ('total_amount', 'created_at')
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        record_sale(obj, guard=False)
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('task', 'queue', 'priority', 'status', 'attempts', 'max_attempts', 'run_at', 'created_by', 'created_at', 'finished_at')
+    list_filter = ('status', 'queue', 'task', 'created_at')
+    search_fields = ('task', 'error')
+    readonly_fields = ('locked_by', 'locked_at', 'result', 'error', 'created_at', 'finished_at')
+
+@admin.register(Reservation)
+class ReservationAdmin(admin.ModelAdmin):
+    list_display = ('product', 'quantity', 'status', 'expires_at', 'created_by', 'created_at', 'closed_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('product__name',)
+    readonly_fields = ('product', 'quantity', 'status', 'expires_at', 'sale', 'created_by', 'created_at', 'closed_at')
+
+    def has_add_permission(self, request):
+        return False
+
+@admin.register(AuditEntry)
+class AuditEntryAdmin(admin.ModelAdmin):
+    list_display = ('timestamp', 'action', 'model', 'object_id', 'object_repr', 'actor', 'remote_addr')
+    list_filter = ('action', 'model', 'timestamp')
+    search_fields = ('object_repr',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+class PurchaseOrderLineInline(admin.TabularInline):
+    model = PurchaseOrderLine
+    raw_id_fields = ('product',)
+    extra = 0
+
+@admin.register(PurchaseOrder)
+class PurchaseOrderAdmin(admin.ModelAdmin):
+    list_display = ('__str__', 'supplier', 'status', 'created_by', 'created_at', 'ordered_at', 'received_at')
+    list_filter = ('status', 'created_at')
+    search_fields = ('supplier__name',)
+    list_select_related = ('supplier', 'created_by')
+    readonly_fields = ('status', 'created_by', 'created_at', 'ordered_at', 'received_at')
+    inlines = [PurchaseOrderLineInline]
+
+    def save_model(self, request, obj, form, change):
+        if not change:
+            obj.created_by = request.user
+        super().save_model(request, obj, form, change)
+
+@admin.register(ProductForecast)
+class ProductForecastAdmin(admin.ModelAdmin):
+    list_display = ('product', 'smoothed_demand', 'moving_average', 'days_of_cover', 'reorder_point',
+                    'reorder_quantity', 'computed_at')
+    search_fields = ('product__name', 'product__sku')
+    list_select_related = ('product',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(StockLedgerEntry)
+class StockLedgerEntryAdmin(admin.ModelAdmin):
+    list_display = ('recorded_at', 'product', 'delta', 'kind', 'object_id')
+    list_filter = ('kind', 'recorded_at')
+    search_fields = ('product__name', 'product__sku')
+    list_select_related = ('product',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(Location)
+class LocationAdmin(admin.ModelAdmin):
+    list_display = ('name', 'kind', 'is_default', 'created_at', 'updated_at')
+    list_filter = ('kind',)
+    search_fields = ('name', 'address')
+
+@admin.register(LocationStock)
+class LocationStockAdmin(admin.ModelAdmin):
+    list_display = ('product', 'location', 'quantity')
+    list_filter = ('location',)
+    search_fields = ('product__name', 'product__sku')
+    list_select_related = ('product', 'location')
+
+    # Changed only by stock movements, sales and transfers.
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+@admin.register(StockTransfer)
+class StockTransferAdmin(admin.ModelAdmin):
+    list_display = ('product', 'source', 'destination', 'quantity', 'created_by', 'created_at')
+    list_filter = ('source', 'destination', 'created_at')
+    search_fields = ('product__name', 'notes')
+    list_select_related = ('product', 'source', 'destination', 'created_by')
+    readonly_fields = ('created_by', 'created_at')
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def save_model(self, request, obj, form, change):
+        obj.created_by = request.user
+        transfer_stock(obj)
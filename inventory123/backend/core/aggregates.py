@@ -0,0 +1,299 @@
+"""
+Incrementally maintained dashboard aggregates.
+
+Counters, per-day / per-product-day sales totals and the per-category and
+supplier sales rollups are bumped with single ``F()`` updates as rows are
+written, so the dashboard never scans the Sale, StockMovement or Product
+tables. ``rebuild()`` recomputes everything from the source tables and
+``check()`` reports drift between the two.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+from .models import (
+    Category, Supplier, Product, StockMovement, Sale,
+    InventoryCounter, DailySummary, ProductDailySales, SalesRollup, low_stock_condition
+)
+
+COUNTERS = {
+    'products': lambda: Product.objects.count(),
+    'categories': lambda: Category.objects.count(),
+    'suppliers': lambda: Supplier.objects.count(),
+    'low_stock_products': lambda: Product.objects.filter(low_stock_condition()).count(),
+}
+
+MOVEMENT_FIELDS = {'IN': 'units_in', 'OUT': 'units_out', 'ADJ': 'units_adjusted'}
+
+LOOKUP_BATCH_SIZE = 900
+
+ROLLUP_FIELDS = ('sales_count', 'units_sold', 'revenue', 'cost')
+
+# Sales recorded before Sale.unit_cost existed are costed at the product's current cost_price.
+SALE_COST = Sum(F('quantity') * Coalesce('unit_cost', 'product__cost_price'),
+                output_field=DecimalField(max_digits=14, decimal_places=2))
+
+def _increment(model, lookup, create=True, **deltas):
+    """Add ``deltas`` to the row matching ``lookup``, inserting it first if it is missing."""
+    values = {field: F(field) + value for field, value in deltas.items() if value}
+    if not values:
+        return
+    if model.objects.filter(**lookup).update(**values) or not create:
+        return
+    model.objects.bulk_create([model(**lookup)], ignore_conflicts=True)
+    model.objects.filter(**lookup).update(**values)
+
+def bump_counter(name, delta):
+    _increment(InventoryCounter, {'name': name}, value=delta)
+
+def counters():
+    values = dict.fromkeys(COUNTERS, 0)
+    values.update(InventoryCounter.objects.values_list('name', 'value'))
+    return values
+
+def record_sales(sales, sign=1):
+    """Add (or with ``sign=-1`` remove) sales from the daily and per-product totals."""
+    days = defaultdict(lambda: [0, 0, Decimal(0)])
+    product_days = defaultdict(lambda: [0, 0, Decimal(0)])
+    for sale in sales:
+        date = timezone.localdate(sale.sale_date)
+        for bucket in (days[date], product_days[(sale.product_id, date)]):
+            bucket[0] += sign
+            bucket[1] += sign * sale.quantity
+            bucket[2] += sign * sale.total_amount
+    for date, (count, units, revenue) in days.items():
+        _increment(DailySummary, {'date': date}, create=sign > 0,
+                   sales_count=count, units_sold=units, revenue=revenue)
+    for (product_id, date), (count, units, revenue) in product_days.items():
+        _increment(ProductDailySales, {'product_id': product_id, 'date': date}, create=sign > 0,
+                   sales_count=count, units_sold=units, revenue=revenue)
+    for key, totals in _rollup_groups(sales, sign).items():
+        _record_rollup(key, totals)
+
+def period_start(date, grain):
+    """First day of the week (Monday) or month containing ``date``; ``date`` itself for days."""
+    if grain == SalesRollup.WEEK:
+        return date - timedelta(days=date.weekday())
+    if grain == SalesRollup.MONTH:
+        return date.replace(day=1)
+    return date
+
+def _rollup_groups(sales, sign):
+    """``{(date, category_id, supplier_id): [count, units, revenue, cost]}`` for ``sales``."""
+    product_ids = list({sale.product_id for sale in sales})
+    products = {}
+    for start in range(0, len(product_ids), LOOKUP_BATCH_SIZE):
+        products.update((pk, rest) for pk, *rest in Product.objects.filter(
+            pk__in=product_ids[start:start + LOOKUP_BATCH_SIZE]).values_list(
+            'pk', 'category_id', 'supplier_id', 'cost_price'))
+    groups = defaultdict(lambda: [0, 0, Decimal(0), Decimal(0)])
+    for sale in sales:
+        if sale.product_id not in products:
+            # The product is being deleted; its rollups go with its category and supplier or are rebuilt.
+            continue
+        category_id, supplier_id, cost_price = products[sale.product_id]
+        unit_cost = cost_price if sale.unit_cost is None else sale.unit_cost
+        bucket = groups[(timezone.localdate(sale.sale_date), category_id, supplier_id)]
+        bucket[0] += sign
+        bucket[1] += sign * sale.quantity
+        bucket[2] += sign * sale.total_amount
+        bucket[3] += sign * sale.quantity * unit_cost
+    return groups
+
+def _record_rollup(key, totals):
+    """
+    Add ``totals`` to the day's rollup row. A day already folded into its week
+    and month rows by the compaction (or pruned since) changes those as well.
+    """
+    date, category_id, supplier_id = key
+    deltas = dict(zip(ROLLUP_FIELDS, totals))
+    values = {field: F(field) + value for field, value in deltas.items() if value}
+    if not values:
+        return
+    lookup = {'grain': SalesRollup.DAY, 'start': date, 'category_id': category_id, 'supplier_id': supplier_id}
+    rows = SalesRollup.objects.filter(**lookup)
+    if rows.filter(compacted=False).update(**values):
+        return
+    if rows.filter(compacted=True).update(**values) or deltas['sales_count'] < 0:
+        for grain in (SalesRollup.WEEK, SalesRollup.MONTH):
+            _increment(SalesRollup, {**lookup, 'grain': grain, 'start': period_start(date, grain)},
+                       create=deltas['sales_count'] > 0, **deltas)
+        return
+    _increment(SalesRollup, lookup, **deltas)
+
+def move_product_sales(product_id, old, new):
+    """Move a product's sales between rollups after its ``(category_id, supplier_id)`` changed from ``old`` to ``new``."""
+    days = (Sale.objects.filter(product_id=product_id).order_by().annotate(day=TruncDate('sale_date')).values('day')
+                        .annotate(count=Count('id'), units=Sum('quantity'), revenue=Sum('total_amount'), cost=SALE_COST))
+    for row in days:
+        totals = [row['count'], row['units'], row['revenue'], row['cost']]
+        _record_rollup((row['day'], *old), [-value for value in totals])
+        _record_rollup((row['day'], *new), totals)
+
+def rollup_totals(grain, start=None, end=None, group_by=(), **filters):
+    """
+    ``{(period_start, *group_by values): [count, units, revenue, cost]}`` from
+    the rollups: day rows for ``day``, otherwise the compacted week or month
+    rows plus the days not compacted yet.
+    """
+    rows = SalesRollup.objects.filter(**filters)
+    if start is not None:
+        rows = rows.filter(start__gte=period_start(start, grain))
+    if end is not None:
+        rows = rows.filter(start__lte=end)
+    # Two queries rather than an OR, so each one can use its own index.
+    sources = [rows.filter(grain=grain)]
+    if grain != SalesRollup.DAY:
+        sources.append(rows.filter(grain=SalesRollup.DAY, compacted=False))
+    totals = defaultdict(lambda: [0, 0, Decimal(0), Decimal(0)])
+    for source in sources:
+        for row in (source.order_by().values_list('start', *group_by)
+                          .annotate(*(Sum(field) for field in ROLLUP_FIELDS))):
+            key = (period_start(row[0], grain), *row[1:1 + len(group_by)])
+            for index, value in enumerate(row[1 + len(group_by):]):
+                totals[key][index] += value or 0
+    return totals
+
+def record_movements(movements, sign=1):
+    """Add (or remove) stock movements from the daily in/out/adjustment totals."""
+    days = defaultdict(lambda: defaultdict(int))
+    for movement in movements:
+        date = timezone.localdate(movement.created_at)
+        days[date][MOVEMENT_FIELDS[movement.movement_type]] += sign * movement.quantity
+    for date, deltas in days.items():
+        _increment(DailySummary, {'date': date}, create=sign > 0, **deltas)
+
+def track_low_stock(deltas):
+    """
+    Adjust the low-stock counter after ``{product_id: delta}`` was applied.
+
+    Must run in the same transaction as the stock update so the row lock makes
+    ``quantity - delta`` the exact previous value.
+    """
+    change = 0
+    product_ids = list(deltas)
+    for start in range(0, len(product_ids), LOOKUP_BATCH_SIZE):
+        rows = Product.objects.filter(pk__in=product_ids[start:start + LOOKUP_BATCH_SIZE]).values_list(
+            'pk', 'quantity', 'reorder_level', 'reorder_point')
+        for pk, quantity, reorder_level, reorder_point in rows:
+            threshold = max(reorder_level, reorder_point)
+            change += (quantity <= threshold) - (quantity - deltas[pk] <= threshold)
+    if change:
+        bump_counter('low_stock_products', change)
+
+def _expected():
+    counts = {name: compute() for name, compute in COUNTERS.items()}
+    days = defaultdict(dict)
+    for row in (Sale.objects.order_by().annotate(day=TruncDate('sale_date')).values('day')
+                .annotate(sales_count=Count('id'), units_sold=Sum('quantity'), revenue=Sum('total_amount'))):
+        days[row.pop('day')].update(row)
+    for row in (StockMovement.objects.order_by().annotate(day=TruncDate('created_at')).values('day', 'movement_type')
+                .annotate(units=Sum('quantity'))):
+        days[row['day']][MOVEMENT_FIELDS[row['movement_type']]] = row['units']
+    product_days = {
+        (row.pop('product'), row.pop('day')): row
+        for row in (Sale.objects.order_by().annotate(day=TruncDate('sale_date')).values('product', 'day')
+                    .annotate(sales_count=Count('id'), units_sold=Sum('quantity'), revenue=Sum('total_amount')))
+    }
+    return counts, days, product_days
+
+def _expected_rollups():
+    """``{(date, category_id, supplier_id): [count, units, revenue, cost]}`` from the Sale table."""
+    return {
+        (row['day'], row['product__category'], row['product__supplier']):
+            [row['sales_count'], row['units_sold'], row['revenue'], row['cost']]
+        for row in (Sale.objects.order_by().annotate(day=TruncDate('sale_date'))
+                    .values('day', 'product__category', 'product__supplier')
+                    .annotate(sales_count=Count('id'), units_sold=Sum('quantity'), revenue=Sum('total_amount'),
+                              cost=SALE_COST))
+    }
+
+def _rebuild_rollups():
+    """Compacted rollups as the nightly compaction would have left them."""
+    today = timezone.localdate()
+    retained = today - timedelta(days=settings.SALES_ROLLUP_DAY_RETENTION)
+    rows = defaultdict(lambda: [0, 0, Decimal(0), Decimal(0)])
+    for (date, category_id, supplier_id), totals in _expected_rollups().items():
+        grains = [SalesRollup.DAY] if date >= retained else []
+        if date < today:
+            grains += [SalesRollup.WEEK, SalesRollup.MONTH]
+        for grain in grains:
+            row = rows[(grain, period_start(date, grain), category_id, supplier_id)]
+            for index, value in enumerate(totals):
+                row[index] += value
+    SalesRollup.objects.all().delete()
+    SalesRollup.objects.bulk_create(
+        [SalesRollup(grain=grain, start=start, category_id=category_id, supplier_id=supplier_id,
+                     compacted=grain == SalesRollup.DAY and start < today, **dict(zip(ROLLUP_FIELDS, totals)))
+         for (grain, start, category_id, supplier_id), totals in rows.items()],
+        batch_size=1000)
+
+@transaction.atomic
+def rebuild():
+    """Recompute every aggregate from the source tables."""
+    counts, days, product_days = _expected()
+    InventoryCounter.objects.all().delete()
+    InventoryCounter.objects.bulk_create([InventoryCounter(name=name, value=value) for name, value in counts.items()])
+    DailySummary.objects.all().delete()
+    DailySummary.objects.bulk_create([DailySummary(date=date, **values) for date, values in days.items()],
+                                     batch_size=1000)
+    ProductDailySales.objects.all().delete()
+    ProductDailySales.objects.bulk_create(
+        [ProductDailySales(product_id=product_id, date=date, **values)
+         for (product_id, date), values in product_days.items()],
+        batch_size=1000)
+    _rebuild_rollups()
+
+def check():
+    """Return a list of human-readable differences between the aggregates and the source tables."""
+    counts, days, product_days = _expected()
+    drift = []
+    stored = counters()
+    for name, value in counts.items():
+        if stored[name] != value:
+            drift.append(f'counter {name}: stored {stored[name]}, actual {value}')
+
+    day_fields = ['sales_count', 'units_sold', 'revenue', 'units_in', 'units_out', 'units_adjusted']
+    stored_days = {row.pop('date'): row for row in DailySummary.objects.values('date', *day_fields)}
+    for date in sorted(set(days) | set(stored_days)):
+        for field in day_fields:
+            actual = days.get(date, {}).get(field) or 0
+            value = stored_days.get(date, {}).get(field) or 0
+            if value != actual:
+                drift.append(f'{date} {field}: stored {value}, actual {actual}')
+
+    product_fields = ['sales_count', 'units_sold', 'revenue']
+    stored_product_days = {
+        (row.pop('product'), row.pop('date')): row
+        for row in ProductDailySales.objects.values('product', 'date', *product_fields)
+    }
+    for key in sorted(set(product_days) | set(stored_product_days)):
+        for field in product_fields:
+            actual = product_days.get(key, {}).get(field) or 0
+            value = stored_product_days.get(key, {}).get(field) or 0
+            if value != actual:
+                drift.append(f'product {key[0]} on {key[1]} {field}: stored {value}, actual {actual}')
+
+    # Months cover every compacted and pending day; day rows only the retention window.
+    expected = _expected_rollups()
+    retained = timezone.localdate() - timedelta(days=settings.SALES_ROLLUP_DAY_RETENTION)
+    for grain, stored_rollups in ((SalesRollup.MONTH, rollup_totals(SalesRollup.MONTH, group_by=('category', 'supplier'))),
+                                  (SalesRollup.DAY, rollup_totals(SalesRollup.DAY, start=retained,
+                                                                  group_by=('category', 'supplier')))):
+        actual_rollups = defaultdict(lambda: [0, 0, Decimal(0), Decimal(0)])
+        for (date, category_id, supplier_id), totals in expected.items():
+            if grain == SalesRollup.MONTH or date >= retained:
+                row = actual_rollups[(period_start(date, grain), category_id, supplier_id)]
+                for index, value in enumerate(totals):
+                    row[index] += value
+        for key in sorted(set(actual_rollups) | set(stored_rollups)):
+            for field, value, actual in zip(ROLLUP_FIELDS, stored_rollups.get(key, [0] * 4),
+                                            actual_rollups.get(key, [0] * 4)):
+                if value != actual:
+                    drift.append(f'{grain} rollup {key[0]} category {key[1]} supplier {key[2]} {field}: '
+                                 f'stored {value}, actual {actual}')
+    return drift
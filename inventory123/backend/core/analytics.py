@@ -0,0 +1,126 @@
+"""
+Sales analytics: revenue, units and margin per day, week or month.
+
+Answered from ``SalesRollup`` rows rather than the Sale table. Every sale write
+adds to its day's row for the product's category and supplier (see
+core/aggregates.py); ``compact()``, run nightly as a job, folds finished days
+into week and month rows and drops day rows older than
+``SALES_ROLLUP_DAY_RETENTION`` days. A query therefore reads at most one row
+per period and group, however many sales the period holds. Margins use the
+product's ``cost_price`` at the time of each sale (``Sale.unit_cost``).
+"""
+from collections import defaultdict
+from datetime import timedelta
+from decimal import Decimal
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from .aggregates import ROLLUP_FIELDS, LOOKUP_BATCH_SIZE, _increment, period_start, rollup_totals
+from .models import Category, Supplier, SalesRollup
+
+# Span covered when a query gives no start date.
+DEFAULT_SPANS = {
+    SalesRollup.DAY: timedelta(days=30),
+    SalesRollup.WEEK: timedelta(weeks=12),
+    SalesRollup.MONTH: timedelta(days=365),
+}
+
+GROUPS = {'category': Category, 'supplier': Supplier}
+
+def period_end(date, grain):
+    """Last day of the week or month containing ``date``."""
+    if grain == SalesRollup.WEEK:
+        return period_start(date, grain) + timedelta(days=6)
+    if grain == SalesRollup.MONTH:
+        return (date.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+    return date
+
+def day_history_start():
+    """Earliest date still kept at day resolution."""
+    return timezone.localdate() - timedelta(days=settings.SALES_ROLLUP_DAY_RETENTION)
+
+def _metrics(totals):
+    count, units, revenue, cost = totals
+    margin = revenue - cost
+    return {
+        'sales_count': count,
+        'units_sold': units,
+        'revenue': f'{revenue:.2f}',
+        'cost': f'{cost:.2f}',
+        'margin': f'{margin:.2f}',
+        'margin_percent': round(float(margin / revenue * 100), 2) if revenue else None,
+    }
+
+def sales_analytics(period=SalesRollup.DAY, start=None, end=None, group_by=None, category=None, supplier=None):
+    """
+    Totals and a per-period series for ``start``..``end`` (whole weeks or
+    months for those periods), split by ``group_by`` (``'category'`` or
+    ``'supplier'``) when given. Periods without sales are left out.
+    """
+    end = period_end(end or timezone.localdate(), period)
+    start = period_start(start or end - DEFAULT_SPANS[period], period)
+    filters = {f'{name}_id': value for name, value in (('category', category), ('supplier', supplier))
+               if value is not None}
+    groups = (group_by,) if group_by else ()
+    rows = rollup_totals(period, start, end, group_by=groups, **filters)
+
+    names = {}
+    if group_by:
+        ids = sorted({key[1] for key in rows})
+        for offset in range(0, len(ids), LOOKUP_BATCH_SIZE):
+            names.update(GROUPS[group_by].objects.filter(pk__in=ids[offset:offset + LOOKUP_BATCH_SIZE])
+                                                 .values_list('pk', 'name'))
+    overall = [0, 0, Decimal(0), Decimal(0)]
+    series = []
+    for key, totals in sorted(rows.items()):
+        if not any(totals):
+            continue
+        entry = {'period': key[0]}
+        if group_by:
+            entry.update({group_by: key[1], f'{group_by}_name': names.get(key[1])})
+        entry.update(_metrics(totals))
+        series.append(entry)
+        for index, value in enumerate(totals):
+            overall[index] += value
+    return {
+        'period': period,
+        'start': start,
+        'end': end,
+        'group_by': group_by,
+        'totals': _metrics(overall),
+        'series': series,
+    }
+
+@transaction.atomic
+def compact(today=None):
+    """
+    Fold finished day rollups into their week and month rows, then drop
+    compacted day rows past the retention window.
+
+    The pending rows are locked (PostgreSQL) so a sale recorded meanwhile
+    waits and then lands on the compacted path, which updates the week and
+    month rows too. SQLite serializes the writers instead.
+    """
+    today = today or timezone.localdate()
+    pending = (SalesRollup.objects.select_for_update()
+                              .filter(grain=SalesRollup.DAY, compacted=False, start__lt=today)
+                              .values_list('pk', 'start', 'category_id', 'supplier_id', *ROLLUP_FIELDS))
+    pks = []
+    coarse = defaultdict(lambda: [0, 0, Decimal(0), Decimal(0)])
+    for pk, start, category_id, supplier_id, *totals in pending:
+        pks.append(pk)
+        for grain in (SalesRollup.WEEK, SalesRollup.MONTH):
+            row = coarse[(grain, period_start(start, grain), category_id, supplier_id)]
+            for index, value in enumerate(totals):
+                row[index] += value
+    for (grain, start, category_id, supplier_id), totals in coarse.items():
+        _increment(SalesRollup, {'grain': grain, 'start': start, 'category_id': category_id,
+                                 'supplier_id': supplier_id}, **dict(zip(ROLLUP_FIELDS, totals)))
+    for offset in range(0, len(pks), LOOKUP_BATCH_SIZE):
+        SalesRollup.objects.filter(pk__in=pks[offset:offset + LOOKUP_BATCH_SIZE]).update(compacted=True)
+    # Rows emptied by deleted sales or products moved to another category or supplier.
+    SalesRollup.objects.filter(sales_count=0, units_sold=0, revenue=0, cost=0).exclude(
+        grain=SalesRollup.DAY, compacted=False).delete()
+    pruned, _ = SalesRollup.objects.filter(grain=SalesRollup.DAY, compacted=True,
+                                           start__lt=today - timedelta(days=settings.SALES_ROLLUP_DAY_RETENTION)).delete()
+    return {'compacted': len(pks), 'pruned': pruned}
@@ -0,0 +1,149 @@
+"""
+Async read path for the API dashboard and the catalog list endpoints.
+
+Under an ASGI server (``inventory.asgi``) these views wait on the database
+from the event loop instead of holding a worker thread per request. Django's
+async ORM methods (``aaggregate()``, ``async for``) still send every query of
+a request through one thread, one after another, so ``gather_queries()`` runs
+independent queries on separate pool threads, each with its own connection,
+and awaits them together: the dashboard's aggregates, and a list page's
+``COUNT(*)`` alongside its rows.
+
+Authentication, permissions, throttling, the response cache and rendering
+are the viewset's own, so responses are identical to the synchronous views.
+Inside a transaction (as in tests) the queries run one by one on the
+request's own connection, so they see its uncommitted rows.
+Anything the fast path does not cover (writes, ``?since=``, ``?search=``,
+``?page=last``) is handed to the viewset unchanged.
+"""
+import asyncio
+from asgiref.sync import sync_to_async
+from django.core.paginator import InvalidPage, Page
+from django.db import close_old_connections, connection
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import NotFound
+from rest_framework.response import Response
+from .views import CategoryViewSet, SupplierViewSet, ProductViewSet, DashboardViewSet, DASHBOARD_QUERIES, dashboard_data
+
+def _on_own_connection(func):
+    def call():
+        try:
+            return func()
+        finally:
+            # Pool threads keep their connection between requests for as long as CONN_MAX_AGE allows.
+            close_old_connections()
+    return call
+
+async def gather_queries(*funcs, concurrent=True):
+    """
+    Results of the synchronous ORM callables ``funcs``: run concurrently on
+    separate threads and connections, or with ``concurrent=False`` in turn on
+    the request's thread.
+    """
+    if not concurrent:
+        return [await sync_to_async(func)() for func in funcs]
+    return await asyncio.gather(*(sync_to_async(_on_own_connection(func), thread_sensitive=False)()
+                                  for func in funcs))
+
+class AsyncRead:
+    """
+    Async view for the GET action of a DRF viewset. Other methods, and requests
+    ``serves()`` turns down, go to the viewset's regular view.
+    """
+
+    def __init__(self, viewset_class, actions):
+        self.viewset_class = viewset_class
+        self.actions = actions
+        self.fallback = sync_to_async(viewset_class.as_view(actions))
+
+    def serves(self, request):
+        return request.method == 'GET'
+
+    def prepare(self, view, request):
+        """Synchronous set-up run on the request's thread together with authentication and permission checks."""
+        return None
+
+    async def respond(self, view, request, prepared):
+        """The response; by default the viewset's own handler, run on the request's thread."""
+        handler = getattr(view, request.method.lower())
+        return await sync_to_async(handler)(request, *view.args, **view.kwargs)
+
+    async def dispatch(self, request, *args, **kwargs):
+        if not self.serves(request):
+            return await self.fallback(request, *args, **kwargs)
+        # The same steps as APIView.dispatch, with the handler awaited.
+        view = self.viewset_class(action_map=self.actions, detail=False)
+        for method, action in self.actions.items():
+            setattr(view, method, getattr(view, action))
+        view.args, view.kwargs = args, kwargs
+        view.format_kwarg = None
+        request = view.initialize_request(request, *args, **kwargs)
+        view.request = request
+        view.headers = view.default_response_headers
+        try:
+            prepared = await sync_to_async(self.initial)(view, request, *args, **kwargs)
+            response = await self.respond(view, request, prepared)
+        except Exception as exc:
+            response = view.handle_exception(exc)
+        view.response = view.finalize_response(request, response, *args, **kwargs)
+        return view.response
+
+    def initial(self, view, request, *args, **kwargs):
+        view.initial(request, *args, **kwargs)
+        # Other connections cannot see this one's uncommitted writes.
+        view.concurrent_queries = not connection.in_atomic_block
+        return self.prepare(view, request)
+
+    def as_view(self):
+        @csrf_exempt
+        async def view(request, *args, **kwargs):
+            return await self.dispatch(request, *args, **kwargs)
+        return view
+
+class Dashboard(AsyncRead):
+    async def respond(self, view, request, prepared):
+        results = await gather_queries(*DASHBOARD_QUERIES.values(), concurrent=view.concurrent_queries)
+        return Response(dashboard_data(dict(zip(DASHBOARD_QUERIES, results))))
+
+class CatalogList(AsyncRead):
+    """A page of a cached catalog viewset's ``list``, with the row count queried alongside the rows."""
+
+    def serves(self, request):
+        page = request.GET.get('page', '1')
+        return request.method == 'GET' and set(request.GET) <= {'page'} and page.isdigit() and int(page) > 0
+
+    def prepare(self, view, request):
+        return view.cache_lookup(request)
+
+    async def respond(self, view, request, prepared):
+        key, headers, response = prepared
+        if response is None:
+            response = await sync_to_async(view.cache_store)(key, headers, await self.page(view, request))
+        return response
+
+    async def page(self, view, request):
+        queryset = view.filter_queryset(view.get_queryset())
+        paginator = view.paginator
+        if paginator is None:
+            rows = await sync_to_async(list)(queryset)
+            return Response(view.get_serializer(rows, many=True).data)
+
+        size = paginator.get_page_size(request)
+        number = int(request.query_params.get(paginator.page_query_param, 1))
+        count, rows = await gather_queries(queryset.count, lambda: list(queryset[(number - 1) * size:number * size]),
+                                           concurrent=view.concurrent_queries)
+        pages = paginator.django_paginator_class(queryset, size)
+        pages.count = count
+        try:
+            pages.validate_number(number)
+        except InvalidPage as exc:
+            raise NotFound(paginator.invalid_page_message.format(page_number=number, message=str(exc)))
+        paginator.page = Page(rows, number, pages)
+        paginator.request = request
+        paginator.display_page_controls = paginator.template is not None and pages.num_pages > 1
+        return paginator.get_paginated_response(view.get_serializer(rows, many=True).data)
+
+dashboard = Dashboard(DashboardViewSet, {'get': 'list'}).as_view()
+category_list = CatalogList(CategoryViewSet, {'get': 'list', 'post': 'create'}).as_view()
+supplier_list = CatalogList(SupplierViewSet, {'get': 'list', 'post': 'create'}).as_view()
+product_list = CatalogList(ProductViewSet, {'get': 'list', 'post': 'create'}).as_view()
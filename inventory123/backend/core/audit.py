@@ -0,0 +1,119 @@
+"""
+Audit trail for the catalog and stock models, written in batches off the request thread.
+
+Saves and deletes of Category, Supplier, Product, StockMovement and Sale
+become ``AuditEntry`` rows (signals in core/signals.py). ``record()`` builds
+the entry straight away, with the acting user and client address of the
+current request, but only buffers it once the transaction commits, so a
+rolled-back write leaves no entry. A flusher thread inserts the buffer with
+``bulk_create`` when it reaches ``AUDIT_BATCH_SIZE`` entries, or every
+``AUDIT_FLUSH_SECONDS``. Whatever is still buffered at exit is inserted by an
+atexit hook. If an insert fails, the entries are written as JSON to the
+``inventory.audit`` logger instead, so none is lost.
+"""
+import atexit
+import logging
+import os
+import threading
+from django.conf import settings
+from django.db import DatabaseError, close_old_connections, transaction
+from django.db.models.fields.files import FieldFile
+from django.forms.models import model_to_dict
+from django.utils import timezone
+from .logs import current_request, request_user_id
+from .models import AuditEntry
+
+logger = logging.getLogger(__name__)
+audit_logger = logging.getLogger('inventory.audit')
+
+# Bookkeeping that changes on every save or is derived from other fields.
+EXCLUDED_FIELDS = {'created_at', 'updated_at', 'low_stock', 'image_variants', 'unit_cost', 'total_amount'}
+
+def field_values(instance):
+    values = {}
+    for field in instance._meta.concrete_fields:
+        if field.primary_key or field.name in EXCLUDED_FIELDS:
+            continue
+        value = getattr(instance, field.attname)
+        values[field.name] = value.name or None if isinstance(value, FieldFile) else value
+    return values
+
+def diff(old, new):
+    """``{field: [old, new]}`` for the fields that differ; ``old`` or ``new`` may be ``None``."""
+    before = field_values(old) if old is not None else {}
+    after = field_values(new) if new is not None else {}
+    return {name: [before.get(name), after.get(name)]
+            for name in before.keys() | after.keys() if before.get(name) != after.get(name)}
+
+class Buffer:
+    """Audit entries waiting to be inserted, and the thread that inserts them."""
+
+    def __init__(self):
+        self.entries = []
+        self.lock = threading.Lock()
+        self.wake = threading.Event()
+        self.pid = None
+
+    def add(self, entry):
+        with self.lock:
+            if self.pid != os.getpid():
+                self.start()
+            self.entries.append(entry)
+            full = len(self.entries) >= settings.AUDIT_BATCH_SIZE
+        if full:
+            self.wake.set()
+
+    def start(self):
+        # A forked worker inherits the parent's buffer but not its flusher thread; the parent writes those entries.
+        if self.pid is None:
+            atexit.register(self.flush)
+        self.entries = []
+        self.pid = os.getpid()
+        threading.Thread(target=self.run, name='audit-flush', daemon=True).start()
+
+    def run(self):
+        while True:
+            self.wake.wait(settings.AUDIT_FLUSH_SECONDS)
+            self.wake.clear()
+            try:
+                self.flush()
+            finally:
+                close_old_connections()
+
+    def flush(self):
+        """Insert everything buffered so far; returns how many entries were taken."""
+        with self.lock:
+            entries, self.entries = self.entries, []
+        written = 0
+        try:
+            while written < len(entries):
+                batch = entries[written:written + settings.AUDIT_BATCH_SIZE]
+                AuditEntry.objects.bulk_create(batch)
+                written += len(batch)
+        except DatabaseError:
+            logger.exception('Could not insert %d audit entries; writing them to the audit log instead.',
+                             len(entries) - written)
+            for entry in entries[written:]:
+                audit_logger.warning('%s %s #%s', entry.action, entry.model, entry.object_id,
+                                     extra={'audit': model_to_dict(entry)})
+        return len(entries)
+
+buffer = Buffer()
+
+def record(action, instance, previous=None):
+    """Audit ``action`` on ``instance``; for an update, ``previous`` is the row as it was."""
+    if action == AuditEntry.UPDATE:
+        changes = diff(previous, instance)
+        if not changes:
+            return
+    else:
+        changes = diff(None, instance) if action == AuditEntry.CREATE else diff(instance, None)
+    request = current_request.get()
+    entry = AuditEntry(model=instance._meta.label_lower, object_id=instance.pk, object_repr=str(instance)[:200],
+                       action=action, changes=changes, timestamp=timezone.now(),
+                       actor_id=request_user_id(request) if request is not None else None,
+                       remote_addr=request.META.get('REMOTE_ADDR') if request is not None else None)
+    transaction.on_commit(lambda: buffer.add(entry))
+
+def flush():
+    return buffer.flush()
@@ -0,0 +1,150 @@
+"""
+JWT authentication without a database query per request.
+
+simplejwt's ``JWTAuthentication`` loads the ``User`` row on every request.
+``CachedJWTAuthentication`` keeps recently seen users in a small per-process
+cache for ``AUTH_USER_CACHE_SECONDS``. Entries are checked against the
+``User`` version token in the response cache (core/cache.py), which is bumped
+whenever a user, their groups or a group's permissions change (core/signals.py),
+so every process drops stale users on its next request. A cached user also
+keeps the permissions ``has_perm()`` loaded for it.
+
+With ``JWT_STATELESS_USER`` on, the request user is built from the token's
+``username``, ``is_staff`` and ``is_superuser`` claims and nothing is looked up
+at all. A deactivated or demoted user then keeps access until the access
+token expires, but not past the next refresh: ``TokenRefreshSerializer``
+reloads the user and stamps the new tokens with current claims.
+
+Refresh tokens are checked against the blacklist through the default cache:
+the answer is cached until the token expires and set at once when the token
+is blacklisted, so repeated checks of the same token skip the database.
+"""
+import threading
+import time
+from collections import OrderedDict
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt import serializers
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import get_md5_hash_password
+from .cache import get_versions
+
+# Users kept per process; the least recently used is dropped beyond this.
+USER_CACHE_SIZE = 1000
+
+CLAIMS = ('username', 'is_staff', 'is_superuser')
+
+_users = OrderedDict()
+_users_lock = threading.Lock()
+
+def claims_for(user):
+    return {claim: getattr(user, claim) for claim in CLAIMS}
+
+def cached_user(user_id):
+    """The active user ``user_id``, from the process cache when it is fresh; raises AuthenticationFailed."""
+    version, = get_versions([User])
+    now = time.monotonic()
+    with _users_lock:
+        entry = _users.get(user_id)
+        if entry is not None and entry[0] > now and entry[1] == version:
+            _users.move_to_end(user_id)
+            return entry[2]
+    user = User.objects.filter(**{api_settings.USER_ID_FIELD: user_id}).first()
+    if user is None:
+        raise AuthenticationFailed(_('User not found'), code='user_not_found')
+    if not user.is_active:
+        raise AuthenticationFailed(_('User is inactive'), code='user_inactive')
+    with _users_lock:
+        _users[user_id] = (now + settings.AUTH_USER_CACHE_SECONDS, version, user)
+        _users.move_to_end(user_id)
+        while len(_users) > USER_CACHE_SIZE:
+            _users.popitem(last=False)
+    return user
+
+def forget_users():
+    with _users_lock:
+        _users.clear()
+
+def claims_user(token):
+    """An unsaved ``User`` carrying the token's id and claims; usable as a foreign key value."""
+    user = User(**{api_settings.USER_ID_FIELD: token[api_settings.USER_ID_CLAIM]},
+                **{claim: token[claim] for claim in CLAIMS}, is_active=True)
+    user._state.adding = False
+    user._state.db = DEFAULT_DB_ALIAS
+    return user
+
+class CachedJWTAuthentication(JWTAuthentication):
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken(_('Token contained no recognizable user identification'))
+        # Tokens issued before the claims were added still go through the cache.
+        if settings.JWT_STATELESS_USER and all(claim in validated_token for claim in CLAIMS):
+            return claims_user(validated_token)
+        user = cached_user(user_id)
+        if api_settings.CHECK_REVOKE_TOKEN and (validated_token.get(api_settings.REVOKE_TOKEN_CLAIM)
+                                                != get_md5_hash_password(user.password)):
+            raise AuthenticationFailed(_("The user's password has been changed."), code='password_changed')
+        return user
+
+def _blacklist_key(jti):
+    return f'jwt-blacklisted:{jti}'
+
+class CachedRefreshToken(RefreshToken):
+    if hasattr(RefreshToken, 'check_blacklist'):
+        def check_blacklist(self):
+            jti = self.payload[api_settings.JTI_CLAIM]
+            blacklisted = cache.get(_blacklist_key(jti))
+            if blacklisted is None:
+                try:
+                    super().check_blacklist()
+                    blacklisted = False
+                except TokenError:
+                    blacklisted = True
+                cache.set(_blacklist_key(jti), blacklisted, self.remaining())
+            if blacklisted:
+                raise TokenError(_('Token is blacklisted'))
+
+        def blacklist(self):
+            blacklisted = super().blacklist()
+            cache.set(_blacklist_key(self.payload[api_settings.JTI_CLAIM]), True, self.remaining())
+            return blacklisted
+
+    def remaining(self):
+        return max(int(self.payload['exp'] - time.time()), 1)
+
+class TokenObtainPairSerializer(serializers.TokenObtainPairSerializer):
+    token_class = CachedRefreshToken
+
+    @classmethod
+    def get_token(cls, user):
+        token = super().get_token(user)
+        token.payload.update(claims_for(user))
+        return token
+
+class TokenRefreshSerializer(serializers.TokenRefreshSerializer):
+    token_class = CachedRefreshToken
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs['refresh'])
+        try:
+            user = cached_user(refresh[api_settings.USER_ID_CLAIM])
+        except AuthenticationFailed as exc:
+            raise InvalidToken(exc.detail)
+        refresh.payload.update(claims_for(user))
+        data = {'access': str(refresh.access_token)}
+        if api_settings.ROTATE_REFRESH_TOKENS:
+            if api_settings.BLACKLIST_AFTER_ROTATION and hasattr(refresh, 'blacklist'):
+                refresh.blacklist()
+            refresh.set_jti()
+            refresh.set_exp()
+            refresh.set_iat()
+            data['refresh'] = str(refresh)
+        return data
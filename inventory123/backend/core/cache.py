@@ -0,0 +1,103 @@
+"""
+Version-keyed response cache for read-heavy catalog endpoints.
+
+Every cached model has a version token in the cache. Cache keys (and ETags)
+embed the tokens of all the models a response depends on, so a write only
+has to replace the token (``bump_version``) for every stale entry to become
+unreachable; nothing is ever deleted or scanned.
+"""
+import hashlib
+import time
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework import status
+from rest_framework.response import Response
+
+METRICS = ('hits', 'misses', 'not_modified')
+
+def response_cache():
+    return caches[getattr(settings, 'RESPONSE_CACHE_ALIAS', 'default')]
+
+def _version_key(model):
+    return f'version:{model._meta.label_lower}'
+
+def bump_version(*models):
+    response_cache().set_many({_version_key(model): time.time_ns() for model in models}, timeout=None)
+
+def get_versions(models):
+    cache = response_cache()
+    keys = [_version_key(model) for model in models]
+    versions = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in versions}
+    if missing:
+        # add() keeps whichever process initialised the token first.
+        for key, value in missing.items():
+            cache.add(key, value, timeout=None)
+        versions.update(cache.get_many(list(missing)))
+    return [versions[key] for key in keys]
+
+def record(metric):
+    cache = response_cache()
+    key = f'metrics:{metric}'
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+
+def metrics():
+    values = response_cache().get_many([f'metrics:{metric}' for metric in METRICS])
+    stats = {metric: values.get(f'metrics:{metric}', 0) for metric in METRICS}
+    lookups = stats['hits'] + stats['misses'] + stats['not_modified']
+    stats['hit_ratio'] = round((stats['hits'] + stats['not_modified']) / lookups, 4) if lookups else None
+    return stats
+
+class VersionedCacheMixin:
+    """
+    Caches ``list`` and ``retrieve`` responses under the versions of
+    ``cache_models`` and answers ``If-None-Match`` with 304 Not Modified.
+    """
+    cache_models = ()
+    cache_timeout = 300
+
+    def cache_key(self, request):
+        versions = get_versions(self.cache_models or (self.get_queryset().model,))
+        raw = f'{type(self).__name__}|{self.action}|{request.get_full_path()}|{"|".join(map(str, versions))}'
+        return 'response:' + hashlib.sha1(raw.encode()).hexdigest()
+
+    def cache_lookup(self, request):
+        """``(key, headers, response)``, where ``response`` is a 304 or a cache hit, or ``None`` on a miss."""
+        key = self.cache_key(request)
+        etag = f'"{key[-20:]}"'
+        headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+
+        if etag in [tag.strip() for tag in request.headers.get('If-None-Match', '').split(',')]:
+            record('not_modified')
+            return key, headers, Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        data = response_cache().get(key)
+        if data is not None:
+            record('hits')
+            return key, headers, Response(data, headers={**headers, 'X-Cache': 'HIT'})
+
+        record('misses')
+        return key, headers, None
+
+    def cache_store(self, key, headers, response):
+        if response.status_code == status.HTTP_200_OK:
+            response_cache().set(key, response.data, self.cache_timeout)
+            for name, value in {**headers, 'X-Cache': 'MISS'}.items():
+                response[name] = value
+        return response
+
+    def cached(self, request, render):
+        key, headers, response = self.cache_lookup(request)
+        if response is not None:
+            return response
+        return self.cache_store(key, headers, render())
+
+    def list(self, request, *args, **kwargs):
+        return self.cached(request, lambda: super(VersionedCacheMixin, self).list(request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached(request, lambda: super(VersionedCacheMixin, self).retrieve(request, *args, **kwargs))
@@ -0,0 +1,76 @@
+"""
+Streaming CSV / NDJSON exports of sales and stock movement history.
+
+Rows are read with ``values_list().iterator(chunk_size)`` (a server-side
+cursor on PostgreSQL) and written out one chunk at a time, so memory stays
+flat however many rows are exported and no model instances are built.
+"""
+import csv
+from django.core.serializers.json import DjangoJSONEncoder
+from rest_framework.renderers import JSONRenderer
+from .models import StockMovement, Sale
+
+CHUNK_SIZE = 2000
+
+# name -> (model, timestamp field used for ordering and date ranges, exported columns)
+EXPORTS = {
+    'sales': (Sale, 'sale_date', (
+        'id', 'sale_date', 'product_id', 'product__sku', 'product__name', 'location__name', 'quantity',
+        'unit_price', 'total_amount', 'created_by__username',
+    )),
+    'stock-movements': (StockMovement, 'created_at', (
+        'id', 'created_at', 'product_id', 'product__sku', 'product__name', 'location__name', 'movement_type',
+        'quantity', 'reference_number', 'notes', 'created_by__username',
+    )),
+}
+
+def export_rows(name, start=None, end=None, product=None, chunk_size=CHUNK_SIZE):
+    """``(header, rows)`` for an export; ``start`` is inclusive, ``end`` exclusive."""
+    model, field, columns = EXPORTS[name]
+    queryset = model.objects.all()
+    if start is not None:
+        queryset = queryset.filter(**{f'{field}__gte': start})
+    if end is not None:
+        queryset = queryset.filter(**{f'{field}__lt': end})
+    if product is not None:
+        queryset = queryset.filter(product_id=product)
+    header = [column.replace('__', '_') for column in columns]
+    return header, queryset.order_by(field, 'pk').values_list(*columns).iterator(chunk_size=chunk_size)
+
+class _Echo:
+    """File-like object for csv.writer that hands back each line instead of storing it."""
+    def write(self, value):
+        return value
+
+def _chunked(lines, chunk_size):
+    buffer = []
+    for line in lines:
+        buffer.append(line)
+        if len(buffer) >= chunk_size:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+def stream_csv(header, rows, chunk_size=CHUNK_SIZE):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(header)
+    yield from _chunked((writer.writerow(row) for row in rows), chunk_size)
+
+def stream_ndjson(header, rows, chunk_size=CHUNK_SIZE):
+    encoder = DjangoJSONEncoder()
+    yield from _chunked((encoder.encode(dict(zip(header, row))) + '\n' for row in rows), chunk_size)
+
+FORMATS = {
+    'csv': ('text/csv', stream_csv),
+    'ndjson': ('application/x-ndjson', stream_ndjson),
+}
+
+class CSVRenderer(JSONRenderer):
+    """Lets ``?format=csv`` / ``Accept: text/csv`` negotiate; the body is streamed by the view, errors stay JSON."""
+    media_type = 'text/csv'
+    format = 'csv'
+
+class NDJSONRenderer(JSONRenderer):
+    media_type = 'application/x-ndjson'
+    format = 'ndjson'
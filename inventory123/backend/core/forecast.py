@@ -0,0 +1,136 @@
+"""
+Demand forecasts and reorder suggestions.
+
+``run()`` is the nightly job (``FORECAST_AT``). It reads units sold per product
+and day from ``ProductDailySales``, covering the last ``FORECAST_HISTORY_DAYS``
+complete days. Products are handled in chunks of ``CHUNK_SIZE``: one query per
+chunk fills a products x days NumPy matrix, and every figure is computed for
+the whole chunk at once:
+- ``moving_average``: mean daily demand over the last ``FORECAST_WINDOW_DAYS``;
+- ``smoothed_demand``: exponentially smoothed daily demand (``FORECAST_SMOOTHING``);
+- ``reorder_point``: smoothed demand over ``FORECAST_LEAD_TIME_DAYS``, plus
+  ``FORECAST_SAFETY_FACTOR`` standard deviations of lead-time demand as safety stock;
+- ``reorder_quantity``: what to order now to cover the reorder point and
+  ``FORECAST_REVIEW_DAYS`` more of demand;
+- ``days_of_cover``: how long the unreserved stock lasts at the smoothed demand.
+
+A product's figures start at whichever is earlier: its creation or its first
+sale in range. Days before that are not counted as days without sales, so a
+new product's demand is not diluted.
+
+Results are upserted into ``ProductForecast``, and each product's reorder
+point and days of cover are copied onto it in the same transaction. Stock
+writes compare the quantity with the higher of the reorder level and the
+forecast reorder point to keep ``Product.low_stock`` current, so the low-stock
+endpoint, purchase order generation and the dashboard filter on that indexed
+flag alone. The dashboard's "reorder soon" list orders the flagged products by
+their stored days of cover.
+"""
+import numpy as np
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .aggregates import bump_counter
+from .cache import bump_version
+from .models import Product, ProductDailySales, ProductForecast, low_stock_condition
+
+CHUNK_SIZE = 5000
+
+FIELDS = ['moving_average', 'smoothed_demand', 'demand_deviation', 'days_of_cover', 'reorder_point',
+          'reorder_quantity', 'computed_at']
+
+def daily_units(product_ids, first_day, days):
+    """Units sold as a ``len(product_ids)`` x ``days`` matrix, rows in ``product_ids`` order (ascending)."""
+    units = np.zeros((len(product_ids), days), dtype=np.float64)
+    rows = (ProductDailySales.objects.filter(product_id__gte=product_ids[0], product_id__lte=product_ids[-1],
+                                             date__gte=first_day, date__lt=first_day + timedelta(days=days))
+                                     .order_by().values_list('product_id', 'date', 'units_sold'))
+    rows = list(rows)
+    if rows:
+        product, date, sold = zip(*rows)
+        day = (np.array(date, dtype='datetime64[D]') - np.datetime64(first_day, 'D')).astype(np.int64)
+        units[np.searchsorted(product_ids, product), day] = sold
+    return units
+
+def forecast(units, first_index, available):
+    """
+    Forecast figures as arrays, one entry per row of ``units``. ``first_index``
+    is the first day counted for each row; ``available`` is its unreserved stock.
+    """
+    products, days = units.shape
+    alpha = settings.FORECAST_SMOOTHING
+    counted = days - first_index
+    window = min(settings.FORECAST_WINDOW_DAYS, days)
+    recent = units[:, days - window:]
+    window_days = np.minimum(counted, window)
+    moving_average = recent.sum(axis=1) / np.maximum(window_days, 1)
+    in_window = np.arange(days - window, days) >= first_index[:, None]
+    deviation = np.sqrt(((recent - moving_average[:, None]) ** 2 * in_window).sum(axis=1)
+                        / np.maximum(window_days - 1, 1))
+
+    # Adjusted exponential smoothing: the newest day weighs alpha, each older one (1 - alpha) times less. Each row
+    # divides by the weight of the days it counts, so a short history is not pulled towards zero.
+    weights = alpha * (1 - alpha) ** np.arange(days - 1, -1, -1)
+    counted_weight = np.append(np.cumsum(weights[::-1])[::-1], 0)[first_index]
+    smoothed = np.divide(units @ weights, counted_weight, out=np.zeros(products), where=counted_weight > 0)
+
+    lead_time = settings.FORECAST_LEAD_TIME_DAYS
+    reorder_point = np.ceil(smoothed * lead_time + settings.FORECAST_SAFETY_FACTOR * deviation * np.sqrt(lead_time))
+    target = reorder_point + smoothed * settings.FORECAST_REVIEW_DAYS
+    reorder_quantity = np.where(available <= reorder_point, np.maximum(np.ceil(target - available), 0), 0)
+    cover = np.divide(np.maximum(available, 0), smoothed, out=np.full(products, np.nan), where=smoothed > 0)
+    return (moving_average, smoothed, deviation, cover,
+            reorder_point.astype(np.int64), reorder_quantity.astype(np.int64))
+
+def _forecast_chunk(rows, first_day, days, now):
+    product_ids = [pk for pk, _, _ in rows]
+    units = daily_units(product_ids, first_day, days)
+    created = np.array([(timezone.localdate(created_at) - first_day).days for _, created_at, _ in rows])
+    first_sale = np.where(units.any(axis=1), (units > 0).argmax(axis=1), days)
+    first_index = np.clip(np.minimum(created, first_sale), 0, days)
+    available = np.array([available for _, _, available in rows], dtype=np.float64)
+    figures = forecast(units, first_index, available)
+    forecasts = [
+        ProductForecast(product_id=pk, moving_average=float(average), smoothed_demand=float(smoothed),
+                        demand_deviation=float(deviation), days_of_cover=None if np.isnan(cover) else float(cover),
+                        reorder_point=int(point), reorder_quantity=int(quantity), computed_at=now)
+        for pk, average, smoothed, deviation, cover, point, quantity in zip(product_ids, *figures)
+    ]
+    with transaction.atomic():
+        ProductForecast.objects.bulk_create(forecasts, update_conflicts=True, unique_fields=['product'],
+                                            update_fields=FIELDS)
+        _copy_to_products(product_ids[0], product_ids[-1], now)
+    return len(forecasts)
+
+def _copy_to_products(first, last, now):
+    """Copy the forecasts of products ``first``..``last`` onto them and refresh their low-stock flags."""
+    products = Product.objects.filter(pk__gte=first, pk__lte=last)
+    forecasts = ProductForecast.objects.filter(product=OuterRef('pk'))
+    products.update(reorder_point=Coalesce(Subquery(forecasts.values('reorder_point')), Value(0)),
+                    days_of_cover=Subquery(forecasts.values('days_of_cover')))
+    # Conditional updates, so a concurrent stock change is either seen here or sees the new reorder point.
+    flagged = products.filter(low_stock_condition(), low_stock=False).update(low_stock=True, updated_at=now)
+    cleared = products.filter(low_stock=True).exclude(low_stock_condition()).update(low_stock=False, updated_at=now)
+    if flagged != cleared:
+        bump_counter('low_stock_products', flagged - cleared)
+
+def run(today=None):
+    """Recompute every product's forecast from the complete days before ``today``; returns how many were written."""
+    today = today or timezone.localdate()
+    days = settings.FORECAST_HISTORY_DAYS
+    first_day = today - timedelta(days=days)
+    now = timezone.now()
+    written, last = 0, 0
+    while True:
+        rows = list(Product.objects.filter(pk__gt=last).order_by('pk')
+                                   .values_list('pk', 'created_at', 'quantity', 'reserved')[:CHUNK_SIZE])
+        if not rows:
+            break
+        chunk = [(pk, created_at, quantity - reserved) for pk, created_at, quantity, reserved in rows]
+        written += _forecast_chunk(chunk, first_day, days, now)
+        last = rows[-1][0]
+    bump_version(Product)
+    return written
@@ -1,5 +1,19 @@
 from django import forms
-from .models import Product, Category, Supplier, StockMovement, Sale
+from .models import Product, Category, Supplier, StockMovement, Sale, LocationStock
+from .services import default_location_id
+
+class LocationMixin:
+    """Preselects the default location and checks that it holds the stock taken out."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['location'].initial = default_location_id()
+
+    def check_location(self, product, location, removed):
+        held = LocationStock.objects.filter(product=product, location=location).values_list('quantity', flat=True)
+        held = held.first() or 0
+        if removed > held:
+            raise forms.ValidationError(f"Cannot remove {removed} items. Only {held} at {location}.")
 
 class ProductForm(forms.ModelForm):
     class Meta:
@@ -10,6 +24,13 @@ class ProductForm(forms.ModelForm):
             'description': forms.Textarea(attrs={'rows': 3}),
         }
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            # Opening stock only; later changes are adjustment movements.
+            self.fields['quantity'].disabled = True
+            self.fields['quantity'].help_text = 'Record a stock movement to change it.'
+
 class CategoryForm(forms.ModelForm):
     class Meta:
         model = Category
@@ -26,10 +47,10 @@ class SupplierForm(forms.ModelForm):
             'address': forms.Textarea(attrs={'rows': 3}),
         }
 
-class StockMovementForm(forms.ModelForm):
+class StockMovementForm(LocationMixin, forms.ModelForm):
     class Meta:
         model = StockMovement
-        fields = ['product', 'movement_type', 'quantity', 'reference_number', 'notes']
+        fields = ['product', 'location', 'movement_type', 'quantity', 'reference_number', 'notes']
         widgets = {
             'notes': forms.Textarea(attrs={'rows': 3}),
         }
@@ -40,17 +61,25 @@ class StockMovementForm(forms.ModelForm):
         quantity = cleaned_data.get('quantity')
         movement_type = cleaned_data.get('movement_type')
 
-        if product and quantity and movement_type:
-            if movement_type == 'OUT' and quantity > product.quantity:
+        if product and quantity is not None and movement_type:
+            # Adjustments carry the signed change; stock in and out a positive quantity.
+            if movement_type != 'ADJ' and quantity < 1:
+                raise forms.ValidationError("Quantity must be at least 1.")
+            if movement_type == 'ADJ' and quantity == 0:
+                raise forms.ValidationError("An adjustment must change the stock.")
+            removed = quantity if movement_type == 'OUT' else -quantity
+            if removed > product.available:
                 raise forms.ValidationError(
-                    f"Cannot remove {quantity} items. Only {product.quantity} available."
+                    f"Cannot remove {removed} items. Only {product.available} available."
                 )
+            if removed > 0 and cleaned_data.get('location'):
+                self.check_location(product, cleaned_data['location'], removed)
         return cleaned_data
 
-class SaleForm(forms.ModelForm):
+class SaleForm(LocationMixin, forms.ModelForm):
     class Meta:
         model = Sale
-        fields = ['product', 'quantity']
+        fields = ['product', 'location', 'quantity']
 
     def clean(self):
         cleaned_data = super().clean()
@@ -58,9 +87,11 @@ class SaleForm(forms.ModelForm):
         quantity = cleaned_data.get('quantity')
 
         if product and quantity:
-            if quantity > product.quantity:
+            if quantity > product.available:
                 raise forms.ValidationError(
-                    f"Cannot sell {quantity} items. Only {product.quantity} available."
+                    f"Cannot sell {quantity} items. Only {product.available} available."
                 )
+            if cleaned_data.get('location'):
+                self.check_location(product, cleaned_data['location'], quantity)
             cleaned_data['total_price'] = product.price * quantity
         return cleaned_data 
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""
+Resized, metadata-free copies of product images.
+
+Uploading an image only queues a job (see core/tasks.py); the worker writes
+each size in ``VARIANTS`` as JPEG and WebP next to the original and records
+the storage paths in ``Product.image_variants``. EXIF (including GPS), XMP
+and ICC data are not carried over. Pages and the API use the variants and
+fall back to the original until they exist.
+"""
+import os
+from io import BytesIO
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+from .cache import bump_version
+from .models import Product
+
+# name -> (width, height, crop to exactly that size rather than fit within it)
+VARIANTS = {
+    'thumb': (160, 160, True),
+    'medium': (480, 480, False),
+    'large': (1200, 1200, False),
+}
+FORMATS = {
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+
+def variant_urls(product):
+    variants = product.image_variants or {}
+    if not product.image or variants.get('source') != product.image.name:
+        return {}
+    return {size: {fmt: default_storage.url(variants[f'{size}.{fmt}']) for fmt in FORMATS
+                   if f'{size}.{fmt}' in variants}
+            for size in VARIANTS}
+
+def _encode(image, fmt):
+    name, options = FORMATS[fmt]
+    if name == 'JPEG' and image.mode != 'RGB':
+        # JPEG has no alpha channel: flatten onto white instead of letting transparent areas turn black.
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A') if 'A' in image.getbands() else None)
+        image = background
+    buffer = BytesIO()
+    # Nothing passes exif=/icc_profile=, so Pillow writes the pixels without any of the source metadata.
+    image.save(buffer, name, **options)
+    return buffer.getvalue()
+
+def render_variants(source):
+    """``{'<size>.<format>': bytes}`` for an open image file."""
+    with Image.open(source) as original:
+        largest = max(max(width, height) for width, height, _ in VARIANTS.values())
+        # Lets the JPEG decoder scale down while decoding; much cheaper for large camera photos.
+        original.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(original)
+        image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+    rendered = {}
+    for size, (width, height, crop) in VARIANTS.items():
+        if crop:
+            resized = ImageOps.fit(image, (width, height), Image.Resampling.LANCZOS)
+        else:
+            resized = image.copy()
+            resized.thumbnail((width, height), Image.Resampling.LANCZOS)
+        for fmt in FORMATS:
+            rendered[f'{size}.{fmt}'] = _encode(resized, fmt)
+    return rendered
+
+def delete_variants(variants):
+    for key, path in (variants or {}).items():
+        if key != 'source':
+            default_storage.delete(path)
+
+def process_product_image(product_id, source=None):
+    """
+    Generate and store the variants for a product's current image.
+
+    Skips quietly when the image changed since the job was queued (``source``),
+    since a newer job will handle that one.
+    """
+    product = Product.objects.filter(pk=product_id).only('image', 'image_variants').first()
+    if product is None or not product.image or (source and product.image.name != source):
+        return None
+    source = product.image.name
+    stem = os.path.splitext(os.path.basename(source))[0]
+    variants = {'source': source}
+    with default_storage.open(source, 'rb') as stream:
+        rendered = render_variants(stream)
+    for key, data in rendered.items():
+        size, fmt = key.split('.')
+        name = f'products/variants/{product.pk}/{stem}-{size}.{"jpg" if fmt == "jpeg" else fmt}'
+        variants[key] = default_storage.save(name, ContentFile(data))
+
+    # Only record them if the image is still the one we resized.
+    if not Product.objects.filter(pk=product.pk, image=source).update(image_variants=variants,
+                                                                       updated_at=timezone.now()):
+        delete_variants(variants)
+        return None
+    kept = set(variants.values())
+    delete_variants({key: path for key, path in product.image_variants.items() if path not in kept})
+    bump_version(Product)
+    return {'source': source, 'bytes': {key: len(data) for key, data in rendered.items()}}
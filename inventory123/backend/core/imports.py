@@ -0,0 +1,184 @@
+"""
+Bulk product catalog import.
+
+Files are read row by row (CSV, NDJSON or a JSON array) and written in
+chunks: categories and suppliers are resolved by name from an in-memory map
+(missing ones are created in one insert), and products are upserted on
+``sku`` with a single ``bulk_create(update_conflicts=True)`` per chunk.
+Existing products keep their stock quantity; the import only sets it for new
+SKUs, at the default location. Rows that fail validation are reported and skipped.
+"""
+import codecs
+import csv
+import json
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.serializers import ValidationError, as_serializer_error
+from . import ledger
+from .aggregates import LOOKUP_BATCH_SIZE, bump_counter, move_product_sales
+from .cache import bump_version
+from .models import Category, Supplier, LocationStock, Product, StockLedgerEntry, low_stock_condition
+from .serializers import ProductImportRowSerializer
+from .services import default_location_id
+
+# One sku IN-list per chunk.
+CHUNK_SIZE = LOOKUP_BATCH_SIZE
+MAX_REPORTED_ERRORS = 1000
+UPDATE_FIELDS = ['name', 'description', 'category', 'supplier', 'price', 'cost_price', 'reorder_level', 'updated_at']
+
+def iter_csv(stream):
+    """Rows of a binary CSV stream as dicts; blank cells are dropped so optional columns fall back to defaults."""
+    for row in csv.DictReader(codecs.iterdecode(stream, 'utf-8-sig')):
+        yield {key.strip(): value.strip() for key, value in row.items() if key and value and value.strip()}
+
+def iter_json(stream, read_size=1 << 16):
+    """Objects from a binary stream holding a JSON array or newline-delimited JSON, decoded incrementally."""
+    decoder = json.JSONDecoder()
+    text = codecs.getincrementaldecoder('utf-8-sig')()
+    buffer, eof = '', False
+    while True:
+        buffer = buffer.lstrip().lstrip('[,').lstrip()
+        if buffer.startswith(']'):
+            return
+        try:
+            obj, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            if eof:
+                if buffer:
+                    raise
+                return
+            chunk = stream.read(read_size)
+            eof = not chunk
+            buffer += text.decode(chunk, final=eof)
+            continue
+        buffer = buffer[end:]
+        yield obj
+
+PARSERS = {'csv': iter_csv, 'json': iter_json}
+
+def detect_format(filename):
+    return 'csv' if filename.lower().endswith('.csv') else 'json'
+
+class NameMap:
+    """``name -> pk`` for Category or Supplier, loaded once and extended with bulk-created rows."""
+
+    def __init__(self, model, counter, defaults):
+        self.model = model
+        self.counter = counter
+        self.defaults = defaults
+        self.ids = {}
+        self.created = 0
+        # Names are not unique; the oldest row wins, as it would in a name lookup.
+        for pk, name in model.objects.order_by('-pk').values_list('pk', 'name'):
+            self.ids[name.casefold()] = pk
+
+    def resolve(self, names):
+        missing = {name.casefold(): name for name in names if name.casefold() not in self.ids}
+        if missing:
+            created = self.model.objects.bulk_create([self.model(name=name, **self.defaults)
+                                                      for name in missing.values()])
+            if created and created[0].pk is None:
+                created = self.model.objects.filter(name__in=missing.values()).order_by('-pk')
+            for obj in created:
+                self.ids[obj.name.casefold()] = obj.pk
+            self.created += len(missing)
+            bump_counter(self.counter, len(missing))
+        return self.ids
+
+def _upsert(chunk, categories, suppliers):
+    """Write one chunk of validated ``(index, data)`` rows; returns ``(created, updated)``."""
+    skus = [data['sku'] for _, data in chunk]
+    category_ids = categories.resolve({data['category'] for _, data in chunk})
+    supplier_ids = suppliers.resolve({data['supplier'] for _, data in chunk})
+    # sku -> (pk, low_stock, (category_id, supplier_id)) before the upsert.
+    existing = {sku: (pk, low_stock, (category_id, supplier_id)) for sku, pk, low_stock, category_id, supplier_id
+                in Product.objects.filter(sku__in=skus).values_list('sku', 'pk', 'low_stock', 'category', 'supplier')}
+
+    now = timezone.now()
+    products = []
+    for _, data in chunk:
+        fields = {key: value for key, value in data.items() if key not in ('category', 'supplier')}
+        product = Product(category_id=category_ids[data['category'].casefold()],
+                          supplier_id=supplier_ids[data['supplier'].casefold()], **fields)
+        product.low_stock = product.is_low_stock
+        product.created_at = product.updated_at = now
+        products.append(product)
+    Product.objects.bulk_create(products, update_conflicts=True, unique_fields=['sku'], update_fields=UPDATE_FIELDS)
+    # The upsert sends no signals, so a product that changed category or supplier moves its rollups here.
+    for product in products:
+        if product.sku in existing:
+            pk, _, old = existing[product.sku]
+            if old != (product.category_id, product.supplier_id):
+                move_product_sales(pk, old, (product.category_id, product.supplier_id))
+
+    # Updated rows kept their quantity, so a new reorder level can flip their flag either way.
+    touched = Product.objects.filter(sku__in=skus)
+    touched.filter(low_stock_condition(), low_stock=False).update(low_stock=True)
+    touched.filter(low_stock=True).exclude(low_stock_condition()).update(low_stock=False)
+    opening = list(touched.exclude(sku__in=list(existing)).exclude(quantity=0).values_list('pk', 'quantity'))
+    ledger.append([(pk, quantity, StockLedgerEntry.OPENING, None) for pk, quantity in opening])
+    location_id = default_location_id()
+    LocationStock.objects.bulk_create([LocationStock(product_id=pk, location_id=location_id, quantity=quantity)
+                                       for pk, quantity in opening])
+    created = len(skus) - len(existing)
+    bump_counter('products', created)
+    was_low = sum(low_stock for _, low_stock, _ in existing.values())
+    bump_counter('low_stock_products', touched.filter(low_stock=True).count() - was_low)
+    return created, len(existing)
+
+def _readable(rows, summary):
+    """Yield from ``rows``, turning a parse error into ``summary['detail']`` so the rows before it still count."""
+    try:
+        yield from rows
+    except (ValueError, csv.Error) as exc:
+        summary['detail'] = f'Stopped reading the file: {exc}'
+
+def import_catalog(rows, chunk_size=CHUNK_SIZE):
+    """
+    Validate and upsert product dicts from ``rows``.
+
+    Each chunk commits on its own, so a long import makes steady progress and
+    holds locks briefly. Returns a summary with per-row ``errors`` as
+    ``{'index', 'errors'}`` (at most ``MAX_REPORTED_ERRORS`` of them).
+    """
+    categories = NameMap(Category, 'categories', {'description': ''})
+    suppliers = NameMap(Supplier, 'suppliers', {'contact_person': '', 'email': '', 'phone': '', 'address': ''})
+    summary = {'created': 0, 'updated': 0, 'rejected': 0, 'errors': []}
+
+    def reject(index, errors):
+        summary['rejected'] += 1
+        if len(summary['errors']) < MAX_REPORTED_ERRORS:
+            summary['errors'].append({'index': index, 'errors': errors})
+
+    def flush(chunk):
+        with transaction.atomic():
+            created, updated = _upsert(list(chunk.values()), categories, suppliers)
+        summary['created'] += created
+        summary['updated'] += updated
+
+    # One serializer validates every row: building its fields per row would cost more than the database writes.
+    validator = ProductImportRowSerializer()
+    chunk = {}
+    for index, row in enumerate(_readable(rows, summary)):
+        try:
+            data = validator.run_validation(row)
+        except ValidationError as exc:
+            reject(index, as_serializer_error(exc))
+            continue
+        # The same SKU twice in one upsert is an error on PostgreSQL; the later row wins.
+        previous = chunk.pop(data['sku'], None)
+        if previous is not None:
+            reject(previous[0], {'sku': [f'Duplicate SKU; superseded by row {index}.']})
+        chunk[data['sku']] = (index, data)
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = {}
+    if chunk:
+        flush(chunk)
+
+    summary['errors'].sort(key=lambda error: error['index'])
+    summary['categories_created'] = categories.created
+    summary['suppliers_created'] = suppliers.created
+    if summary['created'] or summary['updated']:
+        transaction.on_commit(lambda: bump_version(Product, Category, Supplier))
+    return summary
@@ -0,0 +1,190 @@
+"""
+Database-backed background jobs.
+
+``enqueue()`` inserts a ``Job`` row; ``manage.py run_jobs`` workers claim and
+run them, so no broker is needed. On PostgreSQL a claim is ``SELECT ... FOR
+UPDATE SKIP LOCKED``, letting any number of workers poll without blocking each
+other. SQLite has no row locks, so a claim there is a conditional ``UPDATE``
+that only one worker can win. Failed jobs are retried with exponential backoff
+until ``max_attempts``; ``JOB_QUEUE_LIMITS`` caps how many jobs of a queue run
+at once across all workers. A running job's lock is renewed every
+``JOB_HEARTBEAT`` seconds, so only a job whose worker died outlives
+``JOB_LOCK_TIMEOUT`` and gets requeued. Tasks registered with ``daily_at`` are queued for
+their next run by the workers themselves (``schedule_daily()``).
+"""
+import hashlib
+import random
+import threading
+import traceback
+from datetime import timedelta
+from django.conf import settings
+from django.db import OperationalError, connection, transaction
+from django.db.models import Count, F, IntegerField, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .models import Job
+
+TASKS = {}
+
+def task(name=None, queue='default', max_attempts=3, daily_at=None):
+    """
+    Register a function as a job task; it is called with the job's ``kwargs``.
+    ``daily_at`` (local ``'HH:MM'``) also runs it every day at that time.
+    """
+    def register(func):
+        func.job_name = name or func.__name__
+        func.job_queue = queue
+        func.job_max_attempts = max_attempts
+        func.job_daily_at = daily_at
+        TASKS[func.job_name] = func
+        return func
+    return register
+
+def enqueue(name, priority=0, run_at=None, user=None, queue=None, **kwargs):
+    func = TASKS[name]
+    return Job.objects.create(task=name, kwargs=kwargs, priority=priority, queue=queue or func.job_queue,
+                              max_attempts=func.job_max_attempts, run_at=run_at or timezone.now(), created_by=user)
+
+def backoff(attempts):
+    """Delay before retry number ``attempts``: doubling from JOB_RETRY_DELAY, capped, with jitter."""
+    base = getattr(settings, 'JOB_RETRY_DELAY', 10)
+    delay = min(base * 2 ** (attempts - 1), getattr(settings, 'JOB_RETRY_MAX_DELAY', 3600))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+def _limits():
+    return getattr(settings, 'JOB_QUEUE_LIMITS', {})
+
+def _running(queue):
+    """Subquery counting the running jobs in ``queue``."""
+    running = (Job.objects.filter(status=Job.RUNNING, queue=queue).order_by().values('queue')
+                          .annotate(count=Count('id')).values('count'))
+    return Coalesce(Subquery(running, output_field=IntegerField()), Value(0))
+
+def _open_queues(queues):
+    """The requested queues that are below their concurrency limit right now."""
+    limits = _limits()
+    limited = [queue for queue in queues if queue in limits]
+    running = dict(Job.objects.filter(status=Job.RUNNING, queue__in=limited).order_by()
+                              .values('queue').annotate(count=Count('id')).values_list('queue', 'count'))
+    return [queue for queue in queues if running.get(queue, 0) < limits.get(queue, float('inf'))]
+
+def advisory_lock(name):
+    """Hold a PostgreSQL advisory lock on ``name`` until the transaction ends; a no-op elsewhere."""
+    if connection.vendor != 'postgresql':
+        return
+    key = int.from_bytes(hashlib.sha1(name.encode()).digest()[:8], 'big', signed=True)
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT pg_advisory_xact_lock(%s)', [key])
+
+def _lock_queues(queues):
+    """Serialize claims on limited queues (PostgreSQL) so two workers cannot both take the last slot."""
+    for queue in sorted(queue for queue in queues if queue in _limits()):
+        advisory_lock(f'jobs:{queue}')
+
+def claim(worker, queues):
+    """Mark the most urgent ready job in ``queues`` as running for ``worker`` and return it, or ``None``."""
+    now = timezone.now()
+    with transaction.atomic():
+        _lock_queues(queues)
+        ready = (Job.objects.filter(status=Job.QUEUED, queue__in=_open_queues(queues), run_at__lte=now)
+                            .order_by('-priority', 'run_at', 'id'))
+        if connection.features.has_select_for_update_skip_locked:
+            candidates = list(ready.select_for_update(skip_locked=True).values_list('pk', 'queue')[:1])
+        else:
+            candidates = list(ready.values_list('pk', 'queue')[:5])
+        for pk, queue in candidates:
+            # Without row locks (SQLite) the conditions in this single UPDATE are what make the claim exclusive.
+            claimable = Job.objects.filter(pk=pk, status=Job.QUEUED)
+            if queue in _limits():
+                claimable = claimable.alias(running=_running(queue)).filter(running__lt=_limits()[queue])
+            if claimable.update(status=Job.RUNNING, locked_by=worker, locked_at=now, attempts=F('attempts') + 1):
+                return Job.objects.get(pk=pk)
+    return None
+
+def _held(job):
+    """``job``'s row while this run of it still holds the lock (a requeued and reclaimed job has more attempts)."""
+    return Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by, attempts=job.attempts)
+
+def _heartbeat(job, done):
+    """Renew ``job``'s lock until ``done`` is set or the lock is lost (see ``requeue_stale``); runs in a thread."""
+    interval = getattr(settings, 'JOB_HEARTBEAT', 60)
+    try:
+        while not done.wait(interval):
+            try:
+                held = _held(job).update(locked_at=timezone.now())
+            except OperationalError:
+                # SQLite allows one writer; a busy database is a reason to try again next beat.
+                continue
+            if not held:
+                return
+    finally:
+        connection.close()
+
+def run(job):
+    """
+    Run a claimed job and record its outcome; failures are requeued with
+    backoff until attempts run out. Tasks should return JSON-serializable data.
+    The outcome is only recorded while the job is still locked by this run, so a
+    run that was requeued as stale cannot overwrite its successor's status.
+    """
+    func = TASKS.get(job.task)
+    done = threading.Event()
+    heartbeat = threading.Thread(target=_heartbeat, args=(job, done), daemon=True)
+    heartbeat.start()
+    try:
+        try:
+            if func is None:
+                raise LookupError(f'Unknown task {job.task!r}')
+            result = func(**job.kwargs)
+        finally:
+            done.set()
+            heartbeat.join()
+    except Exception:
+        now = timezone.now()
+        fields = {'error': traceback.format_exc(), 'locked_by': '', 'locked_at': None}
+        if func is not None and job.attempts < job.max_attempts:
+            fields.update(status=Job.QUEUED, run_at=now + backoff(job.attempts))
+        else:
+            fields.update(status=Job.FAILED, finished_at=now)
+        _held(job).update(**fields)
+    else:
+        _held(job).update(status=Job.SUCCEEDED, result=result, error='', finished_at=timezone.now())
+
+def requeue_stale():
+    """Requeue jobs whose worker died mid-run (no heartbeat for JOB_LOCK_TIMEOUT seconds)."""
+    now = timezone.now()
+    stale = Job.objects.filter(status=Job.RUNNING,
+                               locked_at__lt=now - timedelta(seconds=getattr(settings, 'JOB_LOCK_TIMEOUT', 3600)))
+    # A job that keeps killing its worker must not be retried forever.
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, locked_by='', locked_at=None, finished_at=now, error='Worker stopped responding.')
+    requeued = stale.update(status=Job.QUEUED, locked_by='', locked_at=None, run_at=now)
+    return requeued, failed
+
+def schedule_daily():
+    """
+    Queue the next run of each ``daily_at`` task that has none queued or running.
+    Returns the names of the tasks scheduled.
+    """
+    now = timezone.localtime()
+    scheduled = []
+    for name, func in TASKS.items():
+        if not func.job_daily_at:
+            continue
+        hour, minute = (int(part) for part in func.job_daily_at.split(':'))
+        run_at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if run_at <= now:
+            run_at += timedelta(days=1)
+        pending = Job.objects.filter(task=name, status__in=[Job.QUEUED, Job.RUNNING])
+        if pending.exists():
+            continue
+        # Every worker sweeps, so two may get here at once: the insert and the check run under one lock per task
+        # (PostgreSQL). Inserting first takes SQLite's write lock, so the check then sees a concurrent insert.
+        with transaction.atomic():
+            advisory_lock(f'jobs:daily:{name}')
+            job = enqueue(name, run_at=run_at)
+            if pending.exclude(pk=job.pk).exists():
+                transaction.set_rollback(True)
+                continue
+        scheduled.append(name)
+    return scheduled
@@ -0,0 +1,89 @@
+"""
+Append-only stock ledger.
+
+Every change to ``Product.quantity`` also inserts a ``StockLedgerEntry`` with
+the signed delta, in the same transaction. The changes come from:
+- movements and sales, through core/services.py;
+- reservation commits;
+- products created with stock (including imports).
+A product's quantity is therefore always the sum of its entries, and
+``reconcile()`` checks exactly that.
+
+``take_snapshots()`` runs nightly as a job. For each product whose ledger
+moved since its last snapshot, it stores the quantity as of
+``STOCK_SNAPSHOT_LAG_SECONDS`` ago. The lag lets transactions still open at
+the cutoff commit first. ``quantity_at(product, when)`` then costs an index
+seek for the latest snapshot before ``when`` plus a sum over the entries
+after it, at most about a day's worth.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.db.models import DateTimeField, Exists, F, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from .aggregates import LOOKUP_BATCH_SIZE
+from .models import Product, StockLedgerEntry, StockSnapshot
+
+# Earlier than any entry: where a product without snapshots starts counting.
+EPOCH = Value(datetime(1970, 1, 1, tzinfo=dt_timezone.utc), output_field=DateTimeField())
+
+def append(entries):
+    """Insert ``(product_id, delta, kind, object_id)`` entries; call it in the transaction that changed the stock."""
+    now = timezone.now()
+    StockLedgerEntry.objects.bulk_create([
+        StockLedgerEntry(product_id=product_id, delta=delta, kind=kind, object_id=object_id, recorded_at=now)
+        for product_id, delta, kind, object_id in entries if delta
+    ], batch_size=LOOKUP_BATCH_SIZE)
+
+def quantity_at(product_id, when):
+    """Stock of a product at ``when``, from its latest snapshot before then and the entries since."""
+    snapshot = (StockSnapshot.objects.filter(product_id=product_id, taken_at__lte=when)
+                                     .order_by('-taken_at').values_list('taken_at', 'quantity').first())
+    entries = StockLedgerEntry.objects.filter(product_id=product_id, recorded_at__lte=when)
+    base = 0
+    if snapshot is not None:
+        entries = entries.filter(recorded_at__gt=snapshot[0])
+        base = snapshot[1]
+    return base + (entries.aggregate(total=Sum('delta'))['total'] or 0)
+
+def _snapshot(field, until=None):
+    snapshots = StockSnapshot.objects.filter(product=OuterRef('pk'))
+    if until is not None:
+        snapshots = snapshots.filter(taken_at__lte=until)
+    return Subquery(snapshots.order_by('-taken_at').values(field)[:1])
+
+def ledger_totals(products, until=None, full=False):
+    """
+    ``products`` annotated with ``ledger``: the sum of their entries up to
+    ``until``, counted from the latest snapshot (``snapshot_at``) unless ``full``.
+    """
+    entries = StockLedgerEntry.objects.filter(product=OuterRef('pk'))
+    if until is not None:
+        entries = entries.filter(recorded_at__lte=until)
+    base = Value(0)
+    if not full:
+        products = products.annotate(snapshot_at=Coalesce(_snapshot('taken_at', until), EPOCH))
+        entries = entries.filter(recorded_at__gt=OuterRef('snapshot_at'))
+        base = Coalesce(_snapshot('quantity', until), 0)
+    total = entries.order_by().values('product').annotate(total=Sum('delta')).values('total')
+    return products.annotate(ledger=base + Coalesce(Subquery(total), 0))
+
+def take_snapshots(cutoff=None):
+    """Snapshot every product whose ledger changed since its last snapshot, as of ``cutoff``; returns the count."""
+    cutoff = cutoff or timezone.now() - timedelta(seconds=settings.STOCK_SNAPSHOT_LAG_SECONDS)
+    taken = 0
+    product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+    for offset in range(0, len(product_ids), LOOKUP_BATCH_SIZE):
+        products = ledger_totals(Product.objects.filter(pk__in=product_ids[offset:offset + LOOKUP_BATCH_SIZE]),
+                                 until=cutoff)
+        moved = StockLedgerEntry.objects.filter(product=OuterRef('pk'), recorded_at__gt=OuterRef('snapshot_at'),
+                                                recorded_at__lte=cutoff)
+        rows = products.filter(Exists(moved)).values_list('pk', 'ledger')
+        taken += len(StockSnapshot.objects.bulk_create([
+            StockSnapshot(product_id=pk, taken_at=cutoff, quantity=quantity) for pk, quantity in rows]))
+    return taken
+
+def reconcile(start, stop, full=False):
+    """``(product_id, quantity, ledger)`` for products with ``start <= pk < stop`` whose quantity is off."""
+    products = ledger_totals(Product.objects.filter(pk__gte=start, pk__lt=stop), full=full)
+    return list(products.exclude(quantity=F('ledger')).values_list('pk', 'quantity', 'ledger'))
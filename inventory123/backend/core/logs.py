@@ -0,0 +1,183 @@
+"""
+Logging that keeps file and console I/O off the request thread.
+
+``BackgroundHandler`` is a ``QueueHandler``: ``emit()`` only puts the record
+on a queue, and a ``QueueListener`` thread hands it to the real handler
+(``target``). The listener starts on first use in each process and is
+stopped at exit, which drains the queue, so records logged before a clean
+shutdown are written. If the queue is full, the record is written inline
+rather than dropped.
+
+``JSONFormatter`` writes one JSON object per line. ``AccessLogMiddleware``
+logs one line per request to ``inventory.access``. GETs that succeed on the
+routes in ``ACCESS_LOG_SAMPLE_RATES`` are sampled. Writes, errors and slow
+requests are always logged.
+
+This module is imported while settings are configured, so it must not import models.
+"""
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.utils.functional import SimpleLazyObject, empty
+from django.utils.module_loading import import_string
+
+access_logger = logging.getLogger('inventory.access')
+
+# The request being handled, for code far from the view (audit entries) that wants its user and address.
+current_request = ContextVar('current_request', default=None)
+
+# Attributes every LogRecord has; anything else was passed with extra= and goes into the JSON object.
+RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+class JSONFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'process': record.process,
+        }
+        entry.update((key, value) for key, value in vars(record).items()
+                     if key not in RECORD_ATTRIBUTES and not key.startswith('_'))
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+class BackgroundHandler(QueueHandler):
+    """
+    Queue records for a listener thread that passes them to a ``target``
+    handler, built from its dotted class path and the remaining arguments.
+    """
+
+    def __init__(self, target='logging.StreamHandler', queue_size=10000, **kwargs):
+        super().__init__(queue.Queue(queue_size))
+        self.target = import_string(target)(**kwargs)
+        self.listener = None
+        self.pid = None
+        self.starting = threading.Lock()
+
+    def setFormatter(self, fmt):
+        # Formatting happens on the listener thread, in the target.
+        self.target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Resolve the message now, while its arguments still hold the values they had when logged.
+        record.message = record.getMessage()
+        record.msg, record.args = record.message, None
+        return record
+
+    def enqueue(self, record):
+        if self.pid != os.getpid():
+            self.start()
+        if self.listener is None:
+            # Stopped at exit: whatever is logged later (say, by another atexit hook) is written inline.
+            self.target.handle(record)
+            return
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.target.handle(record)
+
+    def start(self):
+        with self.starting:
+            if self.pid == os.getpid():
+                return
+            # A forked worker inherits the parent's handler but not its listener thread.
+            self.queue = queue.Queue(self.queue.maxsize)
+            self.listener = QueueListener(self.queue, self.target, respect_handler_level=True)
+            self.listener.start()
+            self.pid = os.getpid()
+            atexit.register(self.stop)
+
+    def stop(self):
+        """Write out everything still queued and stop the listener (runs at exit)."""
+        if self.listener is not None and self.pid == os.getpid():
+            self.listener.stop()
+            self.listener = None
+        self.target.flush()
+
+    def close(self):
+        self.stop()
+        self.target.close()
+        super().close()
+
+def request_user_id(request):
+    """The authenticated user's id, without a session lookup if nothing in the request needed the user."""
+    user = getattr(request, 'user', None)
+    if user is None or (isinstance(user, SimpleLazyObject) and user._wrapped is empty):
+        return None
+    return user.pk if user.is_authenticated else None
+
+def sample_rate(request):
+    for prefix, rate in getattr(settings, 'ACCESS_LOG_SAMPLE_RATES', {}).items():
+        if request.path_info.startswith(prefix):
+            return rate
+    return 1.0
+
+class AccessLogMiddleware:
+    """One ``inventory.access`` record per request: method, path, status, duration, user and client address."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        token = current_request.set(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.log(request, response, started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        token = current_request.set(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_request.reset(token)
+        self.log(request, response, started)
+        return response
+
+    def log(self, request, response, started):
+        duration = (time.perf_counter() - started) * 1000
+        if self.should_log(request, response, duration):
+            access_logger.info('%s %s %s', request.method, request.path, response.status_code, extra={
+                'method': request.method,
+                'path': request.path,
+                'query': request.META.get('QUERY_STRING', ''),
+                'status': response.status_code,
+                'duration_ms': round(duration, 2),
+                'user_id': request_user_id(request),
+                'remote_addr': request.META.get('REMOTE_ADDR'),
+                'sample_rate': sample_rate(request) if request.method == 'GET' else 1.0,
+            })
+
+    def should_log(self, request, response, duration):
+        if not access_logger.isEnabledFor(logging.INFO):
+            return False
+        if request.method != 'GET' or response.status_code >= 400 or duration >= settings.ACCESS_LOG_SLOW_MS:
+            return True
+        rate = sample_rate(request)
+        return rate >= 1 or random.random() < rate
@@ -0,0 +1,285 @@
+"""Shared fixtures for the bench_* management commands."""
+import http.client
+import math
+import os
+import random
+import socket
+import statistics
+import subprocess
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+from core import ledger
+from core.aggregates import bump_counter
+from core.cache import bump_version
+from core.models import (Category, Supplier, LocationStock, Product, ProductDailySales, ProductForecast, PurchaseOrder,
+                         PurchaseOrderLine, Reservation, SalesRollup, StockLedgerEntry, StockMovement, StockSnapshot,
+                         StockTransfer, Sale)
+from core.services import default_location_id
+
+class Rollback(Exception):
+    pass
+
+@contextmanager
+def rolled_back():
+    """Run the block in a transaction that is always rolled back."""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+def bench_host():
+    return next((h for h in settings.ALLOWED_HOSTS if h and h != '*'), 'localhost').lstrip('.')
+
+def request_factory():
+    host = bench_host()
+    return APIRequestFactory(SERVER_NAME=host, HTTP_HOST=host)
+
+def api_client(user=None):
+    host = bench_host()
+    client = APIClient(SERVER_NAME=host, HTTP_HOST=host)
+    if user is not None:
+        client.force_authenticate(user)
+    return client
+
+def bench_user():
+    user, _ = User.objects.get_or_create(username='bench')
+    return user
+
+def stock_default_location(products):
+    """Put the bulk-created ``products`` (a queryset) at the default location, as saving them one by one would."""
+    location_id = default_location_id()
+    LocationStock.objects.bulk_create([LocationStock(product_id=pk, location_id=location_id, quantity=quantity)
+                                       for pk, quantity in products.values_list('pk', 'quantity').iterator()],
+                                      batch_size=5000)
+
+def seed_catalog(products, quantity=1000000, tag=None):
+    """Bulk-create a category, a supplier and ``products`` products; returns ``(category, supplier, product_ids)``."""
+    tag = tag or f'bench-{time.time_ns()}'
+    category = Category.objects.create(name=tag)
+    supplier = Supplier.objects.create(name=tag, contact_person='-', email='bench@example.com', phone='-', address='-')
+    Product.objects.bulk_create([
+        Product(name=f'{tag}-{n}', description='', category=category, supplier=supplier, sku=f'{tag}-{n}',
+                price=1, cost_price=1, quantity=quantity,
+                low_stock=quantity <= Product._meta.get_field('reorder_level').default)
+        for n in range(products)
+    ], batch_size=1000)
+    bump_counter('products', products)
+    bump_version(Product)
+    if quantity <= Product._meta.get_field('reorder_level').default:
+        bump_counter('low_stock_products', products)
+    stock_default_location(Product.objects.filter(category=category))
+    return category, supplier, list(Product.objects.filter(category=category).values_list('pk', flat=True))
+
+ADJECTIVES = ['blue', 'red', 'heavy', 'compact', 'wireless', 'steel', 'organic', 'premium', 'mini', 'industrial',
+              'classic', 'smart', 'waterproof', 'portable', 'ceramic', 'bamboo', 'carbon', 'vintage', 'digital', 'silent']
+NOUNS = ['widget', 'bracket', 'charger', 'kettle', 'drill', 'lamp', 'cable', 'bottle', 'helmet', 'keyboard',
+         'speaker', 'backpack', 'router', 'blender', 'tripod', 'valve', 'hammer', 'monitor', 'sensor', 'jacket']
+
+def seed_products(category, supplier, count, tag, quantity=100, batch_size=5000):
+    """Bulk-create ``count`` products with word-like names, SKUs and descriptions for search and export benchmarks."""
+    rng = random.Random(count)
+    for start in range(0, count, batch_size):
+        batch = []
+        for n in range(start, min(start + batch_size, count)):
+            adjective, other, noun = rng.choice(ADJECTIVES), rng.choice(ADJECTIVES), rng.choice(NOUNS)
+            batch.append(Product(
+                name=f'{adjective.title()} {other} {noun} {n}', sku=f'{tag[:12]}-{noun[:3].upper()}-{n:07d}',
+                description=f'A {adjective} {noun} for everyday use. ' * rng.randint(1, 6),
+                category=category, supplier=supplier, price=rng.randint(1, 500), cost_price=1, quantity=quantity,
+                low_stock=quantity <= Product._meta.get_field('reorder_level').default))
+        Product.objects.bulk_create(batch)
+    stock_default_location(Product.objects.filter(sku__startswith=f'{tag[:12]}-'))
+    bump_counter('products', count)
+    bump_version(Product)
+
+def seed_history(product_ids, user, sales=0, movements=0, days=365):
+    """Bulk-create sales and stock movements spread over the last ``days`` days (aggregates are not updated)."""
+    now = timezone.now()
+    span = days * 86400
+    location_id = default_location_id()
+    Sale.objects.bulk_create([
+        Sale(product_id=random.choice(product_ids), quantity=1, unit_price=1, total_amount=1, created_by=user,
+             location_id=location_id, sale_date=now - timedelta(seconds=random.randrange(span)))
+        for _ in range(sales)
+    ], batch_size=1000)
+    created = StockMovement.objects.bulk_create([
+        StockMovement(product_id=random.choice(product_ids), movement_type=random.choice(['IN', 'OUT']),
+                      quantity=1, location_id=location_id, created_by=user)
+        for _ in range(movements)
+    ], batch_size=1000)
+    # created_at is auto_now_add; spread it out afterwards so history looks realistic.
+    if created and created[0].pk is None:
+        created = list(StockMovement.objects.order_by('-pk')[:len(created)])
+    for movement in created:
+        movement.created_at = now - timedelta(seconds=random.randrange(span))
+    StockMovement.objects.bulk_update(created, ['created_at'], batch_size=1000)
+
+def seed_dataset(categories, suppliers, products, sales=0, movements=0, tag=None, batch_size=5000):
+    """
+    Bulk-create a synthetic catalog: ``categories`` and ``suppliers`` named
+    ``<tag>-<n>``, ``products`` spread over them at random with 0-200 in stock
+    (some at their reorder level), and ``sales`` and ``movements`` of history.
+    Products get their stock at the default location and an opening ledger
+    entry, as creating them one by one would. Counters and rollups are left to
+    ``aggregates.rebuild()``. Returns ``(tag, product_ids)``.
+    """
+    tag = tag or f'dataset-{time.time_ns()}'
+    rng = random.Random(products)
+    Category.objects.bulk_create([Category(name=f'{tag}-{n}') for n in range(categories)])
+    Supplier.objects.bulk_create([
+        Supplier(name=f'{tag}-{n}', contact_person='-', email='bench@example.com', phone='-', address='-')
+        for n in range(suppliers)])
+    category_ids = list(Category.objects.filter(name__startswith=f'{tag}-').values_list('pk', flat=True))
+    supplier_ids = list(Supplier.objects.filter(name__startswith=f'{tag}-').values_list('pk', flat=True))
+    reorder_level = Product._meta.get_field('reorder_level').default
+    for start in range(0, products, batch_size):
+        batch = []
+        for n in range(start, min(start + batch_size, products)):
+            adjective, noun, quantity = rng.choice(ADJECTIVES), rng.choice(NOUNS), rng.randint(0, 200)
+            batch.append(Product(
+                name=f'{adjective.title()} {noun} {n}', sku=f'{tag}-{n}', description=f'A {adjective} {noun}.',
+                category_id=rng.choice(category_ids), supplier_id=rng.choice(supplier_ids),
+                price=rng.randint(2, 500), cost_price=1, quantity=quantity, low_stock=quantity <= reorder_level))
+        Product.objects.bulk_create(batch)
+    seeded = Product.objects.filter(sku__startswith=f'{tag}-')
+    stock_default_location(seeded)
+    ledger.append([(pk, quantity, StockLedgerEntry.OPENING, None)
+                   for pk, quantity in seeded.values_list('pk', 'quantity').iterator()])
+    product_ids = list(seeded.values_list('pk', flat=True))
+    seed_history(product_ids, bench_user(), sales=sales, movements=movements)
+    bump_version(Category, Supplier, Product)
+    return tag, product_ids
+
+def delete_dataset(tag):
+    """
+    Delete what ``seed_dataset`` created under ``tag``, with everything that
+    refers to it. Rows go with plain DELETE statements, children first: the
+    per-row delete signals (audit entries, tombstones, running totals) take
+    minutes on a large dataset and mean nothing for synthetic data. Rebuild the
+    aggregates afterwards.
+    """
+    products = Product.objects.filter(sku__startswith=f'{tag}-').values('pk')
+    categories = Category.objects.filter(name__startswith=f'{tag}-').values('pk')
+    suppliers = Supplier.objects.filter(name__startswith=f'{tag}-').values('pk')
+    querysets = [model.objects.filter(product__in=products) for model in (
+        StockLedgerEntry, StockSnapshot, LocationStock, ProductDailySales, ProductForecast, Reservation,
+        PurchaseOrderLine, StockMovement, StockTransfer, Sale)]
+    querysets += [
+        PurchaseOrderLine.objects.filter(order__supplier__in=suppliers),
+        PurchaseOrder.objects.filter(supplier__in=suppliers),
+        SalesRollup.objects.filter(Q(category__in=categories) | Q(supplier__in=suppliers)),
+        Product.objects.filter(sku__startswith=f'{tag}-'),
+        Category.objects.filter(name__startswith=f'{tag}-'),
+        Supplier.objects.filter(name__startswith=f'{tag}-'),
+    ]
+    with transaction.atomic():
+        for queryset in querysets:
+            queryset._raw_delete(queryset.db)
+    bump_version(Category, Supplier, Product)
+
+@contextmanager
+def scratch_catalog(products, quantity=1000000):
+    """Create a throwaway category/supplier with ``products`` products and delete it afterwards."""
+    category, supplier, product_ids = seed_catalog(products, quantity)
+    try:
+        yield product_ids
+    finally:
+        category.delete()
+        supplier.delete()
+
+def timed(func, repeat):
+    """Median wall-clock seconds of ``repeat`` calls to ``func``."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - started)
+    return statistics.median(samples)
+
+def rate(count, seconds):
+    return count / seconds if seconds else float('inf')
+
+def percentile(samples, pct):
+    """Nearest-rank ``pct``th percentile of ``samples``."""
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+@contextmanager
+def serving(command, port, env=None, timeout=30):
+    """Run a server process (e.g. gunicorn) for the duration of the block, once it accepts connections on ``port``."""
+    process = subprocess.Popen(command, env={**os.environ, **(env or {})},
+                               stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            if process.poll() is not None:
+                raise RuntimeError(f'{command[0]} exited: {process.stderr.read().decode()[-2000:]}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f'Nothing listening on port {port} after {timeout}s')
+                time.sleep(0.2)
+        yield process
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+def http_load(port, next_path, concurrency, requests, headers=None):
+    """
+    GET ``next_path()`` from 127.0.0.1:``port`` over ``concurrency`` keep-alive
+    connections until ``requests`` responses are in.
+
+    Returns ``(latencies in seconds, Counter of status codes and X-Cache values, wall seconds)``.
+    """
+    headers = {'Host': bench_host(), **(headers or {})}
+    latencies, outcomes = [], Counter()
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def client():
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+        while True:
+            with lock:
+                if remaining[0] <= 0:
+                    break
+                remaining[0] -= 1
+                path = next_path()
+            started = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                outcome = (response.status, response.getheader('X-Cache'))
+            except (OSError, http.client.HTTPException):
+                connection.close()
+                connection = http.client.HTTPConnection('127.0.0.1', port, timeout=60)
+                outcome = ('error', None)
+            elapsed = time.perf_counter() - started
+            with lock:
+                latencies.append(elapsed)
+                outcomes[outcome] += 1
+        connection.close()
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, outcomes, time.perf_counter() - started
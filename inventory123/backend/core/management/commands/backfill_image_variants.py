@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from core.images import process_product_image
+from core.jobs import enqueue
+from core.models import Product
+
+class Command(BaseCommand):
+    help = 'Queue (or with --sync, generate) resized variants for product images that do not have them yet.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sync', action='store_true', help='Resize in this process instead of queueing jobs.')
+        parser.add_argument('--force', action='store_true', help='Regenerate variants that already exist.')
+
+    def handle(self, *args, **options):
+        products = (Product.objects.exclude(image='').exclude(image__isnull=True).order_by('pk')
+                                   .values_list('pk', 'image', 'image_variants'))
+        pending = [(pk, image) for pk, image, variants in products.iterator()
+                   if options['force'] or (variants or {}).get('source') != image]
+        failed = 0
+        for pk, image in pending:
+            if not options['sync']:
+                enqueue('process_product_image', product_id=pk, source=image)
+                continue
+            try:
+                process_product_image(pk, image)
+            except Exception as exc:
+                failed += 1
+                self.stderr.write(f'Product {pk} ({image}): {exc}')
+        action = 'Processed' if options['sync'] else 'Queued'
+        self.stdout.write(self.style.SUCCESS(f'{action} {len(pending) - failed} product image(s), {failed} failed.'))
@@ -0,0 +1,76 @@
+import random
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate, TruncMonth, TruncWeek
+from django.utils import timezone
+from core import aggregates
+from core.aggregates import SALE_COST
+from core.analytics import sales_analytics
+from core.models import Category, Supplier, Product, Sale
+from ._bench import bench_user, rolled_back, seed_history, timed
+
+TRUNCATE = {'day': TruncDate, 'week': TruncWeek, 'month': TruncMonth}
+
+# (period, days back from today, group_by)
+QUERIES = [
+    ('day', 90, None),
+    ('week', 365, 'supplier'),
+    ('month', None, 'category'),
+    ('month', None, None),
+]
+
+def sale_scan(period, start, group_by):
+    """The same figures computed from the Sale table, as the endpoint would without rollups."""
+    groups = [f'product__{group_by}'] if group_by else []
+    return list(Sale.objects.filter(sale_date__date__gte=start).order_by()
+                            .annotate(bucket=TRUNCATE[period]('sale_date')).values('bucket', *groups)
+                            .annotate(count=Count('id'), units=Sum('quantity'), revenue=Sum('total_amount'),
+                                      cost=SALE_COST))
+
+class Command(BaseCommand):
+    help = 'Time the sales analytics endpoint queries on the rollups against scanning the Sale table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sales', type=int, default=1000000)
+        parser.add_argument('--years', type=int, default=3)
+        parser.add_argument('--products', type=int, default=2000)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--suppliers', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            started = time.perf_counter()
+            tag = f'analytics-{time.time_ns()}'
+            categories = Category.objects.bulk_create([Category(name=f'{tag}-{n}')
+                                                       for n in range(options['categories'])])
+            suppliers = Supplier.objects.bulk_create([
+                Supplier(name=f'{tag}-{n}', contact_person='-', email='bench@example.com', phone='-', address='-')
+                for n in range(options['suppliers'])])
+            Product.objects.bulk_create([
+                Product(name=f'{tag}-{n}', description='', sku=f'{tag}-{n}', category=random.choice(categories),
+                        supplier=random.choice(suppliers), price=10, cost_price=random.randint(1, 9), quantity=100)
+                for n in range(options['products'])
+            ], batch_size=1000)
+            product_ids = list(Product.objects.filter(sku__startswith=tag).values_list('pk', flat=True))
+            days = options['years'] * 365
+            seed_history(product_ids, bench_user(), sales=options['sales'], days=days)
+            seeded = time.perf_counter() - started
+            started = time.perf_counter()
+            aggregates.rebuild()
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            self.stdout.write(f'{options["sales"]} sales over {options["years"]} years seeded in {seeded:.1f}s, '
+                              f'rollups built in {time.perf_counter() - started:.1f}s ({connection.vendor})')
+
+            today = timezone.localdate()
+            for period, back, group_by in QUERIES:
+                start = today - timedelta(days=back or days)
+                rollups = timed(lambda: sales_analytics(period, start, today, group_by), options['repeat'])
+                scan = timed(lambda: sale_scan(period, start, group_by), options['repeat'])
+                label = f'{period} by {group_by or "-"}, {back or days} days'
+                self.stdout.write(f'{label:<30} sale scan {scan * 1000:>9.1f} ms   rollups {rollups * 1000:>7.1f} ms   '
+                                  f'({scan / rollups:.0f}x)')
@@ -0,0 +1,65 @@
+import math
+import random
+import sys
+from django.core.management.base import BaseCommand
+from django.db import connection
+from core import aggregates
+from ._bench import bench_user, http_load, percentile, scratch_catalog, seed_history, serving
+
+# name -> (gunicorn arguments, extra environment). Both get the same worker processes; the WSGI side gets one
+# thread per client connection so neither has to queue requests the other could take.
+SERVERS = {
+    'wsgi (sync views)': (lambda workers, concurrency: [
+        'inventory.wsgi:application', '-k', 'gthread', '--workers', str(workers),
+        '--threads', str(math.ceil(concurrency / workers))], {'ASYNC_READ_VIEWS': 'False'}),
+    'asgi (async views)': (lambda workers, concurrency: [
+        'inventory.asgi:application', '-k', 'uvicorn.workers.UvicornWorker', '--workers', str(workers)],
+        {'ASYNC_READ_VIEWS': 'True'}),
+}
+
+class Command(BaseCommand):
+    help = 'Load-test the dashboard and product list under gunicorn WSGI and ASGI (uvicorn) at the same concurrency.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=20000)
+        parser.add_argument('--sales', type=int, default=50000)
+        parser.add_argument('--movements', type=int, default=20000)
+        parser.add_argument('--workers', type=int, default=2, help='Server worker processes.')
+        parser.add_argument('--concurrency', type=int, default=32, help='Client connections.')
+        parser.add_argument('--requests', type=int, default=2000, help='Requests per endpoint and server.')
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        # The servers are separate processes, so the data has to be committed (and is deleted afterwards).
+        with scratch_catalog(options['products'], quantity=100) as product_ids:
+            try:
+                seed_history(product_ids, bench_user(), sales=options['sales'], movements=options['movements'])
+                aggregates.rebuild()
+                pages = max(1, math.ceil(options['products'] / 10))
+                self.stdout.write(f'{options["products"]} products, {options["sales"]} sales ({connection.vendor}); '
+                                  f'{options["workers"]} workers, {options["concurrency"]} connections')
+                rng = random.Random(0)
+                endpoints = {
+                    'dashboard': lambda: '/api/dashboard/',
+                    # Random pages, so most requests miss the response cache and reach the database.
+                    'products': lambda: f'/api/products/?page={rng.randint(1, pages)}',
+                }
+                for server, (arguments, env) in SERVERS.items():
+                    command = [sys.executable, '-m', 'gunicorn', *arguments(options['workers'], options['concurrency']),
+                               '--bind', f'127.0.0.1:{options["port"]}', '--log-level', 'warning']
+                    with serving(command, options['port'], env):
+                        for name, next_path in endpoints.items():
+                            http_load(options['port'], next_path, options['concurrency'], options['concurrency'] * 2)
+                            latencies, outcomes, seconds = http_load(options['port'], next_path,
+                                                                     options['concurrency'], options['requests'])
+                            self.report(server, name, latencies, outcomes, seconds)
+            finally:
+                aggregates.rebuild()
+
+    def report(self, server, name, latencies, outcomes, seconds):
+        errors = sum(count for (code, _), count in outcomes.items() if code != 200)
+        hits = sum(count for (_, cache), count in outcomes.items() if cache == 'HIT')
+        self.stdout.write(f'{server:<20} {name:<10} {len(latencies) / seconds:>8.0f} req/s   '
+                          f'p50 {percentile(latencies, 50) * 1000:>7.1f} ms   '
+                          f'p99 {percentile(latencies, 99) * 1000:>7.1f} ms   '
+                          f'cache hits {hits:>5}   errors {errors}')
@@ -0,0 +1,60 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.request import Request
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from core.auth import CachedJWTAuthentication, TokenObtainPairSerializer, forget_users
+from core.cache import bump_version
+from core.models import Category, Supplier, Product
+from ._bench import bench_host, bench_user, percentile, request_factory, rolled_back
+
+# name -> (authentication class, JWT_STATELESS_USER)
+MODES = {
+    'database lookup': (JWTAuthentication, False),
+    'cached user': (CachedJWTAuthentication, False),
+    'stateless user': (CachedJWTAuthentication, True),
+}
+
+class Command(BaseCommand):
+    help = 'Measure the per-request cost and queries of authenticating an API request with each JWT mode.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=5000)
+        parser.add_argument('--path', default='/api/products/')
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            token = str(TokenObtainPairSerializer.get_token(bench_user()).access_token)
+            headers = {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+            factory = request_factory()
+            self.stdout.write(f'{options["requests"]} authentications ({connection.vendor})')
+            for name, (authentication, stateless) in MODES.items():
+                forget_users()
+                with override_settings(JWT_STATELESS_USER=stateless):
+                    authenticator = authentication()
+                    authenticator.authenticate(Request(factory.get(options['path'], **headers)))
+                    latencies = []
+                    with CaptureQueriesContext(connection) as context:
+                        for _ in range(options['requests']):
+                            request = Request(factory.get(options['path'], **headers))
+                            started = time.perf_counter()
+                            authenticator.authenticate(request)
+                            latencies.append(time.perf_counter() - started)
+                    self.stdout.write(f'{name:<16} p50 {percentile(latencies, 50) * 1e6:>6.1f} us   '
+                                      f'p99 {percentile(latencies, 99) * 1e6:>6.1f} us   '
+                                      f'queries/request {len(context.captured_queries) / options["requests"]:.2f}')
+
+            host = bench_host()
+            client = Client(SERVER_NAME=host, HTTP_HOST=host, **headers)
+            for name, (_, stateless) in list(MODES.items())[1:]:
+                with override_settings(JWT_STATELESS_USER=stateless):
+                    client.get(options['path'])
+                    # A response cache miss, so the count covers the whole request.
+                    bump_version(Category, Supplier, Product)
+                    with CaptureQueriesContext(connection) as context:
+                        response = client.get(options['path'])
+                    auth = [query for query in context.captured_queries if '"auth_user"' in query['sql']]
+                    self.stdout.write(f'GET {options["path"]} ({name}): {response.status_code}, '
+                                      f'{len(context.captured_queries)} queries, {len(auth)} for authentication')
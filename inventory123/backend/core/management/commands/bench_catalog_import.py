@@ -0,0 +1,68 @@
+import csv
+import json
+import os
+import random
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from core import aggregates
+from core.imports import PARSERS, import_catalog
+from ._bench import ADJECTIVES, NOUNS, rolled_back
+
+TARGET_PER_MINUTE = 100000
+COLUMNS = ['sku', 'name', 'description', 'category', 'supplier', 'price', 'cost_price', 'quantity', 'reorder_level']
+
+def catalog_rows(count, tag):
+    rng = random.Random(count)
+    for n in range(count):
+        noun = rng.choice(NOUNS)
+        yield {
+            'sku': f'{tag}-{n:07d}', 'name': f'{rng.choice(ADJECTIVES).title()} {noun} {n}',
+            'description': f'Imported {noun}.', 'category': f'{tag} {noun}s',
+            'supplier': f'{tag} supplier {n % 40}', 'price': f'{rng.randint(100, 99999) / 100:.2f}',
+            'cost_price': '1.00', 'quantity': str(rng.randint(0, 50)), 'reorder_level': '10',
+        }
+
+def write_file(path, file_format, rows):
+    with open(path, 'w', newline='', encoding='utf-8') as out:
+        if file_format == 'csv':
+            writer = csv.DictWriter(out, COLUMNS)
+            writer.writeheader()
+            writer.writerows(rows)
+        else:
+            for row in rows:
+                out.write(json.dumps(row) + '\n')
+
+class Command(BaseCommand):
+    help = f'Time the bulk catalog import (insert and upsert passes) against {TARGET_PER_MINUTE} rows/minute.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000)
+        parser.add_argument('--format', choices=sorted(PARSERS), default='csv')
+
+    def handle(self, *args, **options):
+        count, file_format = options['rows'], options['format']
+        tag = f'imp{time.time_ns() % 10 ** 9}'
+        fd, path = tempfile.mkstemp(suffix=f'.{file_format}')
+        os.close(fd)
+        try:
+            write_file(path, file_format, catalog_rows(count, tag))
+            self.stdout.write(f'{count} rows, {os.path.getsize(path) / 2 ** 20:.1f} MiB {file_format} '
+                              f'({connection.vendor})')
+            with rolled_back():
+                for label in ('insert', 'upsert'):
+                    with open(path, 'rb') as stream:
+                        started = time.perf_counter()
+                        summary = import_catalog(PARSERS[file_format](stream))
+                        elapsed = time.perf_counter() - started
+                    per_minute = count / elapsed * 60
+                    verdict = self.style.SUCCESS('ok') if per_minute >= TARGET_PER_MINUTE else self.style.ERROR('slow')
+                    self.stdout.write(f'{label:<7} {elapsed:>7.1f}s {per_minute:>10.0f} rows/min  {verdict}  '
+                                      f'created {summary["created"]} updated {summary["updated"]} '
+                                      f'rejected {summary["rejected"]}')
+                drift = aggregates.check()
+                if drift:
+                    self.stdout.write(self.style.ERROR('Aggregates drifted: ' + '; '.join(drift)))
+        finally:
+            os.remove(path)
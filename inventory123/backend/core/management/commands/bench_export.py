@@ -0,0 +1,51 @@
+import time
+import tracemalloc
+from django.core.management.base import BaseCommand
+from core.exports import FORMATS, export_rows
+from core.models import StockMovement, Sale
+from core.serializers import SaleSerializer, StockMovementSerializer
+from ._bench import bench_user, rate, rolled_back, seed_catalog, seed_history
+
+def measure(produce):
+    """``(rows, bytes, seconds, peak traced memory in bytes)`` for draining ``produce()``."""
+    started = time.perf_counter()
+    rows, size = produce()
+    elapsed = time.perf_counter() - started
+    # Timed and traced separately: tracemalloc slows allocation-heavy code several times over.
+    tracemalloc.start()
+    produce()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return rows, size, elapsed, peak
+
+class Command(BaseCommand):
+    help = 'Measure throughput and peak memory of the streaming exports against serializing the same rows.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=200000, help='Sales and stock movements to seed.')
+
+    def handle(self, *args, **options):
+        count = options['rows']
+        with rolled_back():
+            _, _, product_ids = seed_catalog(200)
+            seed_history(product_ids, bench_user(), sales=count, movements=count)
+
+            for name, model, serializer_class in (('sales', Sale, SaleSerializer),
+                                                  ('stock-movements', StockMovement, StockMovementSerializer)):
+                rows = model.objects.count()
+                for fmt, (_, stream) in FORMATS.items():
+                    def produce():
+                        header, values = export_rows(name)
+                        return rows, sum(len(chunk) for chunk in stream(header, values))
+                    self.report(f'{name} {fmt} stream', *measure(produce))
+
+                def serialize():
+                    queryset = model.objects.select_related('product', 'created_by')
+                    data = serializer_class(queryset, many=True).data
+                    return len(data), 0
+                self.report(f'{name} serializer', *measure(serialize))
+
+    def report(self, label, rows, size, seconds, peak):
+        written = f'{size / 2 ** 20:>7.1f} MiB' if size else ' ' * 11
+        self.stdout.write(f'{label:<30} {rows:>8} rows {written}  {rate(rows, seconds):>10.0f} rows/s  '
+                          f'peak {peak / 2 ** 20:>8.1f} MiB')
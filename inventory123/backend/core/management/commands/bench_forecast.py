@@ -0,0 +1,87 @@
+import math
+import random
+import time
+from datetime import timedelta
+import numpy as np
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.utils import timezone
+from core import forecast
+from core.models import ProductDailySales, ProductForecast
+from ._bench import rate, rolled_back, seed_catalog
+
+def per_product(product_id, first_day, days):
+    """Moving average and smoothed demand of one product from its own query, as a loop over its days."""
+    sold = dict(ProductDailySales.objects.filter(product_id=product_id, date__gte=first_day,
+                                                 date__lt=first_day + timedelta(days=days))
+                                         .values_list('date', 'units_sold'))
+    series = [sold.get(first_day + timedelta(days=day), 0) for day in range(days)]
+    # Seeded products were created today, so each one starts at its first sale.
+    start = next((day for day, units in enumerate(series) if units), days)
+    alpha = settings.FORECAST_SMOOTHING
+    total = weight = 0
+    for units in series[start:]:
+        total = (1 - alpha) * total + alpha * units
+        weight = (1 - alpha) * weight + alpha
+    window = series[max(start, days - settings.FORECAST_WINDOW_DAYS):]
+    return sum(window) / max(len(window), 1), total / weight if weight else 0
+
+class Command(BaseCommand):
+    help = ('Time the nightly demand forecast over synthetic daily sales, against a query per product, and check '
+            'that both give the same figures.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=100000)
+        parser.add_argument('--days', type=int, default=730, help='Days of sales history to seed.')
+        parser.add_argument('--selling', type=float, default=0.1, help='Share of product-days with sales.')
+        parser.add_argument('--sample', type=int, default=500, help='Products timed with a query each.')
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            started = time.perf_counter()
+            _, _, product_ids = seed_catalog(options['products'], quantity=50)
+            today = timezone.localdate()
+            rows = self.seed_sales(product_ids, today - timedelta(days=options['days']), options)
+            self.stdout.write(f'Seeded {len(product_ids)} products and {rows} product-days of sales '
+                              f'over {options["days"]} days in {time.perf_counter() - started:.1f}s '
+                              f'({connection.vendor}); forecasting from {settings.FORECAST_HISTORY_DAYS} days')
+
+            started = time.perf_counter()
+            written = forecast.run(today)
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'vectorised     {elapsed:>8.1f}s   {rate(written, elapsed):>9.0f} products/s')
+
+            sample = random.sample(product_ids, min(options['sample'], len(product_ids)))
+            first_day = today - timedelta(days=settings.FORECAST_HISTORY_DAYS)
+            started = time.perf_counter()
+            figures = {pk: per_product(pk, first_day, settings.FORECAST_HISTORY_DAYS) for pk in sample}
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'per product    {elapsed * written / len(sample):>8.1f}s   '
+                              f'{rate(len(sample), elapsed):>9.0f} products/s (extrapolated from {len(sample)})')
+
+            stored = ProductForecast.objects.in_bulk(sample)
+            wrong = [pk for pk, (average, smoothed) in figures.items()
+                     if not (math.isclose(stored[pk].moving_average, average, rel_tol=1e-6, abs_tol=1e-9)
+                             and math.isclose(stored[pk].smoothed_demand, smoothed, rel_tol=1e-6, abs_tol=1e-9))]
+            if wrong:
+                raise CommandError(f'{len(wrong)} forecast(s) differ from the per-product computation, e.g. '
+                                   f'product {wrong[0]}.')
+
+    def seed_sales(self, product_ids, first_day, options, chunk=2000):
+        rng = np.random.default_rng()
+        rows = 0
+        for offset in range(0, len(product_ids), chunk):
+            ids = product_ids[offset:offset + chunk]
+            # Each product sells at its own rate, on a random share of days.
+            demand = rng.gamma(1.5, 2.0, size=(len(ids), 1))
+            selling = rng.random((len(ids), options['days'])) < options['selling']
+            units = np.where(selling, rng.poisson(demand, size=selling.shape) + 1, 0)
+            product, day = np.nonzero(units)
+            ProductDailySales.objects.bulk_create([
+                ProductDailySales(product_id=ids[p], date=first_day + timedelta(days=int(d)), units_sold=int(units[p, d]),
+                                  sales_count=1)
+                for p, d in zip(product, day)
+            ], batch_size=5000)
+            rows += len(product)
+        return rows
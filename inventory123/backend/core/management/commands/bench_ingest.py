@@ -0,0 +1,38 @@
+import random
+import time
+from django.core.management.base import BaseCommand
+from ._bench import api_client, bench_user, scratch_catalog, rate
+
+class Command(BaseCommand):
+    help = 'Compare rows/sec of the per-row and bulk stock-movement and sales endpoints.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='Rows sent to the bulk endpoint.')
+        parser.add_argument('--single-rows', type=int, default=300, help='Rows sent one request at a time.')
+        parser.add_argument('--products', type=int, default=200)
+
+    def handle(self, *args, **options):
+        client = api_client(bench_user())
+        with scratch_catalog(options['products']) as product_ids:
+            for url, make_row in (
+                ('/api/stock-movements/', lambda pk: {'product': pk, 'movement_type': random.choice(['IN', 'OUT']),
+                                                      'quantity': random.randint(1, 5)}),
+                ('/api/sales/', lambda pk: {'product': pk, 'quantity': random.randint(1, 5), 'unit_price': '1.00',
+                                            'sale_date': '2024-01-01T00:00:00Z'}),
+            ):
+                rows = [make_row(random.choice(product_ids)) for _ in range(options['single_rows'])]
+                started = time.perf_counter()
+                for row in rows:
+                    response = client.post(url, row, format='json', secure=True)
+                    assert response.status_code == 201, response.content[:200]
+                single = rate(len(rows), time.perf_counter() - started)
+
+                rows = [make_row(random.choice(product_ids)) for _ in range(options['rows'])]
+                started = time.perf_counter()
+                response = client.post(f'{url}bulk/', rows, format='json', secure=True)
+                elapsed = time.perf_counter() - started
+                assert response.status_code == 201, response.content[:200]
+                bulk = rate(response.data['created'], elapsed)
+
+                self.stdout.write(f'{url:<24} per-row {single:>9.0f} rows/s   bulk {bulk:>9.0f} rows/s   '
+                                  f'({bulk / single:.1f}x)')
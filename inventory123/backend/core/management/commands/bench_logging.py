@@ -0,0 +1,84 @@
+import logging
+import os
+import tempfile
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection
+from core.audit import Buffer
+from core.logs import BackgroundHandler, JSONFormatter
+from core.models import AuditEntry
+from ._bench import percentile
+
+BENCH_MODEL = 'bench.entry'
+
+def access_record(n):
+    return logging.makeLogRecord({
+        'name': 'inventory.access', 'levelno': logging.INFO, 'levelname': 'INFO', 'msg': '%s %s %s',
+        'args': ('GET', f'/api/products/{n}/', 200), 'method': 'GET', 'path': f'/api/products/{n}/', 'status': 200,
+        'duration_ms': 1.5, 'user_id': 1, 'remote_addr': '127.0.0.1', 'sample_rate': 1.0,
+    })
+
+def audit_entry(n):
+    return AuditEntry(model=BENCH_MODEL, object_id=n, object_repr=f'bench {n}', action=AuditEntry.UPDATE,
+                      changes={'quantity': [n, n + 1]}, remote_addr='127.0.0.1')
+
+class Command(BaseCommand):
+    help = ('Time what logging and auditing cost the request thread: a FileHandler against the queued '
+            'BackgroundHandler, and an audit insert per write against the batched audit buffer.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--records', type=int, default=20000)
+        parser.add_argument('--writes', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        self.logging(options['records'])
+        self.audit(options['writes'])
+
+    def logging(self, count):
+        self.stdout.write(f'{count} JSON access log records to a file')
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'bench.log')
+            for name, handler in (('FileHandler', logging.FileHandler(path)),
+                                  ('BackgroundHandler', BackgroundHandler('logging.FileHandler', filename=path))):
+                handler.setFormatter(JSONFormatter())
+                latencies = []
+                started = time.perf_counter()
+                for n in range(count):
+                    record = access_record(n)
+                    emitted = time.perf_counter()
+                    handler.handle(record)
+                    latencies.append(time.perf_counter() - emitted)
+                queued = time.perf_counter() - started
+                handler.close()
+                self.stdout.write(f'{name:<18} p50 {percentile(latencies, 50) * 1e6:>6.1f} us   '
+                                  f'p99 {percentile(latencies, 99) * 1e6:>7.1f} us   '
+                                  f'caller {queued:.2f}s   all written {time.perf_counter() - started:.2f}s')
+
+    def audit(self, count):
+        self.stdout.write(f'{count} audited writes ({connection.vendor})')
+        try:
+            latencies = []
+            for n in range(count):
+                started = time.perf_counter()
+                audit_entry(n).save()
+                latencies.append(time.perf_counter() - started)
+            self.stdout.write(f'{"insert per write":<18} p50 {percentile(latencies, 50) * 1e6:>6.1f} us   '
+                              f'p99 {percentile(latencies, 99) * 1e6:>7.1f} us   total {sum(latencies):.2f}s')
+            AuditEntry.objects.filter(model=BENCH_MODEL).delete()
+
+            # Entries are only added, so the flusher thread never starts; the flush below is what it would do.
+            buffer = Buffer()
+            buffer.pid = os.getpid()
+            latencies = []
+            for n in range(count):
+                started = time.perf_counter()
+                buffer.add(audit_entry(n))
+                latencies.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            buffer.flush()
+            flushed = time.perf_counter() - started
+            self.stdout.write(f'{"buffered":<18} p50 {percentile(latencies, 50) * 1e6:>6.1f} us   '
+                              f'p99 {percentile(latencies, 99) * 1e6:>7.1f} us   total {sum(latencies):.2f}s   '
+                              f'batch inserts {flushed:.2f}s off the request thread')
+        finally:
+            AuditEntry.objects.filter(model=BENCH_MODEL).delete()
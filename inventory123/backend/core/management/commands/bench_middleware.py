@@ -0,0 +1,68 @@
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import Client, override_settings
+from rest_framework_simplejwt.tokens import AccessToken
+from core.middleware import metrics, reset_metrics
+from ._bench import bench_host, bench_user, percentile, rolled_back
+
+# name -> settings overrides. "full stack" is what every API request ran before the split.
+STACKS = {
+    'full stack': lambda: {'API_MIDDLEWARE': settings.SITE_MIDDLEWARE},
+    'api stack': lambda: {},
+}
+
+class Command(BaseCommand):
+    help = 'Measure per-request middleware overhead on an API endpoint with the full site stack and the lean API stack.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default='/api/categories/', help='A cheap endpoint, so middleware dominates.')
+        parser.add_argument('--requests', type=int, default=2000)
+        parser.add_argument('--no-session', action='store_true',
+                            help='Do not send a session cookie (by default the client is also logged in to the site, '
+                                 'like a browser that has used the admin).')
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            user = bench_user()
+            user.is_staff = True
+            user.save()
+            # inventory/settings.py saves the session on every request; the API never needs it.
+            with override_settings(SESSION_SAVE_EVERY_REQUEST=True):
+                results = {name: self.run(user, overrides(), options) for name, overrides in STACKS.items()}
+            self.stdout.write(f'{options["requests"]} x GET {options["path"]}'
+                              f'{"" if options["no_session"] else " with a session cookie"}')
+            for name, (latencies, breakdown) in results.items():
+                self.stdout.write(f'{name:<12} p50 {percentile(latencies, 50) * 1e6:>8.0f} us   '
+                                  f'p99 {percentile(latencies, 99) * 1e6:>8.0f} us   '
+                                  f'middleware {sum(ms for layer, ms in breakdown.items() if layer != "app") * 1000:>6.0f} us')
+                for layer, ms in breakdown.items():
+                    self.stdout.write(f'    {ms * 1000:>8.1f} us  {layer}')
+            saved = percentile(results['full stack'][0], 50) - percentile(results['api stack'][0], 50)
+            self.stdout.write(f'Removed per request (p50): {saved * 1e6:.0f} us')
+
+    def run(self, user, overrides, options):
+        host = bench_host()
+        headers = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(user)}'}
+        # Wall-clock latencies without the timing probes, then one more pass with them for the breakdown.
+        with override_settings(**overrides, MIDDLEWARE_TIMING=False):
+            latencies = self.measure(Client(SERVER_NAME=host, HTTP_HOST=host, **headers), user, options)
+        with override_settings(**overrides, MIDDLEWARE_TIMING=True):
+            reset_metrics()
+            self.measure(Client(SERVER_NAME=host, HTTP_HOST=host, **headers), user, options)
+            breakdown = {layer: stats['mean_ms'] for layer, stats in metrics().get('api', {}).items()}
+        return latencies, breakdown
+
+    def measure(self, client, user, options):
+        if not options['no_session']:
+            client.force_login(user)
+        for _ in range(50):
+            client.get(options['path'])
+        latencies = []
+        for _ in range(options['requests']):
+            started = time.perf_counter()
+            response = client.get(options['path'])
+            latencies.append(time.perf_counter() - started)
+            if response.status_code != 200:
+                raise RuntimeError(f'GET {options["path"]} returned {response.status_code}')
+        return latencies
@@ -0,0 +1,50 @@
+import base64
+import json
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.test import force_authenticate
+from core.models import StockMovement, Sale
+from core.views import StockMovementViewSet, SaleViewSet
+from ._bench import bench_user, request_factory, rolled_back, seed_catalog, seed_history, timed
+
+class Command(BaseCommand):
+    help = 'Compare deep-page latency of OFFSET (page number) and keyset (cursor) pagination.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000)
+        parser.add_argument('--page', type=int, default=1000)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        page, repeat = options['page'], options['repeat']
+        page_size = SaleViewSet.pagination_class.page_size
+        if options['rows'] < page * page_size:
+            raise CommandError(f'Need at least {page * page_size} rows to reach page {page}.')
+
+        factory = request_factory()
+        user = bench_user()
+        with rolled_back():
+            _, _, product_ids = seed_catalog(50)
+            seed_history(product_ids, user, sales=options['rows'], movements=options['rows'])
+
+            for viewset, model, url in ((SaleViewSet, Sale, '/api/sales/'),
+                                        (StockMovementViewSet, StockMovement, '/api/stock-movements/')):
+                field = viewset.pagination_class.ordering_field
+                offset_view = viewset.as_view({'get': 'list'}, pagination_class=PageNumberPagination)
+                keyset_view = viewset.as_view({'get': 'list'})
+
+                anchor = model.objects.order_by(f'-{field}', '-pk')[(page - 1) * page_size - 1]
+                cursor = base64.urlsafe_b64encode(
+                    json.dumps([0, getattr(anchor, field).isoformat(), anchor.pk]).encode()).decode()
+
+                def call(view, params):
+                    request = factory.get(url, params)
+                    force_authenticate(request, user)
+                    response = view(request)
+                    response.render()
+                    assert response.status_code == 200, response.status_code
+
+                offset = timed(lambda: call(offset_view, {'page': page}), repeat)
+                keyset = timed(lambda: call(keyset_view, {'cursor': cursor}), repeat)
+                self.stdout.write(f'{url:<24} page {page}: offset {offset * 1000:>8.2f} ms   '
+                                  f'keyset {keyset * 1000:>8.2f} ms   ({offset / keyset:.1f}x)')
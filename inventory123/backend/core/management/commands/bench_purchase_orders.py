@@ -0,0 +1,88 @@
+import math
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Sum
+from core.models import Category, Supplier, Product, ProductForecast, PurchaseOrder, PurchaseOrderLine, StockMovement
+from core.purchasing import due_products, generate, receive
+from core.services import record_movement
+from ._bench import bench_user, rolled_back
+
+def generate_per_product(user):
+    """Generation as a loop: an order per supplier and a line per product, one INSERT each."""
+    orders = {}
+    for product in due_products().select_related('forecast').order_by('supplier_id', 'pk'):
+        if product.supplier_id not in orders:
+            orders[product.supplier_id] = PurchaseOrder.objects.create(supplier_id=product.supplier_id, created_by=user)
+        forecast = getattr(product, 'forecast', None)
+        target = product.reorder_level * 2
+        if forecast is not None and forecast.reorder_point > 0:
+            target = math.ceil(forecast.reorder_point + forecast.smoothed_demand * settings.FORECAST_REVIEW_DAYS)
+        PurchaseOrderLine.objects.create(order=orders[product.supplier_id], product=product,
+                                         quantity=max(target - product.available, 1), unit_cost=product.cost_price)
+    return len(orders)
+
+class Command(BaseCommand):
+    help = ('Time purchase-order generation across many suppliers and receiving a large order, against doing '
+            'the same row by row.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--suppliers', type=int, default=10000)
+        parser.add_argument('--products', type=int, default=5, help='Low-stock products per supplier.')
+        parser.add_argument('--receive', type=int, default=1000, help='Lines on the order received.')
+
+    def handle(self, *args, **options):
+        user = bench_user()
+        self.stdout.write(f'{options["suppliers"]} suppliers x {options["products"]} low-stock products '
+                          f'({connection.vendor})')
+        for name in ('set-based', 'per product'):
+            with rolled_back():
+                category = self.seed(options)
+                started = time.perf_counter()
+                if name == 'set-based':
+                    orders, _ = generate(user)
+                else:
+                    orders = generate_per_product(user)
+                elapsed = time.perf_counter() - started
+                lines = PurchaseOrderLine.objects.count()
+                self.stdout.write(f'generate   {name:<12} {elapsed:>7.2f}s   {orders} orders, {lines} lines')
+                if orders != options['suppliers'] or lines != options['suppliers'] * options['products']:
+                    raise CommandError(f'{name}: expected an order per supplier and a line per product.')
+
+                order = PurchaseOrder.objects.order_by('pk').first()
+                PurchaseOrderLine.objects.filter(
+                    pk__in=PurchaseOrderLine.objects.order_by('pk').values('pk')[:options['receive']]).update(order=order)
+                expected = order.lines.aggregate(units=Sum('quantity'))['units']
+                started = time.perf_counter()
+                if name == 'set-based':
+                    receive(order, user)
+                else:
+                    for line in order.lines.all():
+                        record_movement(StockMovement(product_id=line.product_id, movement_type='IN',
+                                                      quantity=line.quantity, created_by=user))
+                elapsed = time.perf_counter() - started
+                received = StockMovement.objects.filter(product__category=category).aggregate(
+                    units=Sum('quantity'))['units']
+                self.stdout.write(f'receive    {name:<12} {elapsed * 1000:>7.1f}ms  {order.lines.count()} lines')
+                if received != expected:
+                    raise CommandError(f'{name}: received {received} units, the order has {expected}.')
+
+    def seed(self, options):
+        tag = f'po-{time.time_ns()}'
+        category = Category.objects.create(name=tag)
+        suppliers = Supplier.objects.bulk_create([
+            Supplier(name=f'{tag}-{n}', contact_person='-', email='bench@example.com', phone='-', address='-')
+            for n in range(options['suppliers'])], batch_size=1000)
+        if suppliers[0].pk is None:
+            suppliers = list(Supplier.objects.filter(name__startswith=f'{tag}-'))
+        # Only the seeded products are due: the rest of the catalog is left out of the comparison.
+        Product.objects.exclude(category=category).update(low_stock=False, reorder_level=0, reorder_point=0)
+        ProductForecast.objects.all().delete()
+        Product.objects.bulk_create([
+            Product(name=f'{tag}-{supplier.pk}-{n}', description='', sku=f'{tag}-{supplier.pk}-{n}',
+                    category=category, supplier=supplier, price=10, cost_price=4, quantity=n, reorder_level=10,
+                    low_stock=True)
+            for supplier in suppliers for n in range(options['products'])
+        ], batch_size=1000)
+        return category
@@ -0,0 +1,97 @@
+import random
+import threading
+import time
+from collections import Counter
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections, transaction
+from django.db.models import F, Sum
+from core.models import Product, Reservation, Sale
+from core.reservations import ReservationClosed, commit, release, reserve
+from core.services import InsufficientStock, record_sale
+from ._bench import bench_user, percentile, rate, scratch_catalog
+
+def locked_checkout(product_id, quantity, user, think):
+    """The alternative to reservations: lock the product row for the whole checkout, payment included."""
+    with transaction.atomic():
+        # A no-op UPDATE takes the row lock on PostgreSQL and the write lock on SQLite.
+        Product.objects.filter(pk=product_id).update(reserved=F('reserved'))
+        if Product.objects.get(pk=product_id).available < quantity:
+            raise InsufficientStock(f'Only {quantity} wanted.')
+        time.sleep(think)
+        return record_sale(Sale(product_id=product_id, quantity=quantity, unit_price=1, created_by=user))
+
+def reserved_checkout(product_id, quantity, user, think, abandon):
+    reservation = reserve(product_id, quantity, user)
+    time.sleep(think)
+    if random.random() < abandon:
+        release(reservation)
+        return None
+    return commit(reservation, unit_price=1)
+
+class Command(BaseCommand):
+    help = ('Run concurrent checkouts against one popular product, with reservations and with a row lock held '
+            'through payment, and check that neither oversells.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--checkouts', type=int, default=400, help='Checkouts per mode, across all workers.')
+        parser.add_argument('--stock', type=int, default=300, help='Units on hand; fewer than the checkouts want.')
+        parser.add_argument('--think-ms', type=float, default=20, help='Simulated payment time per checkout.')
+        parser.add_argument('--abandon', type=float, default=0.1, help='Share of reserved checkouts released.')
+
+    def handle(self, *args, **options):
+        user = bench_user()
+        self.stdout.write(f'{options["checkouts"]} checkouts of 1 unit, {options["workers"]} workers, '
+                          f'{options["stock"]} in stock, {options["think_ms"]:.0f} ms payment ({connection.vendor})')
+        think = options['think_ms'] / 1000
+        modes = {
+            'row lock': lambda product_id: locked_checkout(product_id, 1, user, think),
+            'reservations': lambda product_id: reserved_checkout(product_id, 1, user, think, options['abandon']),
+        }
+        for name, checkout in modes.items():
+            with scratch_catalog(1, quantity=options['stock']) as (product_id,):
+                latencies, outcomes, wall = self.run(checkout, product_id, options)
+                product = Product.objects.get(pk=product_id)
+                sold = Sale.objects.filter(product_id=product_id).aggregate(units=Sum('quantity'))['units'] or 0
+                held = Reservation.objects.filter(product_id=product_id, status=Reservation.HELD).count()
+                self.stdout.write(f'{name:<13} {rate(len(latencies), wall):>7.1f} checkouts/s   '
+                                  f'p50 {percentile(latencies, 50) * 1000:>7.1f} ms   '
+                                  f'p99 {percentile(latencies, 99) * 1000:>7.1f} ms   '
+                                  f'{", ".join(f"{count} {outcome}" for outcome, count in sorted(outcomes.items()))}')
+                if product.quantity < 0 or product.quantity + sold != options['stock'] or product.reserved != held:
+                    raise CommandError(f'{name}: stock is inconsistent: quantity {product.quantity}, sold {sold}, '
+                                       f'reserved {product.reserved} with {held} open holds.')
+
+    def run(self, checkout, product_id, options):
+        latencies, outcomes = [], Counter()
+        lock = threading.Lock()
+        remaining = [options['checkouts']]
+
+        def worker():
+            try:
+                while True:
+                    with lock:
+                        if remaining[0] <= 0:
+                            return
+                        remaining[0] -= 1
+                    started = time.perf_counter()
+                    try:
+                        outcome = 'sold' if checkout(product_id) else 'abandoned'
+                    except (InsufficientStock, ReservationClosed):
+                        outcome = 'out of stock'
+                    except OperationalError:
+                        outcome = 'database busy'
+                    elapsed = time.perf_counter() - started
+                    with lock:
+                        latencies.append(elapsed)
+                        outcomes[outcome] += 1
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=worker) for _ in range(options['workers'])]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return latencies, outcomes, time.perf_counter() - started
@@ -0,0 +1,58 @@
+import time
+from functools import reduce
+from operator import and_, or_
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from core.models import Category, Supplier, Product
+from core.search import search_products
+from ._bench import rolled_back, seed_products, timed
+
+# (description, text) pairs: whole words, a prefix typed so far, and a SKU fragment.
+QUERIES = [
+    ('two words', 'wireless kettle'),
+    ('prefix while typing', 'waterpro'),
+    ('sku fragment', 'KET-00012'),
+    ('rare word', 'tripod 4242'),
+]
+
+def legacy_search(queryset, text):
+    """What ``search_fields = ['name', 'description', 'sku']`` did: every word ILIKE'd against every column."""
+    fields = ('name', 'description', 'sku')
+    return queryset.filter(reduce(and_, [reduce(or_, [Q(**{f'{field}__icontains': word}) for field in fields])
+                                        for word in text.split()])).order_by('name')
+
+def first_page(queryset):
+    # What the list endpoint evaluates: a COUNT for the paginator and the first ten rows.
+    queryset.count()
+    return list(queryset[:10])
+
+class Command(BaseCommand):
+    help = 'Compare the ranked product search with the old ILIKE search on a large synthetic catalog.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--products', type=int, default=1000000)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with rolled_back():
+            started = time.perf_counter()
+            tag = f'search-{time.time_ns()}'
+            category = Category.objects.create(name=tag)
+            supplier = Supplier.objects.create(name=tag, contact_person='-', email='bench@example.com',
+                                               phone='-', address='-')
+            seed_products(category, supplier, options['products'], tag)
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+            self.stdout.write(f'Seeded {options["products"]} products in {time.perf_counter() - started:.1f}s '
+                              f'({connection.vendor})')
+
+            products = Product.objects.all()
+            for name, text in QUERIES:
+                ranked = search_products(products, text)
+                top = first_page(ranked)[:1]
+                legacy = timed(lambda: first_page(legacy_search(products, text)), options['repeat'])
+                search = timed(lambda: first_page(ranked), options['repeat'])
+                self.stdout.write(f'{name:<20} {text!r:<20} ILIKE {legacy * 1000:>9.1f} ms   '
+                                  f'search {search * 1000:>8.1f} ms   ({legacy / search:.1f}x)   '
+                                  f'top: {top[0].name if top else "-"}')
@@ -0,0 +1,196 @@
+import json
+import math
+import random
+import sys
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from core import aggregates
+from core.analytics import sales_analytics
+from core.models import Location, Product, Sale, SalesRollup, StockMovement, StockTransfer
+from core.queries import optimize_queryset
+from core.serializers import ProductSerializer, SaleSerializer
+from core.services import default_location_id, ingest_movements, record_movement, record_sale, transfer_stock
+from core.views import DASHBOARD_QUERIES, dashboard_data
+from ._bench import bench_user, delete_dataset, http_load, percentile, rolled_back, seed_dataset, serving, timed
+
+PAGE = 100
+
+# Units where a bigger number is better; every other result is a time.
+HIGHER_IS_BETTER = {'req/s'}
+
+def http_endpoints(pages, rng):
+    """Endpoint name -> path factory; product pages are random, so most requests miss the response cache."""
+    return {
+        'products': lambda: f'/api/products/?page={rng.randint(1, pages)}',
+        'sales': lambda: '/api/sales/',
+        'dashboard': lambda: '/api/dashboard/',
+    }
+
+def rolled_back_call(func):
+    def call():
+        with rolled_back():
+            func()
+    return call
+
+def micro_benchmarks(product_ids, user):
+    """Name -> callable for the serializer, queryset and stock-update benchmarks."""
+    rng = random.Random(0)
+    products = list(optimize_queryset(Product.objects.filter(pk__in=product_ids[:PAGE]), ProductSerializer))
+    sales = list(optimize_queryset(Sale.objects.order_by('-sale_date'), SaleSerializer)[:PAGE])
+    dashboard = {name: query() for name, query in DASHBOARD_QUERIES.items()}
+    stocked = list(Product.objects.filter(pk__in=product_ids[:10000], quantity__gte=10).values_list('pk', flat=True))
+    if not stocked:
+        raise CommandError('No product holds 10 or more items to take stock from.')
+    offsets = range(0, max(len(product_ids) - PAGE, 1), PAGE)
+    source = default_location_id()
+    today = timezone.localdate()
+    rows = [(index, {'product': rng.choice(stocked), 'movement_type': rng.choice(['IN', 'OUT']), 'quantity': 1})
+            for index in range(1000)]
+
+    def product_page():
+        offset = rng.choice(offsets)
+        return list(optimize_queryset(Product.objects.order_by('pk'), ProductSerializer)[offset:offset + PAGE])
+
+    def transfer():
+        destination = Location.objects.create(name=f'bench-{time.time_ns()}')
+        transfer_stock(StockTransfer(product_id=rng.choice(stocked), source_id=source, destination=destination,
+                                     quantity=1, created_by=user))
+
+    return {
+        'serialize products (100)': lambda: ProductSerializer(products, many=True).data,
+        'serialize sales (100)': lambda: SaleSerializer(sales, many=True).data,
+        'serialize dashboard': lambda: dashboard_data(dashboard),
+        'query product page (100)': product_page,
+        'query dashboard': lambda: {name: query() for name, query in DASHBOARD_QUERIES.items()},
+        'query low stock (100)': lambda: list(Product.objects.filter(low_stock=True).order_by('name')[:PAGE]),
+        'query sales by category, 1 year': lambda: sales_analytics(SalesRollup.MONTH, today - timedelta(days=365),
+                                                                   today, 'category'),
+        'record_movement': rolled_back_call(lambda: record_movement(StockMovement(
+            product_id=rng.choice(stocked), movement_type=rng.choice(['IN', 'OUT']), quantity=1, created_by=user))),
+        'record_sale': rolled_back_call(lambda: record_sale(Sale(product_id=rng.choice(stocked), quantity=1,
+                                                                 unit_price=1, created_by=user))),
+        'ingest_movements (1000 rows)': rolled_back_call(lambda: ingest_movements(rows, user)),
+        'transfer_stock': rolled_back_call(transfer),
+    }
+
+class Command(BaseCommand):
+    help = ('Benchmark suite: seed a synthetic catalog, time serializers, querysets and stock updates, load-test '
+            '/api/products/, /api/sales/ and /api/dashboard/ under gunicorn, and compare against a saved baseline. '
+            'Exits with an error when a result regresses by more than --tolerance.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--suppliers', type=int, default=100)
+        parser.add_argument('--products', type=int, default=20000)
+        parser.add_argument('--sales', type=int, default=100000)
+        parser.add_argument('--movements', type=int, default=50000)
+        parser.add_argument('--no-seed', action='store_true',
+                            help='Benchmark the data already in the database (e.g. from seed_bench_data).')
+        parser.add_argument('--repeat', type=int, default=20, help='Runs per micro-benchmark; the median counts.')
+        parser.add_argument('--skip-http', action='store_true')
+        parser.add_argument('--workers', type=int, default=2, help='Server worker processes.')
+        parser.add_argument('--concurrency', type=int, default=16, help='Client connections.')
+        parser.add_argument('--requests', type=int, default=1000, help='Requests per endpoint.')
+        parser.add_argument('--port', type=int, default=8766)
+        parser.add_argument('--save', metavar='PATH', help='Write the results to PATH as the new baseline.')
+        parser.add_argument('--baseline', metavar='PATH', help='Compare the results with a saved baseline.')
+        parser.add_argument('--tolerance', type=float, default=0.25,
+                            help='Allowed slowdown before a result counts as a regression (0.25 = 25%%).')
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as file:
+                baseline = json.load(file)
+        sizes = {name: options[name] for name in ('categories', 'suppliers', 'products', 'sales', 'movements')}
+        tag = None
+        # The server processes only see committed rows, so the dataset is committed and deleted afterwards.
+        try:
+            started = time.perf_counter()
+            if options['no_seed']:
+                product_ids = list(Product.objects.order_by('pk').values_list('pk', flat=True))
+                sizes = {'products': len(product_ids), 'sales': Sale.objects.count()}
+            else:
+                with transaction.atomic():
+                    tag, product_ids = seed_dataset(sizes['categories'], sizes['suppliers'], sizes['products'],
+                                                    sales=sizes['sales'], movements=sizes['movements'])
+                    aggregates.rebuild()
+            self.stdout.write(f'{", ".join(f"{count} {name}" for name, count in sizes.items())} '
+                              f'({connection.vendor}), ready in {time.perf_counter() - started:.1f}s')
+            if not product_ids:
+                raise CommandError('No products to benchmark.')
+
+            results = {}
+            for name, func in micro_benchmarks(product_ids, bench_user()).items():
+                func()
+                results[name] = (timed(func, options['repeat']) * 1000, 'ms')
+                self.report(name, results[name], baseline)
+            errors = 0
+            if not options['skip_http']:
+                errors = self.load_test(options, results, baseline)
+        finally:
+            if tag is not None:
+                delete_dataset(tag)
+                aggregates.rebuild()
+
+        if options['save']:
+            with open(options['save'], 'w') as file:
+                saved = {name: {'value': value, 'unit': unit} for name, (value, unit) in results.items()}
+                json.dump({'vendor': connection.vendor, 'sizes': sizes, 'results': saved}, file, indent=2)
+            self.stdout.write(f'Saved {len(results)} results to {options["save"]}.')
+        if errors:
+            raise CommandError(f'{errors} request(s) failed during the load test.')
+        if baseline is not None:
+            self.compare(results, sizes, baseline, options['tolerance'])
+
+    def load_test(self, options, results, baseline):
+        """Run the HTTP load test as the Procfile runs the app; returns the number of failed requests."""
+        port, concurrency = options['port'], options['concurrency']
+        command = [sys.executable, '-m', 'gunicorn', 'inventory.asgi:application',
+                   '-k', 'uvicorn.workers.UvicornWorker', '--workers', str(options['workers']),
+                   '--bind', f'127.0.0.1:{port}', '--log-level', 'warning']
+        pages = max(1, math.ceil(Product.objects.count() / 10))
+        errors = 0
+        with serving(command, port):
+            for name, next_path in http_endpoints(pages, random.Random(0)).items():
+                http_load(port, next_path, concurrency, concurrency * 2)
+                latencies, outcomes, seconds = http_load(port, next_path, concurrency, options['requests'])
+                errors += sum(count for (code, _), count in outcomes.items() if code != 200)
+                results[f'http {name} throughput'] = (len(latencies) / seconds, 'req/s')
+                for pct in (50, 95, 99):
+                    results[f'http {name} p{pct}'] = (percentile(latencies, pct) * 1000, 'ms')
+                for label in ('throughput', 'p50', 'p95', 'p99'):
+                    self.report(f'http {name} {label}', results[f'http {name} {label}'], baseline)
+        return errors
+
+    def report(self, name, result, baseline):
+        value, unit = result
+        line = f'{name:<36} {value:>10.2f} {unit:<6}'
+        saved = (baseline or {}).get('results', {}).get(name)
+        if saved and saved['value']:
+            line += f' {(value - saved["value"]) / saved["value"]:>+8.1%} vs baseline'
+        self.stdout.write(line)
+
+    def compare(self, results, sizes, baseline, tolerance):
+        if baseline.get('vendor') != connection.vendor or baseline.get('sizes') != sizes:
+            self.stdout.write(self.style.WARNING(
+                f'The baseline ran on {baseline.get("vendor")} with {baseline.get("sizes")}; the comparison may not '
+                f'be meaningful.'))
+        regressions = []
+        for name, saved in baseline.get('results', {}).items():
+            if name not in results or not saved['value']:
+                continue
+            value, unit = results[name]
+            change = (value - saved['value']) / saved['value']
+            if unit in HIGHER_IS_BETTER:
+                change = -change
+            if change > tolerance:
+                regressions.append(f'{name}: {saved["value"]:.2f} -> {value:.2f} {unit}')
+        if regressions:
+            for regression in regressions:
+                self.stdout.write(self.style.ERROR(f'regressed  {regression}'))
+            raise CommandError(f'{len(regressions)} result(s) regressed by more than {tolerance:.0%}.')
+        self.stdout.write(self.style.SUCCESS(f'No result regressed by more than {tolerance:.0%}.'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from core.analytics import compact
+
+class Command(BaseCommand):
+    help = ('Fold finished days of sales rollups into week and month totals and prune old day rows '
+            '(run nightly; run_jobs workers schedule it themselves).')
+
+    def handle(self, *args, **options):
+        result = compact()
+        self.stdout.write(self.style.SUCCESS(
+            f'Compacted {result["compacted"]} day rollup(s), pruned {result["pruned"]}.'))
@@ -0,0 +1,35 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+from django.utils import timezone
+from core.exports import CHUNK_SIZE, EXPORTS, FORMATS, export_rows
+
+def moment(value):
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise CommandError(f'Not a date or datetime: {value}')
+    return timezone.make_aware(parsed) if timezone.is_naive(parsed) else parsed
+
+class Command(BaseCommand):
+    help = 'Stream sales or stock movement history as CSV or NDJSON to a file or stdout.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('export', choices=sorted(EXPORTS))
+        parser.add_argument('--format', choices=sorted(FORMATS), default='csv')
+        parser.add_argument('--start', type=moment, help='Inclusive lower bound (ISO date or datetime).')
+        parser.add_argument('--end', type=moment, help='Exclusive upper bound (ISO date or datetime).')
+        parser.add_argument('--product', type=int)
+        parser.add_argument('--output', help='File to write; defaults to stdout.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        header, rows = export_rows(options['export'], options['start'], options['end'], options['product'],
+                                   chunk_size=options['chunk_size'])
+        _, stream = FORMATS[options['format']]
+        out = open(options['output'], 'w', newline='', encoding='utf-8') if options['output'] else sys.stdout
+        try:
+            for chunk in stream(header, rows, options['chunk_size']):
+                out.write(chunk)
+        finally:
+            if out is not sys.stdout:
+                out.close()
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.imports import CHUNK_SIZE, PARSERS, detect_format, import_catalog
+
+class Command(BaseCommand):
+    help = 'Upsert products by SKU from a CSV, NDJSON or JSON-array file, creating missing categories and suppliers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument('--format', choices=sorted(PARSERS), help='Defaults to csv for *.csv, json otherwise.')
+        parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        parser.add_argument('--show-errors', type=int, default=20, help='Rejected rows to print.')
+
+    def handle(self, *args, **options):
+        file_format = options['format'] or detect_format(options['path'])
+        try:
+            stream = open(options['path'], 'rb')
+        except OSError as exc:
+            raise CommandError(exc)
+        with stream:
+            summary = import_catalog(PARSERS[file_format](stream), chunk_size=options['chunk_size'])
+
+        for error in summary['errors'][:options['show_errors']]:
+            self.stderr.write(f'row {error["index"]}: {error["errors"]}')
+        if summary.get('detail'):
+            self.stderr.write(summary['detail'])
+        self.stdout.write(self.style.SUCCESS(
+            f'{summary["created"]} created, {summary["updated"]} updated, {summary["rejected"]} rejected; '
+            f'{summary["categories_created"]} categories and {summary["suppliers_created"]} suppliers created.'))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from core import aggregates
+
+class Command(BaseCommand):
+    help = 'Rebuild the dashboard counters and daily sales totals from scratch, or check them for drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report drift; exit with an error if any is found.')
+
+    def handle(self, *args, **options):
+        if not options['check']:
+            aggregates.rebuild()
+            self.stdout.write(self.style.SUCCESS('Dashboard aggregates rebuilt.'))
+            return
+
+        drift = aggregates.check()
+        for line in drift[:50]:
+            self.stdout.write(line)
+        if len(drift) > 50:
+            self.stdout.write(f'... and {len(drift) - 50} more')
+        if drift:
+            raise CommandError(f'{len(drift)} aggregate value(s) drifted; run rebuild_dashboard to repair.')
+        self.stdout.write(self.style.SUCCESS('Dashboard aggregates match the source tables.'))
@@ -0,0 +1,58 @@
+from concurrent.futures import ThreadPoolExecutor
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.models import F, Max, Min, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from core.ledger import reconcile, take_snapshots
+from core.models import LocationStock, Product
+
+# Products listed individually when they disagree; the rest are only counted.
+MAX_REPORTED = 20
+
+def location_mismatches(start, stop):
+    """``(pk, quantity, located)`` for products in ``[start, stop)`` whose quantity is not the sum over locations."""
+    located = (LocationStock.objects.filter(product=OuterRef('pk')).order_by().values('product')
+                                    .annotate(total=Sum('quantity')).values('total'))
+    return list(Product.objects.filter(pk__gte=start, pk__lt=stop).annotate(located=Coalesce(Subquery(located), 0))
+                               .exclude(quantity=F('located')).values_list('pk', 'quantity', 'located'))
+
+class Command(BaseCommand):
+    help = ("Check every product's quantity against its stock ledger and its stock per location, in parallel "
+            "chunks of primary keys; exit with an error on any mismatch.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=4)
+        parser.add_argument('--chunk', type=int, default=5000, help='Products per query.')
+        parser.add_argument('--full', action='store_true',
+                            help='Sum every entry instead of starting from the latest snapshots.')
+        parser.add_argument('--snapshot', action='store_true', help='Take snapshots first, as the nightly job does.')
+
+    def handle(self, *args, **options):
+        if options['snapshot']:
+            self.stdout.write(f'Took {take_snapshots()} snapshot(s).')
+        bounds = Product.objects.aggregate(low=Min('pk'), high=Max('pk'))
+        if bounds['low'] is None:
+            self.stdout.write(self.style.SUCCESS('No products to reconcile.'))
+            return
+        ranges = [(start, start + options['chunk'])
+                  for start in range(bounds['low'], bounds['high'] + 1, options['chunk'])]
+
+        def check(bounds):
+            try:
+                return reconcile(*bounds, full=options['full']), location_mismatches(*bounds)
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            results = list(executor.map(check, ranges))
+        mismatches = [row for rows, _ in results for row in rows]
+        misplaced = [row for _, rows in results for row in rows]
+        for pk, quantity, ledger in mismatches[:MAX_REPORTED]:
+            self.stdout.write(f'product {pk}: quantity {quantity}, ledger {ledger}')
+        for pk, quantity, located in misplaced[:MAX_REPORTED]:
+            self.stdout.write(f'product {pk}: quantity {quantity}, {located} over its locations')
+        if mismatches or misplaced:
+            raise CommandError(f'{len(mismatches)} product(s) disagree with the stock ledger, {len(misplaced)} with '
+                               f'their stock per location.')
+        self.stdout.write(self.style.SUCCESS(f'Stock matches the ledger and the locations ({len(ranges)} chunk(s), '
+                                             f'{"full replay" if options["full"] else "from snapshots"}).'))
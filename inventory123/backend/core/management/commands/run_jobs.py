@@ -0,0 +1,71 @@
+import os
+import signal
+import socket
+import threading
+import time
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections
+from core.jobs import claim, requeue_stale, run, schedule_daily
+from core.reservations import expire
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs until stopped (SIGINT/SIGTERM let running jobs finish first).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queues', default='default,imports,images', help='Comma-separated queues to take jobs from.')
+        parser.add_argument('--concurrency', type=int, default=1, help='Jobs this process runs at once (threads).')
+        parser.add_argument('--poll', type=float, default=1.0, help='Seconds to wait when no job is ready.')
+        parser.add_argument('--once', action='store_true', help='Exit once no job is ready instead of polling.')
+
+    def handle(self, *args, **options):
+        queues = [queue.strip() for queue in options['queues'].split(',') if queue.strip()]
+        self.stop = threading.Event()
+        self.output = threading.Lock()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: self.stop.set())
+
+        name = f'{socket.gethostname()}:{os.getpid()}'
+        threads = [threading.Thread(target=self.work, args=(f'{name}:{n}', queues, options), daemon=True)
+                   for n in range(options['concurrency'])]
+        self.log(f'{name} running {len(threads)} worker(s) on {", ".join(queues)}')
+        for thread in threads:
+            thread.start()
+        last_sweep = 0
+        while any(thread.is_alive() for thread in threads):
+            if time.monotonic() - last_sweep > 60:
+                requeued, failed = requeue_stale()
+                if requeued or failed:
+                    self.log(f'Requeued {requeued} stale job(s), failed {failed}.')
+                for task in schedule_daily():
+                    self.log(f'Scheduled the next daily run of {task}.')
+                expired = expire()
+                if expired:
+                    self.log(f'Expired {expired} stock reservation(s).')
+                last_sweep = time.monotonic()
+            for thread in threads:
+                thread.join(timeout=1)
+
+    def work(self, worker, queues, options):
+        try:
+            while not self.stop.is_set():
+                try:
+                    job = claim(worker, queues)
+                except OperationalError as exc:
+                    # SQLite allows one writer; a busy database is a reason to wait, not to exit.
+                    self.log(f'{worker}: claim failed ({exc}), retrying')
+                    job = None
+                if job is None:
+                    if options['once']:
+                        return
+                    self.stop.wait(options['poll'])
+                    continue
+                started = time.perf_counter()
+                run(job)
+                job.refresh_from_db(fields=['status'])
+                self.log(f'{worker}: {job.task} #{job.pk} {job.status} in {time.perf_counter() - started:.2f}s')
+        finally:
+            connections.close_all()
+
+    def log(self, message):
+        with self.output:
+            self.stdout.write(message)
@@ -0,0 +1,39 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from core import aggregates
+from core.models import Category
+from ._bench import delete_dataset, seed_dataset
+
+PREFIX = 'dataset-'
+
+class Command(BaseCommand):
+    help = ('Seed a synthetic catalog with sales and movement history for load tests, and rebuild the dashboard '
+            'aggregates. The data is committed; --clear deletes every seeded dataset.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--categories', type=int, default=50)
+        parser.add_argument('--suppliers', type=int, default=100)
+        parser.add_argument('--products', type=int, default=20000)
+        parser.add_argument('--sales', type=int, default=100000)
+        parser.add_argument('--movements', type=int, default=50000)
+        parser.add_argument('--clear', action='store_true', help='Delete the seeded datasets instead.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if options['clear']:
+            tags = {name.rsplit('-', 1)[0] for name in
+                    Category.objects.filter(name__startswith=PREFIX).values_list('name', flat=True)}
+            for tag in tags:
+                delete_dataset(tag)
+            aggregates.rebuild()
+            self.stdout.write(f'Deleted {len(tags)} dataset(s) in {time.perf_counter() - started:.1f}s.')
+            return
+        with transaction.atomic():
+            tag, _ = seed_dataset(options['categories'], options['suppliers'], options['products'],
+                                  sales=options['sales'], movements=options['movements'])
+            aggregates.rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {tag}: {options["categories"]} categories, {options["suppliers"]} suppliers, '
+            f'{options["products"]} products, {options["sales"]} sales and {options["movements"]} movements '
+            f'in {time.perf_counter() - started:.1f}s ({connection.vendor}).'))
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from core.aggregates import COUNTERS, counters, bump_counter
+from core.models import Product, low_stock_condition
+
+class Command(BaseCommand):
+    help = ('Find products whose low_stock flag disagrees with their quantity, reorder level and forecast reorder '
+            'point, and repair them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report drift; exit with an error if any is found.')
+
+    def handle(self, *args, **options):
+        should_be_low = Product.objects.filter(low_stock_condition(), low_stock=False)
+        should_not_be_low = Product.objects.filter(low_stock=True).exclude(low_stock_condition())
+
+        if options['check']:
+            missing, stale = should_be_low.count(), should_not_be_low.count()
+            counted = counters()['low_stock_products']
+            actual = COUNTERS['low_stock_products']()
+            self.stdout.write(f'{missing} product(s) missing the flag, {stale} flagged but restocked; '
+                              f'counter {counted}, actual {actual}')
+            if missing or stale or counted != actual:
+                raise CommandError('Low-stock state has drifted; run sync_low_stock to repair.')
+            self.stdout.write(self.style.SUCCESS('Low-stock flags are consistent.'))
+            return
+
+        with transaction.atomic():
+            now = timezone.now()
+            flagged = should_be_low.update(low_stock=True, updated_at=now)
+            cleared = should_not_be_low.update(low_stock=False, updated_at=now)
+            drift = COUNTERS['low_stock_products']() - counters()['low_stock_products']
+            if drift:
+                bump_counter('low_stock_products', drift)
+        self.stdout.write(self.style.SUCCESS(f'Flagged {flagged}, cleared {cleared}, counter adjusted by {drift}.'))
\ No newline at end of file
@@ -0,0 +1,208 @@
+"""
+Separate middleware stacks for the API and the rest of the site, with optional per-middleware timing.
+
+``settings.MIDDLEWARE`` only holds ``RoutedMiddleware``. Requests under
+``API_PATH_PREFIX`` run ``API_MIDDLEWARE``; everything else (pages, admin,
+login) runs ``SITE_MIDDLEWARE`` with sessions, CSRF, messages and login
+protection. The API authenticates with bearer tokens and never reads a
+session, so it skips that work. Each stack is composed the way Django composes
+``MIDDLEWARE``, and its ``process_view``, ``process_template_response`` and
+``process_exception`` hooks run in the usual order.
+
+With ``MIDDLEWARE_TIMING`` on, each middleware's own time is measured: its
+code before and after the inner layers, plus its hooks. The times are sent
+back in a ``Server-Timing`` header and summed per process for
+``/api/middleware-stats/``.
+"""
+import threading
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.exception import convert_exception_to_response
+from django.utils.module_loading import import_string
+
+APP = 'app'
+
+# What the admin's own checks (admin.E408-E410, silenced in settings) look for in MIDDLEWARE.
+ADMIN_MIDDLEWARE = [
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+]
+
+_totals = {}
+_totals_lock = threading.Lock()
+
+def record(stack, costs):
+    with _totals_lock:
+        for name, seconds in costs.items():
+            total = _totals.setdefault((stack, name), [0, 0.0])
+            total[0] += 1
+            total[1] += seconds
+
+def metrics():
+    """``{stack: {middleware: {'calls', 'total_ms', 'mean_ms'}}}`` recorded by this process."""
+    stats = {}
+    with _totals_lock:
+        for (stack, name), (calls, seconds) in _totals.items():
+            stats.setdefault(stack, {})[name] = {'calls': calls, 'total_ms': round(seconds * 1000, 3),
+                                                  'mean_ms': round(seconds * 1000 / calls, 4)}
+    return stats
+
+def reset_metrics():
+    with _totals_lock:
+        _totals.clear()
+
+def _probe(position, handler):
+    """Wrap one layer of a stack so its entry and exit times land in the request's timing marks."""
+    if iscoroutinefunction(handler):
+        async def timed(request):
+            marks = request._middleware_marks
+            marks[position][0] = time.perf_counter()
+            try:
+                return await handler(request)
+            finally:
+                marks[position][1] = time.perf_counter()
+    else:
+        def timed(request):
+            marks = request._middleware_marks
+            marks[position][0] = time.perf_counter()
+            try:
+                return handler(request)
+            finally:
+                marks[position][1] = time.perf_counter()
+    return timed
+
+class Stack:
+    """One list of middleware composed around ``get_response`` like BaseHandler.load_middleware."""
+
+    def __init__(self, name, paths, get_response, is_async, timed):
+        self.name = name
+        self.timed = timed
+        # Innermost first: position 0 is the view (URL resolution and hooks included), then each middleware outwards.
+        self.layers = [APP]
+        self.view_hooks, self.template_hooks, self.exception_hooks = [], [], []
+        adapter = BaseHandler()
+        handler, handler_is_async = get_response, is_async
+        if timed:
+            handler = _probe(0, handler)
+        for path in reversed(paths):
+            middleware = import_string(path)
+            can_sync = getattr(middleware, 'sync_capable', True)
+            can_async = getattr(middleware, 'async_capable', False)
+            middleware_is_async = False if not handler_is_async and can_sync else can_async
+            try:
+                adapted = adapter.adapt_method_mode(middleware_is_async, handler, handler_is_async)
+                instance = middleware(adapted)
+            except MiddlewareNotUsed:
+                continue
+            if instance is None:
+                raise ImproperlyConfigured(f'Middleware factory {path} returned None.')
+            position = len(self.layers)
+            self.layers.append(path)
+            # Hooks always run synchronously here: Django calls RoutedMiddleware's from a thread in async mode.
+            if hasattr(instance, 'process_view'):
+                self.view_hooks.insert(0, (position, adapter.adapt_method_mode(False, instance.process_view)))
+            if hasattr(instance, 'process_template_response'):
+                self.template_hooks.append(
+                    (position, adapter.adapt_method_mode(False, instance.process_template_response)))
+            if hasattr(instance, 'process_exception'):
+                self.exception_hooks.append((position, adapter.adapt_method_mode(False, instance.process_exception)))
+            handler = convert_exception_to_response(instance)
+            if timed:
+                handler = _probe(position, handler)
+            handler_is_async = middleware_is_async
+        self.handler = adapter.adapt_method_mode(is_async, handler, handler_is_async)
+
+    def hook(self, request, position, method, *args):
+        if not self.timed:
+            return method(*args)
+        started = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            request._middleware_hooks[position] += time.perf_counter() - started
+
+    def start(self, request):
+        request._middleware_stack = self
+        if self.timed:
+            request._middleware_marks = [[None, None] for _ in self.layers]
+            request._middleware_hooks = [0.0] * len(self.layers)
+
+    def finish(self, request, response):
+        if not self.timed:
+            return response
+        marks, hooks = request._middleware_marks, request._middleware_hooks
+        spent = [exit - enter if enter is not None and exit is not None else 0.0 for enter, exit in marks]
+        # Outermost middleware first, the view last.
+        costs = {}
+        for position in reversed(range(len(self.layers))):
+            inner = spent[position - 1] if position else sum(hooks)
+            costs[self.layers[position]] = max(spent[position] - inner, 0.0) + (hooks[position] if position else 0.0)
+        record(self.name, costs)
+        response.headers['Server-Timing'] = ', '.join(
+            f'mw{number};dur={seconds * 1000:.3f};desc="{name}"' for number, (name, seconds) in enumerate(costs.items()))
+        return response
+
+class RoutedMiddleware:
+    """Run ``API_MIDDLEWARE`` for ``API_PATH_PREFIX`` requests and ``SITE_MIDDLEWARE`` for the rest."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.is_async = is_async = iscoroutinefunction(get_response)
+        if is_async:
+            markcoroutinefunction(self)
+        timed = getattr(settings, 'MIDDLEWARE_TIMING', False)
+        self.prefix = settings.API_PATH_PREFIX
+        self.api = Stack('api', settings.API_MIDDLEWARE, get_response, is_async, timed)
+        self.site = Stack('site', settings.SITE_MIDDLEWARE, get_response, is_async, timed)
+
+    def stack(self, request):
+        return self.api if request.path_info.startswith(self.prefix) else self.site
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stack = self.stack(request)
+        stack.start(request)
+        return stack.finish(request, stack.handler(request))
+
+    async def __acall__(self, request):
+        stack = self.stack(request)
+        stack.start(request)
+        return stack.finish(request, await stack.handler(request))
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        stack = request._middleware_stack
+        for position, method in stack.view_hooks:
+            response = stack.hook(request, position, method, request, view_func, view_args, view_kwargs)
+            if response is not None:
+                return response
+        return None
+
+    def process_template_response(self, request, response):
+        stack = request._middleware_stack
+        for position, method in stack.template_hooks:
+            response = stack.hook(request, position, method, request, response)
+            if response is None:
+                raise ValueError(f'{method.__qualname__} didn\'t return an HttpResponse object. It returned None instead.')
+        return response
+
+    def process_exception(self, request, exception):
+        stack = request._middleware_stack
+        for position, method in stack.exception_hooks:
+            response = stack.hook(request, position, method, request, exception)
+            if response is not None:
+                return response
+        return None
+
+@checks.register(checks.Tags.admin)
+def check_site_middleware(app_configs, **kwargs):
+    """The admin runs on SITE_MIDDLEWARE, so that is where its session, auth and message middleware must be."""
+    return [checks.Error(f"'{path}' must be in SITE_MIDDLEWARE in order to use the admin application.",
+                         id='core.E001')
+            for path in ADMIN_MIDDLEWARE if path not in getattr(settings, 'SITE_MIDDLEWARE', [])]
@@ -0,0 +1,55 @@
+# Generated by Django 5.0.2 on 2026-10-17 19:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('sales_count', models.IntegerField(default=0)),
+                ('units_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('units_in', models.IntegerField(default=0)),
+                ('units_out', models.IntegerField(default=0)),
+                ('units_adjusted', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Daily summaries',
+                'ordering': ['-date'],
+            },
+        ),
+        migrations.CreateModel(
+            name='InventoryCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='ProductDailySales',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('sales_count', models.IntegerField(default=0)),
+                ('units_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='core.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Product daily sales',
+                'ordering': ['-date'],
+                'unique_together': {('product', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.0.2 on 2026-10-17 19:36
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_dashboard_aggregates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='sale',
+            index=models.Index(fields=['-sale_date', '-id'], name='sale_date_id_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['-created_at', '-id'], name='movement_created_id_idx'),
+        ),
+    ]
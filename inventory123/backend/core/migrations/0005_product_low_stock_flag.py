@@ -0,0 +1,33 @@
+# Generated by Django 5.0.2 on 2026-10-17 19:40
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def populate_low_stock(apps, schema_editor):
+    Product = apps.get_model('core', 'Product')
+    Product.objects.filter(quantity__lte=F('reorder_level')).update(low_stock=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_low_stock_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='low_stock',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(populate_low_stock, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(fields=['low_stock', 'name'], name='product_low_stock_name_idx'),
+        ),
+    ]
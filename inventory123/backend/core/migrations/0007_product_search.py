@@ -0,0 +1,21 @@
+from django.db import migrations
+from core import search
+
+
+def install_search(apps, schema_editor):
+    search.install(schema_editor.connection)
+
+
+def uninstall_search(apps, schema_editor):
+    search.uninstall(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_delta_sync'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.0.2 on 2026-10-17 20:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_unit_cost(apps, schema_editor):
+    # Existing sales are costed at today's cost_price; there is no earlier value to go by.
+    Product = apps.get_model('core', 'Product')
+    Sale = apps.get_model('core', 'Sale')
+    Sale.objects.filter(unit_cost__isnull=True).update(
+        unit_cost=Subquery(Product.objects.filter(pk=OuterRef('product_id')).values('cost_price')[:1]))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_product_image_variants'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='sale',
+            name='unit_cost',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, max_digits=10, null=True),
+        ),
+        migrations.CreateModel(
+            name='SalesRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('grain', models.CharField(choices=[('day', 'Day'), ('week', 'Week'), ('month', 'Month')], max_length=5)),
+                ('start', models.DateField()),
+                ('sales_count', models.IntegerField(default=0)),
+                ('units_sold', models.IntegerField(default=0)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('cost', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('compacted', models.BooleanField(default=False)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.category')),
+                ('supplier', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.supplier')),
+            ],
+            options={
+                'ordering': ['grain', 'start'],
+                'indexes': [models.Index(condition=models.Q(('compacted', False)), fields=['grain', 'start'], name='rollup_pending_idx')],
+                'unique_together': {('grain', 'start', 'category', 'supplier')},
+            },
+        ),
+        migrations.RunPython(backfill_unit_cost, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,93 @@
+# Generated by Django 5.0.2 on 2026-10-17 20:43
+
+import django.db.models.deletion
+import django.utils.timezone
+from collections import defaultdict
+from django.db import migrations, models
+from django.db.models import F
+
+BATCH_SIZE = 5000
+
+
+def sign_adjustments(apps, schema_editor):
+    # ADJ movements were applied to stock as subtractions; store them as the signed change they made (and back).
+    StockMovement = apps.get_model('core', 'StockMovement')
+    DailySummary = apps.get_model('core', 'DailySummary')
+    StockMovement.objects.filter(movement_type='ADJ').update(quantity=-F('quantity'))
+    DailySummary.objects.exclude(units_adjusted=0).update(units_adjusted=-F('units_adjusted'))
+
+
+def backfill_ledger(apps, schema_editor):
+    """
+    One entry per existing movement and sale at its creation time, plus an
+    opening entry per product for whatever stock they do not account for.
+    """
+    Product = apps.get_model('core', 'Product')
+    StockMovement = apps.get_model('core', 'StockMovement')
+    Sale = apps.get_model('core', 'Sale')
+    StockLedgerEntry = apps.get_model('core', 'StockLedgerEntry')
+    totals = defaultdict(int)
+    batch = []
+
+    def add(entry):
+        totals[entry.product_id] += entry.delta
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            StockLedgerEntry.objects.bulk_create(batch)
+            batch.clear()
+
+    movements = StockMovement.objects.order_by().values_list('pk', 'product_id', 'movement_type', 'quantity',
+                                                             'created_at')
+    for pk, product_id, movement_type, quantity, created_at in movements.iterator(chunk_size=BATCH_SIZE):
+        add(StockLedgerEntry(product_id=product_id, delta=-quantity if movement_type == 'OUT' else quantity,
+                             kind='movement', object_id=pk, recorded_at=created_at))
+    for pk, product_id, quantity, created_at in (Sale.objects.order_by().values_list('pk', 'product_id', 'quantity',
+                                                                                     'created_at')
+                                                                        .iterator(chunk_size=BATCH_SIZE)):
+        add(StockLedgerEntry(product_id=product_id, delta=-quantity, kind='sale', object_id=pk,
+                             recorded_at=created_at))
+    for pk, quantity, created_at in Product.objects.values_list('pk', 'quantity', 'created_at').iterator():
+        if quantity != totals[pk]:
+            add(StockLedgerEntry(product_id=pk, delta=quantity - totals[pk], kind='opening', recorded_at=created_at))
+    StockLedgerEntry.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockLedgerEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('delta', models.IntegerField()),
+                ('kind', models.CharField(choices=[('opening', 'Opening stock'), ('movement', 'Stock movement'), ('sale', 'Sale'), ('correction', 'Quantity edited')], max_length=10)),
+                ('object_id', models.BigIntegerField(blank=True, null=True)),
+                ('recorded_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Stock ledger entries',
+                'ordering': ['recorded_at', 'id'],
+                'indexes': [models.Index(fields=['product', 'recorded_at', 'id'], name='ledger_product_time_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('taken_at', models.DateTimeField()),
+                ('quantity', models.IntegerField()),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='core.product')),
+            ],
+            options={
+                'ordering': ['product', 'taken_at'],
+                'unique_together': {('product', 'taken_at')},
+            },
+        ),
+        migrations.RunPython(sign_adjustments, sign_adjustments),
+        migrations.RunPython(backfill_ledger, migrations.RunPython.noop),
+    ]
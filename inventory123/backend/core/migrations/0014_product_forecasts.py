@@ -0,0 +1,27 @@
+# Generated by Django 5.0.2 on 2026-10-17 20:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProductForecast',
+            fields=[
+                ('product', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='forecast', serialize=False, to='core.product')),
+                ('moving_average', models.FloatField()),
+                ('smoothed_demand', models.FloatField()),
+                ('demand_deviation', models.FloatField()),
+                ('days_of_cover', models.FloatField(null=True)),
+                ('reorder_point', models.IntegerField()),
+                ('reorder_quantity', models.IntegerField()),
+                ('computed_at', models.DateTimeField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,132 @@
+# Generated by Django 5.0.2 on 2026-10-17 20:58
+
+import django.core.validators
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+BATCH_SIZE = 5000
+
+
+def add_default_location(apps, schema_editor):
+    """Put all existing stock, movements and sales at one default location."""
+    Location = apps.get_model('core', 'Location')
+    LocationStock = apps.get_model('core', 'LocationStock')
+    Product = apps.get_model('core', 'Product')
+    location = Location.objects.create(name='Main', is_default=True)
+    batch = []
+    for pk, quantity in Product.objects.order_by().values_list('pk', 'quantity').iterator(chunk_size=BATCH_SIZE):
+        batch.append(LocationStock(product_id=pk, location=location, quantity=quantity))
+        if len(batch) >= BATCH_SIZE:
+            LocationStock.objects.bulk_create(batch)
+            batch.clear()
+    LocationStock.objects.bulk_create(batch)
+    apps.get_model('core', 'StockMovement').objects.update(location=location)
+    apps.get_model('core', 'Sale').objects.update(location=location)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_purchase_orders'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Location',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, unique=True)),
+                ('kind', models.CharField(choices=[('store', 'Store'), ('warehouse', 'Warehouse')], default='store', max_length=10)),
+                ('address', models.TextField(blank=True)),
+                ('is_default', models.BooleanField(default=False)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['name'],
+            },
+        ),
+        migrations.CreateModel(
+            name='LocationStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name_plural': 'Location stock',
+                'ordering': ['location', 'product'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockTransfer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.IntegerField(validators=[django.core.validators.MinValueValidator(1)])),
+                ('notes', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'ordering': ['-created_at', '-id'],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='location',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_default', True)), fields=('is_default',), name='location_single_default'),
+        ),
+        migrations.AddField(
+            model_name='sale',
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='sales', to='core.location'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='location',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='stock_movements', to='core.location'),
+        ),
+        migrations.AddField(
+            model_name='locationstock',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_levels', to='core.location'),
+        ),
+        migrations.AddField(
+            model_name='locationstock',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_levels', to='core.product'),
+        ),
+        migrations.AddField(
+            model_name='stocktransfer',
+            name='created_by',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='stocktransfer',
+            name='destination',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='transfers_in', to='core.location'),
+        ),
+        migrations.AddField(
+            model_name='stocktransfer',
+            name='product',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transfers', to='core.product'),
+        ),
+        migrations.AddField(
+            model_name='stocktransfer',
+            name='source',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='transfers_out', to='core.location'),
+        ),
+        migrations.AddField(
+            model_name='stockmovement',
+            name='transfer',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='movements', to='core.stocktransfer'),
+        ),
+        migrations.AddIndex(
+            model_name='locationstock',
+            index=models.Index(fields=['location', 'product'], name='location_stock_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='locationstock',
+            unique_together={('product', 'location')},
+        ),
+        migrations.RunPython(add_default_location, migrations.RunPython.noop),
+    ]
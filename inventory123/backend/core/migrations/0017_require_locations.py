@@ -0,0 +1,25 @@
+# Generated by Django 5.0.2 on 2026-10-17 21:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # Separate from 0016: PostgreSQL cannot alter a table in the transaction that just updated its foreign keys.
+
+    dependencies = [
+        ('core', '0016_stock_locations'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sale',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='sales', to='core.location'),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='location',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='stock_movements', to='core.location'),
+        ),
+    ]
@@ -0,0 +1,50 @@
+# Generated by Django 5.0.2 on 2026-10-17 21:32
+
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
+
+
+def copy_forecasts(apps, schema_editor):
+    """Copy the stored forecasts onto their products and flag the products at their forecast reorder point."""
+    Product = apps.get_model('core', 'Product')
+    forecasts = apps.get_model('core', 'ProductForecast').objects.filter(product=OuterRef('pk'))
+    Product.objects.update(reorder_point=Coalesce(Subquery(forecasts.values('reorder_point')), Value(0)),
+                           days_of_cover=Subquery(forecasts.values('days_of_cover')))
+    low = Q(quantity__lte=F('reorder_level')) | Q(quantity__lte=F('reorder_point'))
+    Product.objects.filter(low, low_stock=False).update(low_stock=True)
+    apps.get_model('core', 'InventoryCounter').objects.filter(name='low_stock_products').update(
+        value=Product.objects.filter(low_stock=True).count())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_require_locations'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='product_low_stock_name_idx',
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='days_of_cover',
+            field=models.FloatField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reorder_point',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(copy_forecasts, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('low_stock', True)), fields=['name'], name='product_low_stock_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('low_stock', True)), fields=['days_of_cover', 'id'], name='product_low_stock_cover_idx'),
+        ),
+    ]
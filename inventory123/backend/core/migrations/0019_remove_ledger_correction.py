@@ -0,0 +1,18 @@
+# Generated by Django 5.0.2 on 2026-10-17 21:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_product_forecast_flag'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockledgerentry',
+            name='kind',
+            field=models.CharField(choices=[('opening', 'Opening stock'), ('movement', 'Stock movement'), ('sale', 'Sale')], max_length=10),
+        ),
+    ]
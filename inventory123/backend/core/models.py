@@ -1,5 +1,6 @@
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from django.core.validators import MinValueValidator
 from django.utils import timezone
 
@@ -12,6 +13,9 @@ class Category(models.Model):
     class Meta:
         verbose_name_plural = 'Categories'
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='category_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -27,10 +31,47 @@ class Supplier(models.Model):
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['updated_at', 'id'], name='supplier_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+class Location(models.Model):
+    """A store or warehouse holding stock. Movements and sales without a location use the default one."""
+    STORE = 'store'
+    WAREHOUSE = 'warehouse'
+    KINDS = [
+        (STORE, 'Store'),
+        (WAREHOUSE, 'Warehouse'),
+    ]
+
+    name = models.CharField(max_length=100, unique=True)
+    kind = models.CharField(max_length=10, choices=KINDS, default=STORE)
+    address = models.TextField(blank=True)
+    is_default = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['name']
+        constraints = [
+            models.UniqueConstraint(fields=['is_default'], condition=models.Q(is_default=True),
+                                    name='location_single_default'),
+        ]
+
+    def __str__(self):
+        return self.name
+
+# Product fields only written by F() updates from the stock services and the forecast run, never by a full save.
+SERVICE_FIELDS = ('quantity', 'reserved', 'reorder_point', 'days_of_cover')
+
+def low_stock_condition(delta=0):
+    """Products at or below their reorder level or forecast reorder point once ``delta`` is added to their stock."""
+    return (models.Q(quantity__lte=models.F('reorder_level') - delta) |
+            models.Q(quantity__lte=models.F('reorder_point') - delta))
+
 class Product(models.Model):
     name = models.CharField(max_length=200)
     description = models.TextField()
@@ -39,21 +80,70 @@ class Product(models.Model):
     sku = models.CharField(max_length=50, unique=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     cost_price = models.DecimalField(max_digits=10, decimal_places=2)
+    # Total over all locations: the sum of the product's LocationStock rows, updated in the same transaction.
     quantity = models.IntegerField(default=0)
+    # Part of ``quantity`` held by open checkout reservations (core/reservations.py); only changed by F() updates.
+    reserved = models.IntegerField(default=0, editable=False)
     reorder_level = models.IntegerField(default=10)
+    # Copied from the product's forecast by the nightly run (core/forecast.py), so the low-stock flag and the
+    # dashboard need no join: the forecast reorder point (0 without one) and the days of cover it was computed with.
+    reorder_point = models.IntegerField(default=0, editable=False)
+    days_of_cover = models.FloatField(null=True, editable=False)
+    # At or below the reorder level or the forecast reorder point; see ``low_stock_condition()``.
+    low_stock = models.BooleanField(default=False, editable=False)
     image = models.ImageField(upload_to='products/', null=True, blank=True)
+    # Storage paths of the resized copies of ``image`` (see core/images.py), plus the ``source`` they came from.
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name'], name='product_name_idx'),
+            # Partial, so ``WHERE low_stock`` (how the flag is filtered) can use them on SQLite as well.
+            models.Index(fields=['name'], condition=models.Q(low_stock=True), name='product_low_stock_name_idx'),
+            models.Index(fields=['days_of_cover', 'id'], condition=models.Q(low_stock=True),
+                         name='product_low_stock_cover_idx'),
+            models.Index(fields=['updated_at', 'id'], name='product_updated_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        self.low_stock = self.is_low_stock
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'quantity' in update_fields and not self._state.adding:
+            raise ValueError('Stock is changed with a stock movement at a location, not by saving the product.')
+        if update_fields is not None and 'reorder_level' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'low_stock'}
+        elif update_fields is None and not self._state.adding and not kwargs.get('force_insert'):
+            # Never write back a ``quantity`` or ``reserved`` read before concurrent sales, movements or
+            # reservations changed it (stock changes go through core/services.py), nor forecast figures the
+            # nightly run replaced. ``low_stock`` is worked out from the current values.
+            current = Product.objects.filter(pk=self.pk).values_list('quantity', 'reorder_point').first()
+            if current is not None:
+                self.quantity, self.reorder_point = current
+                self.low_stock = self.is_low_stock
+            kwargs['update_fields'] = [field.name for field in self._meta.concrete_fields
+                                       if not field.primary_key and field.name not in SERVICE_FIELDS]
+        super().save(*args, **kwargs)
+
+    @property
+    def available(self):
+        """Stock that is neither sold nor held by a reservation."""
+        return self.quantity - self.reserved
+
     @property
     def is_low_stock(self):
-        return self.quantity <= self.reorder_level
+        return self.quantity <= max(self.reorder_level, self.reorder_point)
+
+    @property
+    def image_variant_urls(self):
+        """``{size: {format: url}}`` for variants generated from the current image; empty until processed."""
+        from .images import variant_urls
+        return variant_urls(self)
 
 class StockMovement(models.Model):
     MOVEMENT_TYPES = [
@@ -65,40 +155,388 @@ class StockMovement(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_movements')
     movement_type = models.CharField(max_length=3, choices=MOVEMENT_TYPES)
     quantity = models.IntegerField()
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='stock_movements')
+    # Set on both movements of a transfer between locations.
+    transfer = models.ForeignKey('StockTransfer', on_delete=models.PROTECT, null=True, blank=True,
+                                 related_name='movements')
     reference_number = models.CharField(max_length=50, blank=True)
     notes = models.TextField(blank=True)
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='movement_created_id_idx'),
+            models.Index(fields=['movement_type', '-created_at', '-id'], name='movement_type_created_idx'),
+            models.Index(fields=['product', '-created_at', '-id'], name='movement_product_created_idx'),
+            models.Index(fields=['updated_at', 'id'], name='movement_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.get_movement_type_display()} - {self.product.name} ({self.quantity})"
 
-    def save(self, *args, **kwargs):
-        if self.movement_type == 'IN':
-            self.product.quantity += self.quantity
-        else:
-            self.product.quantity -= self.quantity
-        self.product.save()
-        super().save(*args, **kwargs)
-
 class Sale(models.Model):
     product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='sales')
     quantity = models.IntegerField()
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='sales')
     unit_price = models.DecimalField(max_digits=10, decimal_places=2)
     total_amount = models.DecimalField(max_digits=10, decimal_places=2)
+    # The product's cost_price when sold, so margins do not move when the cost changes later.
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True, editable=False)
     sale_date = models.DateTimeField()
     created_by = models.ForeignKey(User, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ['-sale_date']
+        indexes = [
+            models.Index(fields=['-sale_date', '-id'], name='sale_date_id_idx'),
+            models.Index(fields=['product', '-sale_date', '-id'], name='sale_product_date_idx'),
+            models.Index(fields=['updated_at', 'id'], name='sale_updated_idx'),
+        ]
 
     def __str__(self):
         return f"Sale of {self.product.name} ({self.quantity})"
 
     def save(self, *args, **kwargs):
         self.total_amount = self.quantity * self.unit_price
-        super().save(*args, **kwargs) 
\ No newline at end of file
+        if self.unit_cost is None:
+            self.unit_cost = self.product.cost_price
+        super().save(*args, **kwargs)
+
+class LocationStock(models.Model):
+    """Stock of a product at one location; see core/services.py."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='stock_levels')
+    location = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='stock_levels')
+    quantity = models.IntegerField(default=0)
+
+    class Meta:
+        ordering = ['location', 'product']
+        verbose_name_plural = 'Location stock'
+        unique_together = ('product', 'location')
+        indexes = [
+            models.Index(fields=['location', 'product'], name='location_stock_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x product {self.product_id} at location {self.location_id}"
+
+class StockTransfer(models.Model):
+    """Stock moved between two locations, recorded as an OUT and an IN movement."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='transfers')
+    source = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='transfers_out')
+    destination = models.ForeignKey(Location, on_delete=models.PROTECT, related_name='transfers_in')
+    quantity = models.IntegerField(validators=[MinValueValidator(1)])
+    notes = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+
+    def __str__(self):
+        return f"Transfer of {self.quantity} x product {self.product_id} from {self.source_id} to {self.destination_id}"
+
+class InventoryCounter(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+class DailySummary(models.Model):
+    date = models.DateField(unique=True)
+    sales_count = models.IntegerField(default=0)
+    units_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    units_in = models.IntegerField(default=0)
+    units_out = models.IntegerField(default=0)
+    units_adjusted = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name_plural = 'Daily summaries'
+        ordering = ['-date']
+
+    def __str__(self):
+        return str(self.date)
+
+class ProductDailySales(models.Model):
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    date = models.DateField()
+    sales_count = models.IntegerField(default=0)
+    units_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+
+    class Meta:
+        verbose_name_plural = 'Product daily sales'
+        ordering = ['-date']
+        unique_together = ('product', 'date')
+
+    def __str__(self):
+        return f"{self.product_id} on {self.date}"
+
+class SalesRollup(models.Model):
+    """
+    Sales totals per period, category and supplier for the analytics endpoint (see core/analytics.py).
+
+    Writes add to ``day`` rows; the nightly compaction folds finished days into
+    ``week`` and ``month`` rows and marks them ``compacted``.
+    """
+    DAY = 'day'
+    WEEK = 'week'
+    MONTH = 'month'
+    GRAINS = [
+        (DAY, 'Day'),
+        (WEEK, 'Week'),
+        (MONTH, 'Month'),
+    ]
+
+    grain = models.CharField(max_length=5, choices=GRAINS)
+    start = models.DateField()
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, related_name='+')
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='+')
+    sales_count = models.IntegerField(default=0)
+    units_sold = models.IntegerField(default=0)
+    revenue = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    cost = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    compacted = models.BooleanField(default=False)
+
+    class Meta:
+        ordering = ['grain', 'start']
+        unique_together = ('grain', 'start', 'category', 'supplier')
+        indexes = [
+            # Day rows the nightly compaction has not folded into weeks and months yet.
+            models.Index(fields=['grain', 'start'], condition=models.Q(compacted=False), name='rollup_pending_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.grain} {self.start} ({self.category_id}, {self.supplier_id})"
+
+class Reservation(models.Model):
+    """Stock held for a checkout until it is committed as a sale, released or expires; see core/reservations.py."""
+    HELD = 'held'
+    COMMITTED = 'committed'
+    RELEASED = 'released'
+    EXPIRED = 'expired'
+    STATUSES = [
+        (HELD, 'Held'),
+        (COMMITTED, 'Committed'),
+        (RELEASED, 'Released'),
+        (EXPIRED, 'Expired'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='reservations')
+    quantity = models.IntegerField(validators=[MinValueValidator(1)])
+    status = models.CharField(max_length=10, choices=STATUSES, default=HELD)
+    expires_at = models.DateTimeField()
+    sale = models.ForeignKey(Sale, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    closed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Open holds by expiry, for the sweeper.
+            models.Index(fields=['expires_at'], condition=models.Q(status='held'), name='reservation_held_idx'),
+        ]
+
+    def __str__(self):
+        return f"Reservation #{self.pk} of {self.quantity} x product {self.product_id} ({self.status})"
+
+class PurchaseOrder(models.Model):
+    """An order of stock from one supplier; generated from low stock or entered by hand (see core/purchasing.py)."""
+    DRAFT = 'draft'
+    ORDERED = 'ordered'
+    RECEIVED = 'received'
+    CANCELLED = 'cancelled'
+    STATUSES = [
+        (DRAFT, 'Draft'),
+        (ORDERED, 'Ordered'),
+        (RECEIVED, 'Received'),
+        (CANCELLED, 'Cancelled'),
+    ]
+    # Still expected to bring stock in.
+    OPEN = (DRAFT, ORDERED)
+
+    supplier = models.ForeignKey(Supplier, on_delete=models.CASCADE, related_name='purchase_orders')
+    status = models.CharField(max_length=10, choices=STATUSES, default=DRAFT)
+    created_by = models.ForeignKey(User, on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+    ordered_at = models.DateTimeField(null=True, blank=True)
+    received_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at', '-id']
+        indexes = [
+            models.Index(fields=['supplier', '-created_at'], name='po_supplier_created_idx'),
+            models.Index(fields=['status', '-created_at'], name='po_status_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"PO-{self.pk} to {self.supplier.name} ({self.status})"
+
+class PurchaseOrderLine(models.Model):
+    order = models.ForeignKey(PurchaseOrder, on_delete=models.CASCADE, related_name='lines')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='purchase_order_lines')
+    quantity = models.IntegerField(validators=[MinValueValidator(1)])
+    unit_cost = models.DecimalField(max_digits=10, decimal_places=2)
+
+    class Meta:
+        ordering = ['id']
+        unique_together = ('order', 'product')
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product.name} on PO-{self.order_id}"
+
+class ProductForecast(models.Model):
+    """A product's demand forecast and reorder suggestion, recomputed nightly from its daily sales (see core/forecast.py)."""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, primary_key=True, related_name='forecast')
+    # Units per day.
+    moving_average = models.FloatField()
+    smoothed_demand = models.FloatField()
+    demand_deviation = models.FloatField()
+    # At the stock the forecast was computed with; empty when nothing sells.
+    days_of_cover = models.FloatField(null=True)
+    reorder_point = models.IntegerField()
+    reorder_quantity = models.IntegerField()
+    computed_at = models.DateTimeField()
+
+    def __str__(self):
+        return f"Forecast for product {self.product_id}: {self.smoothed_demand:.2f}/day"
+
+class StockLedgerEntry(models.Model):
+    """One signed change to a product's stock. Entries are only ever inserted; see core/ledger.py."""
+    OPENING = 'opening'
+    MOVEMENT = 'movement'
+    SALE = 'sale'
+    KINDS = [
+        (OPENING, 'Opening stock'),
+        (MOVEMENT, 'Stock movement'),
+        (SALE, 'Sale'),
+    ]
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', db_index=False)
+    delta = models.IntegerField()
+    kind = models.CharField(max_length=10, choices=KINDS)
+    # The StockMovement or Sale behind a movement or sale entry.
+    object_id = models.BigIntegerField(null=True, blank=True)
+    recorded_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['recorded_at', 'id']
+        verbose_name_plural = 'Stock ledger entries'
+        indexes = [
+            models.Index(fields=['product', 'recorded_at', 'id'], name='ledger_product_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.delta:+d} x product {self.product_id} ({self.kind})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Stock ledger entries cannot be changed.')
+        super().save(*args, **kwargs)
+
+class StockSnapshot(models.Model):
+    """A product's stock at ``taken_at``: the sum of its ledger entries recorded up to then."""
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='+', db_index=False)
+    taken_at = models.DateTimeField()
+    quantity = models.IntegerField()
+
+    class Meta:
+        ordering = ['product', 'taken_at']
+        unique_together = ('product', 'taken_at')
+
+    def __str__(self):
+        return f"Product {self.product_id}: {self.quantity} at {self.taken_at}"
+
+class Tombstone(models.Model):
+    """Records a deleted row so delta-sync clients can drop it from their copy."""
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['deleted_at']
+        indexes = [
+            models.Index(fields=['model', 'deleted_at'], name='tombstone_model_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.model} #{self.object_id}"
+
+class Job(models.Model):
+    """A unit of background work, claimed and run by ``manage.py run_jobs``; see core/jobs.py."""
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    SUCCEEDED = 'succeeded'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATUSES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+    ]
+
+    task = models.CharField(max_length=100)
+    kwargs = models.JSONField(default=dict, blank=True)
+    queue = models.CharField(max_length=50, default='default')
+    priority = models.IntegerField(default=0)
+    status = models.CharField(max_length=10, choices=STATUSES, default=QUEUED)
+    attempts = models.IntegerField(default=0)
+    max_attempts = models.IntegerField(default=3)
+    run_at = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'queue', '-priority', 'run_at', 'id'], name='job_ready_idx'),
+            models.Index(fields=['status', 'locked_at'], name='job_status_locked_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.task} #{self.pk} ({self.status})"
+
+class AuditEntry(models.Model):
+    """A create, update or delete of a catalog or stock row; written in batches by core/audit.py."""
+    CREATE = 'create'
+    UPDATE = 'update'
+    DELETE = 'delete'
+    ACTIONS = [
+        (CREATE, 'Create'),
+        (UPDATE, 'Update'),
+        (DELETE, 'Delete'),
+    ]
+
+    model = models.CharField(max_length=50)
+    object_id = models.BigIntegerField()
+    object_repr = models.CharField(max_length=200)
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    # {field: [old, new]}: every field for a create or delete, only the changed ones for an update.
+    changes = models.JSONField(default=dict, encoder=DjangoJSONEncoder)
+    actor = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    remote_addr = models.GenericIPAddressField(null=True, blank=True)
+    timestamp = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        ordering = ['-timestamp']
+        verbose_name_plural = 'Audit entries'
+        indexes = [
+            models.Index(fields=['model', 'object_id'], name='audit_object_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.action} {self.model} #{self.object_id}"
@@ -0,0 +1,118 @@
+import base64
+import json
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over a descending ``(ordering_field, id)`` key.
+
+    Each page is a single indexed range scan: no ``COUNT(*)`` and no OFFSET, so
+    page 1000 costs the same as page 1. Ties on the ordering field are broken
+    by ``id``, which keeps pages stable when many rows share a timestamp.
+    """
+    ordering_field = 'created_at'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    @property
+    def max_page_size(self):
+        return getattr(settings, 'API_MAX_PAGE_SIZE', 100)
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            reverse, value, pk = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            value = parse_datetime(value)
+            if value is None:
+                raise ValueError
+            return bool(reverse), value, int(pk)
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, reverse, obj):
+        value = getattr(obj, self.ordering_field).isoformat()
+        encoded = base64.urlsafe_b64encode(json.dumps([int(reverse), value, obj.pk]).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        field = self.ordering_field
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor[0])
+
+        if cursor is None:
+            queryset = queryset.order_by(f'-{field}', '-pk')
+        elif reverse:
+            _, value, pk = cursor
+            queryset = queryset.filter(Q(**{f'{field}__gt': value}) | Q(**{field: value, 'pk__gt': pk}),
+                                       **{f'{field}__gte': value})
+            queryset = queryset.order_by(field, 'pk')
+        else:
+            _, value, pk = cursor
+            # The redundant ``<=`` bound gives the planner a sargable range on the index.
+            queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'pk__lt': pk}),
+                                       **{f'{field}__lte': value})
+            queryset = queryset.order_by(f'-{field}', '-pk')
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+        # Walking backwards always came from a later page; walking forwards from a cursor always has an earlier one.
+        self.has_next = reverse or has_more
+        self.has_previous = has_more if reverse else cursor is not None
+        self.page = rows
+        return rows
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(False, self.page[-1])
+
+    def get_previous_link(self):
+        if not self.has_previous or not self.page:
+            return None
+        return self.encode_cursor(True, self.page[0])
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+class SaleCursorPagination(KeysetPagination):
+    ordering_field = 'sale_date'
+
+class StockMovementCursorPagination(KeysetPagination):
+    ordering_field = 'created_at'
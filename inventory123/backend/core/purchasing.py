@@ -0,0 +1,102 @@
+"""
+Purchase orders.
+
+``generate()`` turns every product that needs restocking into draft purchase
+orders, one per supplier. A product needs restocking when it is at its
+``reorder_level`` or at its forecast reorder point (core/forecast.py) and is
+not already on an open order. It is ordered up to its forecast target: the
+reorder point plus ``FORECAST_REVIEW_DAYS`` of demand. Without a forecast it
+is ordered up to twice its reorder level. Generation is two INSERT ... SELECT
+statements, one for the headers and one for the lines, so its cost does not
+grow with a Python loop over suppliers or products. Concurrent calls are
+serialized, so a product due once is ordered once: on PostgreSQL by an
+advisory lock, on SQLite by the write lock the first INSERT takes before it
+reads.
+
+``receive()`` books an order's lines in as IN stock movements through
+``ingest_movements``, in one transaction. That is one aggregated stock
+update, bulk inserts and ledger entries, however many lines the order has.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Case, DateTimeField, Exists, F, IntegerField, OuterRef, Subquery, Value, When
+from django.db.models.functions import Cast, Ceil, Greatest
+from django.utils import timezone
+from .jobs import advisory_lock
+from .models import Product, PurchaseOrder, PurchaseOrderLine
+from .services import ingest_movements
+
+class PurchaseOrderClosed(Exception):
+    pass
+
+def order_quantity():
+    """Units to order for a product, as an expression: up to its target stock, counting reserved units as gone."""
+    review_demand = F('forecast__smoothed_demand') * settings.FORECAST_REVIEW_DAYS
+    target = Case(When(forecast__reorder_point__gt=0,
+                       then=Cast(Ceil(F('forecast__reorder_point') + review_demand), IntegerField())),
+                  default=F('reorder_level') * 2, output_field=IntegerField())
+    return Greatest(target - F('quantity') + F('reserved'), Value(1))
+
+def due_products():
+    """Products that need restocking and are not on an open purchase order yet."""
+    on_order = PurchaseOrderLine.objects.filter(product=OuterRef('pk'), order__status__in=PurchaseOrder.OPEN)
+    return Product.objects.filter(low_stock=True).exclude(Exists(on_order)).order_by()
+
+def _insert_select(model, fields, queryset):
+    """``INSERT INTO model (fields) SELECT ...``: ``queryset`` must select one value per field, in order."""
+    sql, params = queryset.query.sql_with_params()
+    columns = ', '.join(connection.ops.quote_name(model._meta.get_field(name).column) for name in fields)
+    with connection.cursor() as cursor:
+        cursor.execute(f'INSERT INTO {connection.ops.quote_name(model._meta.db_table)} ({columns}) {sql}', params)
+        return cursor.rowcount
+
+@transaction.atomic
+def generate(user, supplier=None):
+    """Create draft purchase orders for every product that needs restocking; returns ``(orders, lines)`` created."""
+    # Taken before due_products() is read, so a second call waits and then sees the first one's lines as on order.
+    advisory_lock('purchasing:generate')
+    now = timezone.now()
+    products = due_products()
+    if supplier is not None:
+        products = products.filter(supplier=supplier)
+    # Annotations are selected in the order they are added, so each queryset lists them in column order.
+    orders = _insert_select(PurchaseOrder, ['supplier', 'status', 'created_by', 'created_at'], (
+        products.annotate(po_supplier=F('supplier'), po_status=Value(PurchaseOrder.DRAFT),
+                          po_created_by=Value(user.pk), po_created_at=Value(now, output_field=DateTimeField()))
+                .values_list('po_supplier', 'po_status', 'po_created_by', 'po_created_at').distinct()))
+    if not orders:
+        return 0, 0
+    order = PurchaseOrder.objects.filter(supplier=OuterRef('supplier'), created_by=user, created_at=now,
+                                         status=PurchaseOrder.DRAFT).order_by().values('pk')[:1]
+    lines = _insert_select(PurchaseOrderLine, ['order', 'product', 'quantity', 'unit_cost'], (
+        products.annotate(po_order=Subquery(order), po_product=F('pk'), po_quantity=order_quantity(),
+                          po_unit_cost=F('cost_price'))
+                .values_list('po_order', 'po_product', 'po_quantity', 'po_unit_cost')))
+    return orders, lines
+
+def _claim(order, status, allowed, **fields):
+    if not PurchaseOrder.objects.filter(pk=order.pk, status__in=allowed).update(status=status, **fields):
+        raise PurchaseOrderClosed(f"Purchase order {order.pk} is no longer {' or '.join(allowed)}.")
+    order.status = status
+    for name, value in fields.items():
+        setattr(order, name, value)
+
+def place(order):
+    """Mark a draft as sent to the supplier."""
+    _claim(order, PurchaseOrder.ORDERED, [PurchaseOrder.DRAFT], ordered_at=timezone.now())
+    return order
+
+def cancel(order):
+    _claim(order, PurchaseOrder.CANCELLED, PurchaseOrder.OPEN)
+    return order
+
+@transaction.atomic
+def receive(order, user):
+    """Book every line of an open order in as stock; returns the number of stock movements created."""
+    _claim(order, PurchaseOrder.RECEIVED, PurchaseOrder.OPEN, received_at=timezone.now())
+    reference = f'PO-{order.pk}'
+    entries = [(index, {'product': product_id, 'movement_type': 'IN', 'quantity': quantity,
+                        'reference_number': reference, 'notes': ''})
+               for index, (product_id, quantity) in enumerate(order.lines.values_list('product_id', 'quantity'))]
+    created, _ = ingest_movements(entries, user)
+    return created
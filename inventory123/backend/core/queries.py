@@ -0,0 +1,63 @@
+from functools import lru_cache
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+def _relation_path(model, attrs):
+    """Longest prefix of ``attrs`` that follows forward foreign keys / one-to-ones from ``model``."""
+    path = []
+    for attr in attrs:
+        try:
+            field = model._meta.get_field(attr)
+        except FieldDoesNotExist:
+            break
+        if not (field.many_to_one or field.one_to_one) or field.related_model is None:
+            break
+        path.append(attr)
+        model = field.related_model
+    return path, model
+
+def _collect(serializer, model, prefix, select, prefetch):
+    for field in serializer.fields.values():
+        if field.write_only or field.source == '*':
+            continue
+        if isinstance(field, serializers.ListSerializer):
+            prefetch.add(prefix + field.source.replace('.', '__'))
+            continue
+        if isinstance(field, serializers.ManyRelatedField):
+            prefetch.add(prefix + field.source.replace('.', '__'))
+            continue
+        path, related_model = _relation_path(model, field.source_attrs)
+        if isinstance(field, serializers.BaseSerializer):
+            if path:
+                select.add(prefix + '__'.join(path))
+                _collect(field, related_model, prefix + '__'.join(path) + '__', select, prefetch)
+        elif len(path) == len(field.source_attrs):
+            # A bare relation rendered as a primary key only needs the ``<name>_id`` column.
+            if len(path) > 1 or not isinstance(field, serializers.PrimaryKeyRelatedField):
+                select.add(prefix + '__'.join(path))
+        elif path:
+            select.add(prefix + '__'.join(path))
+
+@lru_cache(maxsize=None)
+def related_paths(serializer_class):
+    """
+    Work out the ``select_related`` and ``prefetch_related`` lookups needed to
+    render ``serializer_class`` without per-row queries.
+    """
+    select, prefetch = set(), set()
+    _collect(serializer_class(), serializer_class.Meta.model, '', select, prefetch)
+    return tuple(sorted(select)), tuple(sorted(prefetch))
+
+def optimize_queryset(queryset, serializer_class):
+    select, prefetch = related_paths(serializer_class)
+    if select:
+        queryset = queryset.select_related(*select)
+    if prefetch:
+        queryset = queryset.prefetch_related(*prefetch)
+    return queryset
+
+class OptimizedQuerysetMixin:
+    """Joins or prefetches every relation the viewset's serializer renders."""
+
+    def get_queryset(self):
+        return optimize_queryset(super().get_queryset(), self.get_serializer_class())
@@ -0,0 +1,105 @@
+"""
+Short-lived stock reservations for checkouts.
+
+``reserve()`` holds stock for ``RESERVATION_TTL_SECONDS`` with one
+conditional UPDATE: it adds to ``Product.reserved`` only while the unreserved
+stock covers the quantity. Concurrent checkouts of a popular product
+therefore never oversell, and no lock is held between reading the stock and
+writing it. ``commit()`` turns a reservation into a Sale and ``release()``
+gives the stock back. Each first claims the reservation with a conditional
+UPDATE on its status, so exactly one of commit, release and expiry wins.
+
+``expire()`` hands back holds past their expiry. Workers run it every minute
+(``run_jobs``), and ``reserve()`` runs it for the product when stock looks
+short, so abandoned checkouts never block a sale for long. Sales and stock-outs
+recorded without a reservation (core/services.py) only take unreserved stock.
+
+Reservations hold stock of the product, whichever location it is at; the
+location it leaves from is picked when the reservation is committed.
+"""
+from collections import defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import Product, Reservation, Sale
+from .services import InsufficientStock, record_sale
+
+EXPIRE_BATCH_SIZE = 500
+
+class ReservationClosed(Exception):
+    pass
+
+def reserve(product_id, quantity, user, ttl=None):
+    """Hold ``quantity`` of a product for ``ttl`` seconds; raises ``InsufficientStock`` if it is not available."""
+    ttl = settings.RESERVATION_TTL_SECONDS if ttl is None else ttl
+    for attempt in range(2):
+        with transaction.atomic():
+            held = (Product.objects.filter(pk=product_id, quantity__gte=F('reserved') + quantity)
+                                   .update(reserved=F('reserved') + quantity))
+            if held:
+                return Reservation.objects.create(product_id=product_id, quantity=quantity, created_by=user,
+                                                  expires_at=timezone.now() + timedelta(seconds=ttl))
+        # Stock may only look short because of abandoned checkouts.
+        if attempt or not expire(product_id=product_id):
+            break
+    raise InsufficientStock(f"Cannot reserve {quantity} items of product {product_id}: not enough stock.")
+
+def _close(reservation, status):
+    now = timezone.now()
+    claim = Reservation.objects.filter(pk=reservation.pk, status=Reservation.HELD)
+    if status == Reservation.COMMITTED:
+        claim = claim.filter(expires_at__gt=now)
+    if not claim.update(status=status, closed_at=now):
+        raise ReservationClosed(f"Reservation {reservation.pk} is no longer held.")
+    reservation.status, reservation.closed_at = status, now
+
+@transaction.atomic
+def commit(reservation, unit_price=None, sale_date=None, location=None):
+    """
+    Record the reserved stock as a Sale and return it; raises ``ReservationClosed``
+    once expired or closed, and ``InsufficientStock`` if ``location`` (the
+    default location if not given) does not hold the reserved quantity.
+    """
+    _close(reservation, Reservation.COMMITTED)
+    sale = Sale(product_id=reservation.product_id, quantity=reservation.quantity, unit_price=unit_price,
+                sale_date=sale_date, location=location, created_by_id=reservation.created_by_id)
+    record_sale(sale, reserved=reservation.quantity)
+    Reservation.objects.filter(pk=reservation.pk).update(sale=sale)
+    reservation.sale = sale
+    return sale
+
+@transaction.atomic
+def release(reservation):
+    """Give the reserved stock back; raises ``ReservationClosed`` if the reservation was already closed."""
+    _close(reservation, Reservation.RELEASED)
+    Product.objects.filter(pk=reservation.product_id).update(reserved=F('reserved') - reservation.quantity)
+    return reservation
+
+def expire(product_id=None):
+    """Close held reservations past their expiry and return their stock; returns how many were closed."""
+    expired = 0
+    while True:
+        with transaction.atomic():
+            now = timezone.now()
+            due = Reservation.objects.filter(status=Reservation.HELD, expires_at__lte=now)
+            if product_id is not None:
+                due = due.filter(product_id=product_id)
+            pks = list(due.values_list('pk', flat=True)[:EXPIRE_BATCH_SIZE])
+            if not pks:
+                return expired
+            # The status condition makes the claim exclusive against a concurrent commit or release; this sweep's
+            # ``closed_at`` then tells its own rows apart.
+            Reservation.objects.filter(pk__in=pks, status=Reservation.HELD).update(
+                status=Reservation.EXPIRED, closed_at=now)
+            totals = defaultdict(int)
+            for product, quantity in (Reservation.objects.filter(pk__in=pks, status=Reservation.EXPIRED,
+                                                                 closed_at=now)
+                                                         .values_list('product_id', 'quantity')):
+                totals[product] += quantity
+                expired += 1
+            for product, quantity in totals.items():
+                Product.objects.filter(pk=product).update(reserved=F('reserved') - quantity)
+        if len(pks) < EXPIRE_BATCH_SIZE:
+            return expired
@@ -0,0 +1,173 @@
+"""
+Ranked product search.
+
+PostgreSQL keeps a weighted ``search_vector`` tsvector on ``core_product``
+(name and SKU weigh more than the description), maintained by a trigger and
+GIN-indexed, plus pg_trgm indexes on ``name`` and ``UPPER(sku)`` for partial
+and misspelt matches. SQLite gets the same shape from two FTS5 tables kept in
+step by triggers: ``core_product_fts`` for word prefixes ranked by bm25 and
+``core_product_trigram`` for substrings. Both are installed by migration 0007;
+any other backend, or SQLite built without FTS5, falls back to ``icontains``.
+"""
+import re
+from functools import lru_cache
+from django.conf import settings
+from django.db import OperationalError, connections
+from django.db.models import BooleanField, Case, FloatField, IntegerField, Q, Value, When
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
+from rest_framework.filters import BaseFilterBackend
+
+SEARCH_CONFIG = 'simple'
+MAX_TERMS = 8
+
+POSTGRES_INSTALL = [
+    'CREATE EXTENSION IF NOT EXISTS pg_trgm',
+    'ALTER TABLE core_product ADD COLUMN IF NOT EXISTS search_vector tsvector',
+    f"""
+    CREATE OR REPLACE FUNCTION core_product_search_vector() RETURNS trigger AS $$
+    BEGIN
+        NEW.search_vector :=
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.name, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(NEW.sku, '')), 'A') ||
+            setweight(to_tsvector('{SEARCH_CONFIG}', left(coalesce(NEW.description, ''), 20000)), 'C');
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+    """,
+    'DROP TRIGGER IF EXISTS core_product_search_vector ON core_product',
+    """
+    CREATE TRIGGER core_product_search_vector BEFORE INSERT OR UPDATE OF name, sku, description
+    ON core_product FOR EACH ROW EXECUTE FUNCTION core_product_search_vector()
+    """,
+    # Touching name fires the trigger, which fills in the vector for existing rows.
+    'UPDATE core_product SET name = name WHERE search_vector IS NULL',
+    'CREATE INDEX IF NOT EXISTS product_search_vector_idx ON core_product USING gin (search_vector)',
+    'CREATE INDEX IF NOT EXISTS product_name_trgm_idx ON core_product USING gin (name gin_trgm_ops)',
+    'CREATE INDEX IF NOT EXISTS product_sku_trgm_idx ON core_product USING gin (UPPER(sku) gin_trgm_ops)',
+]
+
+POSTGRES_UNINSTALL = [
+    'DROP INDEX IF EXISTS product_sku_trgm_idx',
+    'DROP INDEX IF EXISTS product_name_trgm_idx',
+    'DROP INDEX IF EXISTS product_search_vector_idx',
+    'DROP TRIGGER IF EXISTS core_product_search_vector ON core_product',
+    'DROP FUNCTION IF EXISTS core_product_search_vector()',
+    'ALTER TABLE core_product DROP COLUMN IF EXISTS search_vector',
+]
+
+# FTS5 table name -> (indexed columns, table options)
+SQLITE_TABLES = {
+    'core_product_fts': (('name', 'sku', 'description'), "prefix='2 3', tokenize='unicode61 remove_diacritics 2'"),
+    'core_product_trigram': (('name', 'sku'), "tokenize='trigram'"),
+}
+
+def _sqlite_statements(table, columns, options):
+    cols = ', '.join(columns)
+    new = ', '.join(f'new.{col}' for col in columns)
+    old = ', '.join(f'old.{col}' for col in columns)
+    insert = f'INSERT INTO {table}(rowid, {cols}) VALUES (new.id, {new});'
+    delete = f"INSERT INTO {table}({table}, rowid, {cols}) VALUES ('delete', old.id, {old});"
+    return [
+        f"CREATE VIRTUAL TABLE IF NOT EXISTS {table} USING fts5({cols}, content='core_product', "
+        f"content_rowid='id', {options})",
+        f'CREATE TRIGGER IF NOT EXISTS {table}_ai AFTER INSERT ON core_product BEGIN {insert} END',
+        f'CREATE TRIGGER IF NOT EXISTS {table}_ad AFTER DELETE ON core_product BEGIN {delete} END',
+        f'CREATE TRIGGER IF NOT EXISTS {table}_au AFTER UPDATE OF {cols} ON core_product '
+        f'BEGIN {delete} {insert} END',
+    ]
+
+def install(connection):
+    """Create (or repair) the search index for ``connection``; safe to run repeatedly."""
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for statement in POSTGRES_INSTALL:
+                cursor.execute(statement)
+        elif connection.vendor == 'sqlite':
+            # Rebuilding a table (SQLite ALTER TABLE in a migration) drops its triggers; recreate and reindex.
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND tbl_name = 'core_product'")
+            triggers = {name for (name,) in cursor.fetchall()}
+            for table, (columns, options) in SQLITE_TABLES.items():
+                if {f'{table}_ai', f'{table}_ad', f'{table}_au'} <= triggers:
+                    continue
+                try:
+                    for statement in _sqlite_statements(table, columns, options):
+                        cursor.execute(statement)
+                except OperationalError:
+                    # SQLite without FTS5 (or without the trigram tokenizer): search uses the fallback.
+                    continue
+                cursor.execute(f"INSERT INTO {table}({table}) VALUES ('rebuild')")
+    _search_tables.cache_clear()
+
+def uninstall(connection):
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            for statement in POSTGRES_UNINSTALL:
+                cursor.execute(statement)
+        elif connection.vendor == 'sqlite':
+            for table in SQLITE_TABLES:
+                for suffix in ('ai', 'ad', 'au'):
+                    cursor.execute(f'DROP TRIGGER IF EXISTS {table}_{suffix}')
+                cursor.execute(f'DROP TABLE IF EXISTS {table}')
+    _search_tables.cache_clear()
+
+@lru_cache(maxsize=None)
+def _search_tables(alias):
+    return frozenset(connections[alias].introspection.table_names()) & frozenset(SQLITE_TABLES)
+
+def terms(text):
+    return re.findall(r'\w+', text.lower())[:MAX_TERMS]
+
+def _postgres_search(queryset, text, words):
+    from django.contrib.postgres.search import TrigramSimilarity
+
+    # Every word must match; the last one may be incomplete while the user is typing.
+    tsquery = ' & '.join(f'{word}:*' for word in words)
+    vector = f'"{queryset.model._meta.db_table}"."search_vector"'
+    matches = RawSQL(f"{vector} @@ to_tsquery('{SEARCH_CONFIG}', %s)", (tsquery,), output_field=BooleanField())
+    rank = RawSQL(f"ts_rank_cd({vector}, to_tsquery('{SEARCH_CONFIG}', %s))", (tsquery,), output_field=FloatField())
+    return (queryset.filter(Q(matches) | Q(sku__icontains=text) | Q(name__trigram_similar=text))
+                    .annotate(search_rank=rank + Greatest(TrigramSimilarity('name', text), TrigramSimilarity('sku', text)))
+                    .order_by('-search_rank', 'name', 'pk'))
+
+def _sqlite_search(queryset, text, words, tables):
+    limit = getattr(settings, 'SEARCH_MAX_RESULTS', 1000)
+    ranked = []
+    with connections[queryset.db].cursor() as cursor:
+        if 'core_product_fts' in tables:
+            cursor.execute(
+                'SELECT rowid FROM core_product_fts WHERE core_product_fts MATCH %s '
+                'ORDER BY bm25(core_product_fts, 10.0, 10.0, 1.0) LIMIT %s',
+                [' '.join(f'"{word}"*' for word in words), limit])
+            ranked = [pk for (pk,) in cursor.fetchall()]
+        # The trigram tokenizer needs at least three characters to match a substring.
+        if 'core_product_trigram' in tables and len(text) >= 3 and len(ranked) < limit:
+            cursor.execute('SELECT rowid FROM core_product_trigram WHERE core_product_trigram MATCH %s LIMIT %s',
+                           ['"' + text.replace('"', '""') + '"', limit])
+            seen = set(ranked)
+            ranked += [pk for (pk,) in cursor.fetchall() if pk not in seen][:limit - len(ranked)]
+    if not ranked:
+        return queryset.none()
+    position = Case(*[When(pk=pk, then=Value(n)) for n, pk in enumerate(ranked)], output_field=IntegerField())
+    return queryset.filter(pk__in=ranked).annotate(search_rank=-position).order_by('-search_rank')
+
+def search_products(queryset, text):
+    """Filter a Product queryset to matches for ``text``, best match first (``search_rank`` annotation)."""
+    text = text.strip()[:100]
+    words = terms(text)
+    vendor = connections[queryset.db].vendor
+    if words and vendor == 'postgresql':
+        return _postgres_search(queryset, text, words)
+    tables = _search_tables(queryset.db) if vendor == 'sqlite' else ()
+    if words and tables:
+        return _sqlite_search(queryset, text, words, tables)
+    return (queryset.filter(Q(name__icontains=text) | Q(sku__icontains=text) | Q(description__icontains=text))
+                    .order_by('name', 'pk'))
+
+class ProductSearchFilter(BaseFilterBackend):
+    """``?search=`` on products, ranked by :func:`search_products`."""
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        text = request.query_params.get(self.search_param, '')
+        return search_products(queryset, text) if text.strip() else queryset
@@ -1,5 +1,10 @@
 from rest_framework import serializers
-from .models import Category, Supplier, Product, StockMovement, Sale
+from .analytics import GROUPS, day_history_start
+from .models import (Category, Supplier, Product, ProductForecast, StockMovement, Sale, Job, SalesRollup, Reservation,
+                     PurchaseOrder, PurchaseOrderLine, Location, LocationStock, StockTransfer)
+from .reservations import reserve
+from .services import InsufficientStock, record_movement, record_sale, transfer_stock
+from django.conf import settings
 from django.contrib.auth.models import User
 
 class UserSerializer(serializers.ModelSerializer):
@@ -20,11 +25,58 @@ class SupplierSerializer(serializers.ModelSerializer):
 class ProductSerializer(serializers.ModelSerializer):
     category_name = serializers.CharField(source='category.name', read_only=True)
     supplier_name = serializers.CharField(source='supplier.name', read_only=True)
+    # {size: {format: url}}; empty until the worker has resized the current image.
+    image_variants = serializers.SerializerMethodField()
 
     class Meta:
         model = Product
+        # Reservations change ``reserved`` on every checkout; it would keep invalidating the cached product
+        # responses. The forecast copies are served with the forecast itself (LowStockProductSerializer).
+        exclude = ('reserved', 'reorder_point', 'days_of_cover')
+
+    def get_extra_kwargs(self):
+        extra_kwargs = super().get_extra_kwargs()
+        if self.instance is not None:
+            # Opening stock only; later changes are ADJ stock movements.
+            extra_kwargs['quantity'] = {**extra_kwargs.get('quantity', {}), 'read_only': True}
+        return extra_kwargs
+
+    def get_image_variants(self, obj):
+        request = self.context.get('request')
+        return {size: {fmt: request.build_absolute_uri(url) if request else url for fmt, url in urls.items()}
+                for size, urls in obj.image_variant_urls.items()}
+
+class LocationSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Location
         fields = '__all__'
 
+class LocationStockSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    sku = serializers.CharField(source='product.sku', read_only=True)
+    location_name = serializers.CharField(source='location.name', read_only=True)
+
+    class Meta:
+        model = LocationStock
+        fields = ('product', 'product_name', 'sku', 'location', 'location_name', 'quantity')
+
+class ProductForecastSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProductForecast
+        exclude = ('product',)
+
+class LowStockProductSerializer(ProductSerializer):
+    # Empty until the nightly forecast has run for the product.
+    forecast = ProductForecastSerializer(read_only=True)
+
+def check_movement_quantity(movement_type, quantity):
+    """Stock in and out take a positive quantity; an adjustment is the signed change it makes."""
+    if movement_type == 'ADJ':
+        if quantity == 0:
+            raise serializers.ValidationError({'quantity': ['An adjustment must change the stock.']})
+    elif quantity is not None and quantity < 1:
+        raise serializers.ValidationError({'quantity': ['Ensure this value is greater than or equal to 1.']})
+
 class StockMovementSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
     created_by_username = serializers.CharField(source='created_by.username', read_only=True)
@@ -32,11 +84,21 @@ class StockMovementSerializer(serializers.ModelSerializer):
     class Meta:
         model = StockMovement
         fields = '__all__'
-        read_only_fields = ('created_by',)
+        read_only_fields = ('created_by', 'transfer')
+        # Left out, the default location is used.
+        extra_kwargs = {'location': {'required': False}}
+
+    def validate(self, attrs):
+        check_movement_quantity(attrs.get('movement_type', getattr(self.instance, 'movement_type', None)),
+                                attrs.get('quantity', getattr(self.instance, 'quantity', None)))
+        return attrs
 
     def create(self, validated_data):
         validated_data['created_by'] = self.context['request'].user
-        return super().create(validated_data)
+        try:
+            return record_movement(StockMovement(**validated_data))
+        except InsufficientStock as exc:
+            raise serializers.ValidationError({'quantity': [str(exc)]})
 
 class SaleSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
@@ -46,10 +108,154 @@ class SaleSerializer(serializers.ModelSerializer):
         model = Sale
         fields = '__all__'
         read_only_fields = ('created_by', 'total_amount')
+        extra_kwargs = {'location': {'required': False}}
 
     def create(self, validated_data):
         validated_data['created_by'] = self.context['request'].user
-        return super().create(validated_data)
+        try:
+            return record_sale(Sale(**validated_data))
+        except InsufficientStock as exc:
+            raise serializers.ValidationError({'quantity': [str(exc)]})
+
+class StockTransferSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    source_name = serializers.CharField(source='source.name', read_only=True)
+    destination_name = serializers.CharField(source='destination.name', read_only=True)
+    created_by_username = serializers.CharField(source='created_by.username', read_only=True)
+
+    class Meta:
+        model = StockTransfer
+        fields = '__all__'
+        read_only_fields = ('created_by',)
+
+    def validate(self, attrs):
+        if attrs['source'] == attrs['destination']:
+            raise serializers.ValidationError({'destination': ['Must differ from the source.']})
+        return attrs
+
+    def create(self, validated_data):
+        validated_data['created_by'] = self.context['request'].user
+        try:
+            return transfer_stock(StockTransfer(**validated_data))
+        except InsufficientStock as exc:
+            raise serializers.ValidationError({'quantity': [str(exc)]})
+
+class StockMovementRowSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    location = serializers.IntegerField(required=False)
+    movement_type = serializers.ChoiceField(choices=StockMovement.MOVEMENT_TYPES)
+    quantity = serializers.IntegerField()
+    reference_number = serializers.CharField(max_length=50, required=False, allow_blank=True)
+    notes = serializers.CharField(required=False, allow_blank=True)
+
+    def validate(self, attrs):
+        check_movement_quantity(attrs['movement_type'], attrs['quantity'])
+        return attrs
+
+class SaleRowSerializer(serializers.Serializer):
+    product = serializers.IntegerField()
+    location = serializers.IntegerField(required=False)
+    quantity = serializers.IntegerField(min_value=1)
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    sale_date = serializers.DateTimeField(required=False)
+
+class ProductImportRowSerializer(serializers.Serializer):
+    sku = serializers.CharField(max_length=50)
+    name = serializers.CharField(max_length=200)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    category = serializers.CharField(max_length=100)
+    supplier = serializers.CharField(max_length=100)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    cost_price = serializers.DecimalField(max_digits=10, decimal_places=2, min_value=0)
+    quantity = serializers.IntegerField(min_value=0, default=0)
+    reorder_level = serializers.IntegerField(min_value=0, default=10)
+
+class StockAtSerializer(serializers.Serializer):
+    at = serializers.DateTimeField()
+
+class ExportFilterSerializer(serializers.Serializer):
+    start = serializers.DateTimeField(required=False)
+    end = serializers.DateTimeField(required=False)
+    product = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if 'start' in attrs and 'end' in attrs and attrs['start'] >= attrs['end']:
+            raise serializers.ValidationError({'end': ['Must be after start.']})
+        return attrs
+
+class AnalyticsQuerySerializer(serializers.Serializer):
+    period = serializers.ChoiceField(choices=[grain for grain, _ in SalesRollup.GRAINS], default=SalesRollup.DAY)
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    group_by = serializers.ChoiceField(choices=list(GROUPS), required=False)
+    category = serializers.IntegerField(required=False)
+    supplier = serializers.IntegerField(required=False)
+
+    def validate(self, attrs):
+        if 'start' in attrs and 'end' in attrs and attrs['start'] > attrs['end']:
+            raise serializers.ValidationError({'end': ['Must not be before start.']})
+        if attrs['period'] == SalesRollup.DAY:
+            for field in ('start', 'end'):
+                if field in attrs and attrs[field] < day_history_start():
+                    raise serializers.ValidationError({field: [
+                        f'Daily figures go back to {day_history_start()}; use period=week or month for earlier dates.']})
+        return attrs
+
+class JobSerializer(serializers.ModelSerializer):
+    created_by_username = serializers.CharField(source='created_by.username', read_only=True, default=None)
+
+    class Meta:
+        model = Job
+        exclude = ('locked_by',)
+        read_only_fields = [field.name for field in Job._meta.fields]
+
+class ReservationSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    ttl = serializers.IntegerField(min_value=1, required=False, write_only=True,
+                                   help_text='Seconds to hold the stock (RESERVATION_TTL_SECONDS by default).')
+
+    class Meta:
+        model = Reservation
+        fields = '__all__'
+        read_only_fields = ('status', 'expires_at', 'sale', 'created_by', 'closed_at')
+
+    def validate_ttl(self, value):
+        if value > settings.RESERVATION_MAX_TTL_SECONDS:
+            raise serializers.ValidationError(f'At most {settings.RESERVATION_MAX_TTL_SECONDS} seconds.')
+        return value
+
+    def create(self, validated_data):
+        try:
+            return reserve(validated_data['product'].pk, validated_data['quantity'], self.context['request'].user,
+                           ttl=validated_data.get('ttl'))
+        except InsufficientStock as exc:
+            raise serializers.ValidationError({'quantity': [str(exc)]})
+
+class ReservationCommitSerializer(serializers.Serializer):
+    unit_price = serializers.DecimalField(max_digits=10, decimal_places=2, required=False)
+    sale_date = serializers.DateTimeField(required=False)
+    location = serializers.PrimaryKeyRelatedField(queryset=Location.objects.all(), required=False)
+
+class PurchaseOrderLineSerializer(serializers.ModelSerializer):
+    product_name = serializers.CharField(source='product.name', read_only=True)
+    sku = serializers.CharField(source='product.sku', read_only=True)
+
+    class Meta:
+        model = PurchaseOrderLine
+        exclude = ('order',)
+
+class PurchaseOrderSerializer(serializers.ModelSerializer):
+    supplier_name = serializers.CharField(source='supplier.name', read_only=True)
+    lines = PurchaseOrderLineSerializer(many=True, read_only=True)
+
+    class Meta:
+        model = PurchaseOrder
+        fields = '__all__'
+        read_only_fields = ('status', 'created_by', 'ordered_at', 'received_at')
+
+class PurchaseOrderGenerateSerializer(serializers.Serializer):
+    supplier = serializers.PrimaryKeyRelatedField(queryset=Supplier.objects.all(), required=False,
+                                                  help_text='Only order from this supplier.')
 
 class DashboardSerializer(serializers.Serializer):
     total_products = serializers.IntegerField()
@@ -58,4 +264,5 @@ class DashboardSerializer(serializers.Serializer):
     low_stock_products = serializers.IntegerField()
     total_sales = serializers.DecimalField(max_digits=10, decimal_places=2)
     recent_sales = SaleSerializer(many=True)
-    recent_movements = StockMovementSerializer(many=True) 
\ No newline at end of file
+    recent_movements = StockMovementSerializer(many=True)
+    reorder_soon = LowStockProductSerializer(many=True)
\ No newline at end of file
@@ -0,0 +1,272 @@
+"""
+Stock changes.
+
+``Product.quantity`` is the product's total over all locations and is what
+availability checks, reservations, the ledger and the forecasts read. Each
+location's share is a ``LocationStock`` row. Every change updates both in the
+same transaction: the total with one UPDATE per product batch, the locations
+with one UPDATE per location batch. A location's row is created on its first
+change. Movements and sales without a location use the default location.
+"""
+from django.db import connection, transaction
+from django.db.models import BooleanField, Case, F, IntegerField, Q, Value, When
+from django.utils import timezone
+from .aggregates import record_movements, record_sales, track_low_stock
+from . import ledger
+from .cache import bump_version
+from .models import Location, LocationStock, Product, StockLedgerEntry, StockMovement, Sale, low_stock_condition
+
+BULK_BATCH_SIZE = 1000
+
+class InsufficientStock(Exception):
+    pass
+
+def movement_delta(movement_type, quantity):
+    """Signed change in stock for a movement of the given type; adjustments are stored signed."""
+    if movement_type == 'OUT':
+        return -quantity
+    return quantity
+
+def low_stock_after(delta):
+    """The ``low_stock`` value a product will have once ``delta`` is added, as an UPDATE expression."""
+    return Case(When(low_stock_condition(delta), then=Value(True)), default=Value(False), output_field=BooleanField())
+
+def default_location_id():
+    """The location used when none is given: the default one, or the oldest if none is marked default."""
+    location_id = Location.objects.order_by('-is_default', 'pk').values_list('pk', flat=True).first()
+    if location_id is None:
+        location_id = Location.objects.create(name='Main', is_default=True).pk
+    return location_id
+
+def _apply_location_batch(location_id, product_ids, deltas, required):
+    queryset = LocationStock.objects.filter(location_id=location_id, product_id__in=product_ids)
+    guarded = [pk for pk in product_ids if (pk, location_id) in required]
+    if guarded:
+        minimum = Case(*[When(product_id=pk, then=Value(required[pk, location_id])) for pk in guarded],
+                       default=Value(0), output_field=IntegerField())
+        queryset = queryset.filter(Q(product_id__in=[pk for pk in product_ids if pk not in guarded]) |
+                                   Q(quantity__gte=minimum))
+    delta = Case(*[When(product_id=pk, then=Value(deltas[pk, location_id])) for pk in product_ids],
+                 default=Value(0), output_field=IntegerField())
+    return queryset.update(quantity=F('quantity') + delta)
+
+def apply_location_deltas(deltas, required=None):
+    """
+    Apply ``{(product_id, location_id): delta}`` to location stock with one
+    UPDATE per location and batch. ``required`` maps the same keys to the
+    quantity a location must still hold for its delta to apply; a shortfall
+    raises ``InsufficientStock``. Rows that do not exist yet are created, unless
+    they are guarded: a location without a row has nothing to take from.
+    """
+    required = required or {}
+    by_location = {}
+    for product_id, location_id in deltas:
+        by_location.setdefault(location_id, []).append(product_id)
+    for location_id, product_ids in by_location.items():
+        batch_size = connection.ops.bulk_batch_size(['pk', 'pk', 'quantity', 'pk'], product_ids) or 1
+        for start in range(0, len(product_ids), batch_size):
+            batch = product_ids[start:start + batch_size]
+            updated = _apply_location_batch(location_id, batch, deltas, required)
+            if updated == len(batch):
+                continue
+            existing = set(LocationStock.objects.filter(location_id=location_id, product_id__in=batch)
+                                                .values_list('product_id', flat=True))
+            missing = [pk for pk in batch if pk not in existing]
+            if any((pk, location_id) in required for pk in missing) or updated + len(missing) != len(batch):
+                raise InsufficientStock(f'Not enough stock at location {location_id}.')
+            LocationStock.objects.bulk_create([LocationStock(product_id=pk, location_id=location_id) for pk in missing],
+                                              ignore_conflicts=True)
+            _apply_location_batch(location_id, missing, deltas, required)
+
+def apply_location_delta(product_id, location_id, delta, guard=False):
+    """Add ``delta`` to one location's stock of a product; see ``apply_location_deltas``."""
+    key = (product_id, location_id)
+    apply_location_deltas({key: delta}, {key: -delta} if guard and delta < 0 else None)
+
+def apply_stock_delta(product_id, delta, guard=False, reserved=0):
+    """
+    Add ``delta`` to a product's quantity (and refresh ``low_stock``) in a single UPDATE statement.
+
+    With ``guard`` set, a negative delta only applies while the product still
+    holds at least ``-delta`` items that no reservation holds; otherwise
+    ``InsufficientStock`` is raised and nothing is written. ``reserved`` is
+    added to the product's reserved quantity in the same statement.
+    """
+    queryset = Product.objects.filter(pk=product_id)
+    if guard and delta < 0:
+        queryset = queryset.filter(quantity__gte=F('reserved') - delta)
+    fields = {'reserved': F('reserved') + reserved} if reserved else {}
+    updated = queryset.update(quantity=F('quantity') + delta, low_stock=low_stock_after(delta),
+                              updated_at=timezone.now(), **fields)
+    if not updated:
+        raise InsufficientStock(f"Cannot remove {-delta} items from product {product_id}: not enough stock.")
+    track_low_stock({product_id: delta})
+    transaction.on_commit(lambda: bump_version(Product))
+    return updated
+
+@transaction.atomic
+def record_movement(movement, guard=True):
+    """Save a new StockMovement and apply it to its product and location atomically."""
+    delta = movement_delta(movement.movement_type, movement.quantity)
+    # Write first: on SQLite a transaction that reads before it writes cannot wait for another writer.
+    apply_stock_delta(movement.product_id, delta, guard=guard)
+    if movement.location_id is None:
+        movement.location_id = default_location_id()
+    apply_location_delta(movement.product_id, movement.location_id, delta, guard=guard)
+    movement.save()
+    ledger.append([(movement.product_id, delta, StockLedgerEntry.MOVEMENT, movement.pk)])
+    return movement
+
+@transaction.atomic
+def record_sale(sale, guard=True, reserved=0):
+    """
+    Save a new Sale and take its quantity out of stock atomically. ``reserved``
+    is how much of it a reservation already held (see core/reservations.py).
+    Reservations hold stock of the product, not of a location, so the sale's
+    location is checked either way.
+    """
+    if sale.unit_price is None:
+        sale.unit_price = sale.product.price
+    if sale.sale_date is None:
+        sale.sale_date = timezone.now()
+    apply_stock_delta(sale.product_id, -sale.quantity, guard=guard and sale.quantity > reserved, reserved=-reserved)
+    if sale.location_id is None:
+        sale.location_id = default_location_id()
+    apply_location_delta(sale.product_id, sale.location_id, -sale.quantity, guard=guard)
+    sale.save()
+    ledger.append([(sale.product_id, -sale.quantity, StockLedgerEntry.SALE, sale.pk)])
+    return sale
+
+@transaction.atomic
+def transfer_stock(transfer):
+    """
+    Save a new StockTransfer and move its quantity from the source location to
+    the destination: an OUT movement at one and an IN movement at the other.
+    The product's total stock does not change.
+    """
+    transfer.save()
+    source, destination = (transfer.product_id, transfer.source_id), (transfer.product_id, transfer.destination_id)
+    apply_location_deltas({source: -transfer.quantity, destination: transfer.quantity}, {source: transfer.quantity})
+    movements = [
+        StockMovement(product_id=transfer.product_id, location_id=location_id, movement_type=movement_type,
+                      quantity=transfer.quantity, transfer=transfer, reference_number=f'TR-{transfer.pk}',
+                      notes=transfer.notes, created_by=transfer.created_by)
+        for location_id, movement_type in ((transfer.source_id, 'OUT'), (transfer.destination_id, 'IN'))
+    ]
+    for movement in movements:
+        movement.save()
+    ledger.append([(movement.product_id, movement_delta(movement.movement_type, movement.quantity),
+                    StockLedgerEntry.MOVEMENT, movement.pk) for movement in movements])
+    return transfer
+
+def apply_stock_deltas(deltas, required=None):
+    """
+    Apply ``{product_id: delta}`` with one aggregated UPDATE per batch.
+
+    ``required`` maps product ids to the minimum unreserved quantity the product
+    must still hold for its delta to apply; if any guarded product falls short the
+    whole call raises ``InsufficientStock`` so the caller's transaction rolls
+    back.
+    """
+    required = required or {}
+    now = timezone.now()
+    product_ids = list(deltas)
+    batch_size = connection.ops.bulk_batch_size(['pk', 'pk', 'quantity', 'pk', 'quantity'], product_ids) or 1
+    for start in range(0, len(product_ids), batch_size):
+        batch = product_ids[start:start + batch_size]
+        queryset = Product.objects.filter(pk__in=batch)
+        guarded = [pk for pk in batch if pk in required]
+        if guarded:
+            minimum = Case(*[When(pk=pk, then=Value(required[pk])) for pk in guarded],
+                           default=Value(0), output_field=IntegerField())
+            queryset = queryset.filter(Q(pk__in=[pk for pk in batch if pk not in required]) |
+                                       Q(quantity__gte=minimum + F('reserved')))
+        delta = Case(*[When(pk=pk, then=Value(deltas[pk])) for pk in batch],
+                     default=Value(0), output_field=IntegerField())
+        low_stock = Case(*[When(Q(pk=pk) & low_stock_condition(deltas[pk]), then=Value(True)) for pk in batch],
+                         default=Value(False), output_field=BooleanField())
+        updated = queryset.update(quantity=F('quantity') + delta, low_stock=low_stock, updated_at=now)
+        if updated != len(batch):
+            raise InsufficientStock('Stock changed while the batch was being applied.')
+    track_low_stock(deltas)
+    transaction.on_commit(lambda: bump_version(Product))
+
+def _build_movement(data, product, user):
+    movement = StockMovement(product_id=product.pk, created_by=user,
+                             **{k: v for k, v in data.items() if k not in ('product', 'location')})
+    delta = movement_delta(movement.movement_type, movement.quantity)
+    return movement, delta, delta < 0
+
+def _build_sale(data, product, user):
+    sale = Sale(product_id=product.pk, created_by=user, quantity=data['quantity'],
+                unit_price=data.get('unit_price') or product.price, unit_cost=product.cost_price,
+                sale_date=data.get('sale_date') or timezone.now())
+    sale.total_amount = sale.quantity * sale.unit_price
+    return sale, -sale.quantity, True
+
+def _ingest(model, entries, user, build, record, kind, attempts):
+    product_ids = {data['product'] for _, data in entries}
+    locations = Location.objects.in_bulk({data['location'] for _, data in entries if data.get('location')})
+    default = default_location_id() if any(not data.get('location') for _, data in entries) else None
+    for _ in range(attempts):
+        products = Product.objects.only('quantity', 'reserved', 'price', 'cost_price').in_bulk(product_ids)
+        stock = {(product_id, location_id): quantity for product_id, location_id, quantity in
+                 LocationStock.objects.filter(product_id__in=product_ids, location_id__in=[*locations, default])
+                                      .values_list('product_id', 'location_id', 'quantity')}
+        objs, changes, errors, deltas, required, location_deltas, location_required = [], [], [], {}, {}, {}, {}
+        for index, data in entries:
+            product = products.get(data['product'])
+            if product is None:
+                errors.append({'index': index, 'errors': {'product': [f'Invalid pk "{data["product"]}" - object does not exist.']}})
+                continue
+            location_id = data.get('location') or default
+            if location_id != default and location_id not in locations:
+                errors.append({'index': index, 'errors': {'location': [f'Invalid pk "{location_id}" - object does not exist.']}})
+                continue
+            obj, delta, guarded = build(data, product, user)
+            obj.location_id = location_id
+            key = (product.pk, location_id)
+            offset = deltas.get(product.pk, 0)
+            location_offset = location_deltas.get(key, 0)
+            if guarded:
+                available = product.available + offset
+                held = stock.get(key, 0) + location_offset
+                if available + delta < 0:
+                    errors.append({'index': index, 'errors': {'quantity': [f'Cannot remove {-delta} items. Only {available} available.']}})
+                    continue
+                if held + delta < 0:
+                    errors.append({'index': index, 'errors': {'quantity': [f'Cannot remove {-delta} items. Only {held} at this location.']}})
+                    continue
+                required[product.pk] = max(required.get(product.pk, 0), -delta - offset)
+                location_required[key] = max(location_required.get(key, 0), -delta - location_offset)
+            deltas[product.pk] = offset + delta
+            location_deltas[key] = location_offset + delta
+            objs.append(obj)
+            changes.append(delta)
+        try:
+            with transaction.atomic():
+                apply_stock_deltas(deltas, required)
+                apply_location_deltas(location_deltas, location_required)
+                model.objects.bulk_create(objs, batch_size=BULK_BATCH_SIZE)
+                ledger.append([(obj.product_id, delta, kind, obj.pk) for obj, delta in zip(objs, changes)])
+                record(objs)
+        except InsufficientStock:
+            continue
+        return len(objs), errors
+    raise InsufficientStock('Stock kept changing under the batch; retry the request.')
+
+def ingest_movements(entries, user, attempts=3):
+    """
+    Insert many stock movements with one product prefetch and aggregated stock updates.
+
+    ``entries`` is a list of ``(index, data)`` pairs of already-validated rows
+    whose ``product`` (and optional ``location``) is a primary key. Rows that
+    reference a missing product or location, or would take stock below zero,
+    are skipped and reported. Returns ``(created_count, errors)``.
+    """
+    return _ingest(StockMovement, entries, user, _build_movement, record_movements, StockLedgerEntry.MOVEMENT,
+                   attempts)
+
+def ingest_sales(entries, user, attempts=3):
+    """Bulk counterpart of ``record_sale``; see ``ingest_movements``."""
+    return _ingest(Sale, entries, user, _build_sale, record_sales, StockLedgerEntry.SALE, attempts)
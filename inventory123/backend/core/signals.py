@@ -0,0 +1,157 @@
+from django.db import connections, transaction
+from django.db.migrations.recorder import MigrationRecorder
+from django.contrib.auth.models import Group, User
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save, pre_save
+from django.dispatch import receiver
+from .aggregates import bump_counter, move_product_sales, record_movements, record_sales
+from .cache import bump_version
+from . import audit, images, ledger, search
+from .jobs import enqueue
+from .services import apply_location_delta, default_location_id
+from .models import AuditEntry, Category, Supplier, Product, StockLedgerEntry, StockMovement, Sale, Tombstone
+
+COUNTED_MODELS = {Product: 'products', Category: 'categories', Supplier: 'suppliers'}
+
+def count_created(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        bump_counter(COUNTED_MODELS[sender], 1)
+
+def count_deleted(sender, instance, **kwargs):
+    bump_counter(COUNTED_MODELS[sender], -1)
+
+for model in COUNTED_MODELS:
+    post_save.connect(count_created, sender=model, dispatch_uid=f'count_created_{model.__name__}')
+    post_delete.connect(count_deleted, sender=model, dispatch_uid=f'count_deleted_{model.__name__}')
+
+def invalidate_responses(sender, instance, raw=False, **kwargs):
+    transaction.on_commit(lambda: bump_version(sender))
+
+for model in (Category, Supplier, Product):
+    post_save.connect(invalidate_responses, sender=model, dispatch_uid=f'invalidate_save_{model.__name__}')
+    post_delete.connect(invalidate_responses, sender=model, dispatch_uid=f'invalidate_delete_{model.__name__}')
+
+def invalidate_users(sender, instance, update_fields=None, raw=False, **kwargs):
+    # Logins only touch last_login, which authentication does not read.
+    if update_fields is None or set(update_fields) != {'last_login'}:
+        transaction.on_commit(lambda: bump_version(User))
+
+def invalidate_user_permissions(sender, action, **kwargs):
+    if action.startswith('post_'):
+        transaction.on_commit(lambda: bump_version(User))
+
+post_save.connect(invalidate_users, sender=User, dispatch_uid='invalidate_users_save')
+post_delete.connect(invalidate_users, sender=User, dispatch_uid='invalidate_users_delete')
+for through in (User.groups.through, User.user_permissions.through, Group.permissions.through):
+    m2m_changed.connect(invalidate_user_permissions, sender=through, dispatch_uid=f'invalidate_users_{through.__name__}')
+
+def remember_previous(sender, instance, raw=False, **kwargs):
+    instance._previous = None
+    if instance.pk and not raw:
+        instance._previous = sender.objects.filter(pk=instance.pk).first()
+
+def record_tombstone(sender, instance, **kwargs):
+    Tombstone.objects.create(model=sender._meta.label_lower, object_id=instance.pk)
+
+for model in (Category, Supplier, Product, StockMovement, Sale):
+    post_delete.connect(record_tombstone, sender=model, dispatch_uid=f'tombstone_{model.__name__}')
+
+for model in (Category, Supplier, Product, StockMovement, Sale):
+    pre_save.connect(remember_previous, sender=model, dispatch_uid=f'remember_previous_{model.__name__}')
+
+def audit_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        audit.record(AuditEntry.CREATE if created else AuditEntry.UPDATE, instance, getattr(instance, '_previous', None))
+
+def audit_deleted(sender, instance, **kwargs):
+    audit.record(AuditEntry.DELETE, instance)
+
+for model in (Category, Supplier, Product, StockMovement, Sale):
+    post_save.connect(audit_saved, sender=model, dispatch_uid=f'audit_save_{model.__name__}')
+    post_delete.connect(audit_deleted, sender=model, dispatch_uid=f'audit_delete_{model.__name__}')
+
+@receiver(post_save, sender=Product)
+def record_opening_stock(sender, instance, created, raw=False, **kwargs):
+    # Stock set on a new product, from the admin, the forms or the API, is booked at the default location. Later
+    # changes are stock movements at a location (Product.save never writes ``quantity`` back), which write their own
+    # entries.
+    if created and not raw:
+        ledger.append([(instance.pk, instance.quantity, StockLedgerEntry.OPENING, None)])
+        if instance.quantity:
+            apply_location_delta(instance.pk, default_location_id(), instance.quantity)
+
+@receiver(post_save, sender=Product)
+def track_product_low_stock(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    change = instance.is_low_stock - bool(previous and previous.is_low_stock)
+    if change:
+        bump_counter('low_stock_products', change)
+
+@receiver(post_save, sender=Product)
+def move_sales_rollups(sender, instance, created, raw=False, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if raw or previous is None:
+        return
+    old = (previous.category_id, previous.supplier_id)
+    new = (instance.category_id, instance.supplier_id)
+    if old != new:
+        move_product_sales(instance.pk, old, new)
+
+@receiver(post_save, sender=Product)
+def queue_image_variants(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    source = instance.image.name if instance.image else ''
+    if source == (previous.image.name if previous and previous.image else ''):
+        return
+    if source:
+        transaction.on_commit(lambda: enqueue('process_product_image', product_id=instance.pk, source=source))
+    elif instance.image_variants:
+        stale, instance.image_variants = instance.image_variants, {}
+        Product.objects.filter(pk=instance.pk).update(image_variants={})
+        transaction.on_commit(lambda: images.delete_variants(stale))
+
+@receiver(post_delete, sender=Product)
+def delete_image_variants(sender, instance, **kwargs):
+    if instance.image_variants:
+        transaction.on_commit(lambda: images.delete_variants(instance.image_variants))
+
+@receiver(post_delete, sender=Product)
+def untrack_product_low_stock(sender, instance, **kwargs):
+    if instance.is_low_stock:
+        bump_counter('low_stock_products', -1)
+
+@receiver(post_save, sender=Sale)
+def add_sale_totals(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        record_sales([previous], sign=-1)
+    record_sales([instance])
+
+@receiver(post_delete, sender=Sale)
+def remove_sale_totals(sender, instance, **kwargs):
+    record_sales([instance], sign=-1)
+
+@receiver(post_save, sender=StockMovement)
+def add_movement_totals(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        record_movements([previous], sign=-1)
+    record_movements([instance])
+
+@receiver(post_delete, sender=StockMovement)
+def remove_movement_totals(sender, instance, **kwargs):
+    record_movements([instance], sign=-1)
+
+@receiver(post_migrate)
+def repair_search_index(sender, using, **kwargs):
+    # SQLite drops a table's triggers whenever a migration rebuilds it.
+    connection = connections[using]
+    if sender.name == 'core' and ('core', '0007_product_search') in MigrationRecorder(connection).applied_migrations():
+        search.install(connection)
@@ -0,0 +1,45 @@
+"""Background tasks run by ``manage.py run_jobs``; enqueue them with ``core.jobs.enqueue(name, **kwargs)``."""
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from . import aggregates, analytics, forecast, images, ledger
+from .imports import PARSERS, import_catalog
+from .jobs import task
+
+@task()
+def rebuild_aggregates():
+    aggregates.rebuild()
+    return {'drift': aggregates.check()}
+
+@task()
+def sync_low_stock():
+    call_command('sync_low_stock')
+
+@task()
+def purge_tombstones(days=None):
+    call_command('purge_tombstones', *([f'--days={days}'] if days is not None else []))
+
+@task(queue='imports', max_attempts=1)
+def import_catalog_file(path, file_format):
+    """Import an uploaded catalog saved to default storage, then delete the file."""
+    try:
+        with default_storage.open(path, 'rb') as stream:
+            return import_catalog(PARSERS[file_format](stream))
+    finally:
+        default_storage.delete(path)
+
+@task(queue='images')
+def process_product_image(product_id, source=None):
+    return images.process_product_image(product_id, source)
+
+@task(daily_at=settings.SALES_ROLLUP_COMPACT_AT)
+def compact_sales_rollups():
+    return analytics.compact()
+
+@task(daily_at=settings.STOCK_SNAPSHOT_AT)
+def take_stock_snapshots():
+    return {'snapshots': ledger.take_snapshots()}
+
+@task(daily_at=settings.FORECAST_AT)
+def forecast_demand():
+    return {'forecasts': forecast.run()}
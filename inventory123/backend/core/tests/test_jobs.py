@@ -0,0 +1,50 @@
+import time
+from datetime import timedelta
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+from core.jobs import claim, enqueue, requeue_stale, run, task
+from core.models import Job
+
+QUEUE = 'tests'
+
+def make_stale(pk):
+    Job.objects.filter(pk=pk).update(locked_at=timezone.now() - timedelta(hours=2))
+
+@task(queue=QUEUE)
+def outlive_lock_timeout(pk):
+    """Sleep through a few heartbeats after the lock went stale, then sweep as a worker would."""
+    make_stale(pk)
+    time.sleep(0.3)
+    return requeue_stale()
+
+@task(queue=QUEUE)
+def lose_lock(pk):
+    """Get requeued as stale and reclaimed by another worker while still running."""
+    make_stale(pk)
+    requeue_stale()
+    claim('other-worker', [QUEUE])
+    return 'late'
+
+# A job's lock is renewed by a thread, which needs to see the committed rows.
+@override_settings(JOB_HEARTBEAT=0.05, JOB_LOCK_TIMEOUT=3600, JOB_QUEUE_LIMITS={})
+class JobLockTests(TransactionTestCase):
+
+    def run_job(self, name):
+        job = enqueue(name, pk=None)
+        Job.objects.filter(pk=job.pk).update(kwargs={'pk': job.pk})
+        job = claim('worker', [QUEUE])
+        run(job)
+        job.refresh_from_db()
+        return job
+
+    def test_heartbeat_keeps_a_long_job_locked(self):
+        job = self.run_job('outlive_lock_timeout')
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result, [0, 0])
+
+    def test_requeued_run_does_not_overwrite_the_new_run(self):
+        job = self.run_job('lose_lock')
+        self.assertEqual(job.status, Job.RUNNING)
+        self.assertEqual(job.locked_by, 'other-worker')
+        self.assertEqual(job.attempts, 2)
+        self.assertIsNone(job.result)
@@ -0,0 +1,46 @@
+import threading
+import unittest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Count
+from django.test import TransactionTestCase
+from core.models import Category, Supplier, Product, PurchaseOrderLine
+from core.purchasing import generate
+
+CALLERS = 4
+PRODUCTS = 20
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'needs a database that takes concurrent writers')
+class GenerateConcurrencyTests(TransactionTestCase):
+    """Concurrent generate() calls must put each due product on one order only."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='purchasing')
+        category = Category.objects.create(name='purchasing')
+        supplier = Supplier.objects.create(name='purchasing', contact_person='-', email='po@example.com', phone='-',
+                                           address='-')
+        for n in range(PRODUCTS):
+            Product.objects.create(name=f'purchasing-{n}', description='', category=category, supplier=supplier,
+                                   sku=f'PURCHASING-{n}', price=1, cost_price=1, quantity=0)
+
+    def caller(self, barrier, errors):
+        try:
+            barrier.wait()
+            generate(self.user)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    def test_concurrent_generate(self):
+        barrier = threading.Barrier(CALLERS)
+        errors = []
+        threads = [threading.Thread(target=self.caller, args=(barrier, errors)) for _ in range(CALLERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        lines = PurchaseOrderLine.objects.values('product').annotate(count=Count('id'))
+        self.assertEqual(len(lines), PRODUCTS)
+        self.assertEqual({line['count'] for line in lines}, {1})
@@ -0,0 +1,100 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from core.cache import bump_version
+from core.models import (Category, Supplier, Product, StockMovement, Sale, PurchaseOrder, PurchaseOrderLine, Location,
+                         LocationStock, StockTransfer)
+from core.services import default_location_id
+
+# Rows in the large measurement: one full page.
+ROWS = 10
+
+LIST_ENDPOINTS = [
+    '/api/categories/',
+    '/api/suppliers/',
+    '/api/products/',
+    '/api/products/low_stock/',
+    '/api/stock-movements/',
+    '/api/sales/',
+    '/api/dashboard/',
+    '/api/purchase-orders/',
+    '/api/locations/',
+    '/api/transfers/',
+]
+
+DETAIL_ENDPOINTS = {
+    '/api/categories/{}/': Category,
+    '/api/suppliers/{}/': Supplier,
+    '/api/products/{}/': Product,
+    '/api/stock-movements/{}/': StockMovement,
+    '/api/sales/{}/': Sale,
+    '/api/purchase-orders/{}/': PurchaseOrder,
+    '/api/locations/{}/': Location,
+    # The first location is the default one, which holds every seeded product.
+    '/api/locations/{}/stock/': Location,
+    '/api/products/{}/locations/': Product,
+    '/api/transfers/{}/': StockTransfer,
+}
+
+def seed(start, stop):
+    """Rows ``start``..``stop`` of every kind the endpoints render, each with its own related rows."""
+    default = default_location_id()
+    for n in range(start, stop):
+        tag = f'query-count-{n}'
+        user = User.objects.create(username=tag)
+        category = Category.objects.create(name=tag)
+        supplier = Supplier.objects.create(name=tag, contact_person='-', email='qc@example.com', phone='-',
+                                           address='-')
+        # Low on stock, so the low-stock list and the dashboard render it too.
+        product = Product.objects.create(name=tag, description='', category=category, supplier=supplier,
+                                         sku=tag, price=1, cost_price=1, quantity=0)
+        location = Location.objects.create(name=tag)
+        LocationStock.objects.bulk_create([LocationStock(product=product, location_id=default),
+                                           LocationStock(product=product, location=location)])
+        StockMovement.objects.create(product=product, location=location, movement_type='IN', quantity=1,
+                                     created_by=user)
+        Sale.objects.create(product=product, location=location, quantity=1, unit_price=1, sale_date=timezone.now(),
+                            created_by=user)
+        StockTransfer.objects.create(product=product, source_id=default, destination=location, quantity=1,
+                                     created_by=user)
+        order = PurchaseOrder.objects.create(supplier=supplier, created_by=user)
+        PurchaseOrderLine.objects.create(order=order, product=product, quantity=1, unit_cost=1)
+
+class QueryCountTests(TestCase):
+    """The queries an endpoint issues must not grow with the number of rows it renders."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='query-count'))
+
+    def get(self, url):
+        # Measure rendering, not the response cache.
+        bump_version(Category, Supplier, Product)
+        response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200, url)
+        return response
+
+    def count(self, url):
+        with CaptureQueriesContext(connection) as context:
+            self.get(url)
+        return len(context)
+
+    def assert_constant(self, expected):
+        """Seed a full page and check each of ``{url: queries with one row}`` issues the same number of queries."""
+        seed(1, ROWS)
+        for url, queries in expected.items():
+            with self.subTest(url=url), self.assertNumQueries(queries):
+                self.get(url)
+
+    def test_list_endpoints(self):
+        seed(0, 1)
+        self.assert_constant({url: self.count(url) for url in LIST_ENDPOINTS})
+
+    def test_detail_endpoints(self):
+        seed(0, 1)
+        urls = [url.format(model.objects.order_by('pk').values_list('pk', flat=True)[0])
+                for url, model in DETAIL_ENDPOINTS.items()]
+        self.assert_constant({url: self.count(url) for url in urls})
@@ -0,0 +1,129 @@
+import random
+import unittest
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+from core.cache import bump_version
+from core.management.commands._bench import bench_user, seed_catalog, seed_history
+from core.models import Product, StockMovement, Sale
+from core.purchasing import due_products
+from core.views import DASHBOARD_QUERIES
+
+PRODUCTS = 5000
+# Sales and stock movements.
+ROWS = 20000
+# The tables big enough that a scan of them hurts.
+HOT_MODELS = (Product, Sale, StockMovement)
+
+def partial_indexes():
+    """Names of the indexes with a condition: scanning one of them only reads the rows the query wants."""
+    return {index.name for model in apps.get_app_config('core').get_models()
+            for index in model._meta.indexes if index.condition is not None}
+
+def explain(sql):
+    """The plan of ``sql`` as one line per node."""
+    with connection.cursor() as cursor:
+        cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+        rows = cursor.fetchall()
+    if connection.vendor == 'sqlite':
+        return [row[3] for row in rows]
+    return [row[0] for row in rows]
+
+def plan_problems(plan, table, sql):
+    """
+    Reasons ``plan`` is not index-driven for ``table``; empty when it is.
+
+    Walking a whole index is only fine when the index is partial, or when the
+    query has no filter and stops at a LIMIT (the first page of a list). Any
+    other index walk reads every row, just in a different order.
+    """
+    problems = []
+    partial = partial_indexes()
+    bounded = ' LIMIT ' in sql and ' WHERE ' not in sql
+    if connection.vendor == 'postgresql':
+        for n, line in enumerate(plan):
+            if f'Seq Scan on {table}' in line:
+                problems.append('sequential scan')
+            elif f' on {table}' in line and 'Index' in line and 'Scan using ' in line:
+                index = line.split('Scan using ', 1)[1].split(' ', 1)[0]
+                depth = len(line) - len(line.lstrip())
+                details = []
+                for detail in plan[n + 1:]:
+                    if len(detail) - len(detail.lstrip()) <= depth or '->' in detail:
+                        break
+                    details.append(detail)
+                if index not in partial and not bounded and not any('Index Cond' in d for d in details):
+                    problems.append(f'whole scan of {index}')
+        if any('Sort Key' in line for line in plan) and not any('Index' in line for line in plan):
+            problems.append('explicit sort')
+    elif connection.vendor == 'sqlite':
+        for line in plan:
+            if line.startswith(f'SCAN {table}'):
+                if 'INDEX' not in line:
+                    problems.append('full table scan')
+                elif line.rsplit(' ', 1)[-1] not in partial and not bounded:
+                    problems.append(f'whole scan of {line.rsplit(" ", 1)[-1]}')
+            if 'TEMP B-TREE FOR ORDER BY' in line:
+                problems.append('sort in a temp b-tree')
+    return problems
+
+@unittest.skipUnless(connection.vendor in ('postgresql', 'sqlite'), 'no plan checks for this backend')
+class QueryPlanTests(TestCase):
+    """The hot paths' queries, as the views issue them, must be served by indexes on a large catalog."""
+
+    @classmethod
+    def setUpTestData(cls):
+        _, _, product_ids = seed_catalog(PRODUCTS, quantity=50)
+        # A realistic minority of products sits at or below its reorder point, most of them with a forecast.
+        low = random.sample(product_ids, len(product_ids) // 50)
+        Product.objects.filter(pk__in=low).update(quantity=0, low_stock=True)
+        Product.objects.filter(pk__in=low[::2]).update(days_of_cover=3.5)
+        seed_history(product_ids, bench_user(), sales=ROWS, movements=ROWS)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create(username='query-plans'))
+
+    def get(self, url):
+        # The plans behind rendering, not the response cache.
+        bump_version(Product)
+        response = self.client.get(url, secure=True)
+        self.assertEqual(response.status_code, 200, url)
+        return response
+
+    def assert_index_driven(self, run):
+        """Run ``run()`` and check the plan of every query it issues against the hot tables."""
+        with CaptureQueriesContext(connection) as context:
+            run()
+        tables = [model._meta.db_table for model in HOT_MODELS]
+        for query in context.captured_queries:
+            sql = query['sql']
+            if not sql.startswith('SELECT'):
+                continue
+            plan = explain(sql)
+            for table in tables:
+                problems = plan_problems(plan, table, sql)
+                self.assertFalse(problems, f'{table}: {", ".join(problems)}\n{sql}\n' + '\n'.join(plan))
+
+    def test_low_stock_endpoint(self):
+        self.assert_index_driven(lambda: self.get('/api/products/low_stock/'))
+
+    def test_dashboard_queries(self):
+        for name, query in DASHBOARD_QUERIES.items():
+            with self.subTest(query=name):
+                self.assert_index_driven(query)
+
+    def test_due_products(self):
+        self.assert_index_driven(lambda: list(due_products()))
+
+    def test_list_pages(self):
+        for url in ('/api/sales/', '/api/stock-movements/'):
+            with self.subTest(url=url):
+                self.assert_index_driven(lambda: self.get(url))
+                next_page = self.get(url).data['next']
+                self.assert_index_driven(lambda: self.get(next_page))
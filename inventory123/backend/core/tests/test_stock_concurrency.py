@@ -0,0 +1,64 @@
+import threading
+import unittest
+from django.contrib.auth.models import User
+from django.db import connection
+from django.db.models import Sum
+from django.test import TransactionTestCase
+from core.models import Category, Supplier, Product, StockMovement, StockLedgerEntry, LocationStock
+from core.services import InsufficientStock, default_location_id, record_movement
+
+WRITERS = 8
+ITERATIONS = 50
+INITIAL = 5
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'needs a database that takes concurrent writers')
+class StockConcurrencyTests(TransactionTestCase):
+    """Parallel movements on one product must not lose updates or take stock below zero."""
+
+    def setUp(self):
+        self.user = User.objects.create(username='stock-concurrency')
+        category = Category.objects.create(name='stock-concurrency')
+        supplier = Supplier.objects.create(name='stock-concurrency', contact_person='-', email='sc@example.com',
+                                           phone='-', address='-')
+        self.product = Product.objects.create(name='stock-concurrency', description='', category=category,
+                                              supplier=supplier, sku='STOCK-CONCURRENCY', price=1, cost_price=1,
+                                              quantity=INITIAL)
+
+    def writer(self, index, rejected, errors):
+        try:
+            for i in range(ITERATIONS):
+                movement_type = 'IN' if (index + i) % 2 == 0 else 'OUT'
+                try:
+                    record_movement(StockMovement(product_id=self.product.pk, movement_type=movement_type,
+                                                  quantity=1, created_by=self.user))
+                except InsufficientStock:
+                    rejected.append(index)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connection.close()
+
+    def test_parallel_movements(self):
+        rejected = []
+        errors = []
+        threads = [threading.Thread(target=self.writer, args=(n, rejected, errors)) for n in range(WRITERS)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+        movements = StockMovement.objects.filter(product=self.product)
+        ins = movements.filter(movement_type='IN').count()
+        outs = movements.filter(movement_type='OUT').count()
+        self.assertEqual(ins + outs + len(rejected), WRITERS * ITERATIONS)
+
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, INITIAL + ins - outs)
+        self.assertGreaterEqual(self.product.quantity, 0)
+        ledger = StockLedgerEntry.objects.filter(product=self.product).aggregate(total=Sum('delta'))['total']
+        self.assertEqual(ledger, self.product.quantity)
+        self.assertEqual(StockLedgerEntry.objects.filter(product=self.product, kind=StockLedgerEntry.MOVEMENT)
+                         .count(), ins + outs)
+        located = LocationStock.objects.get(product=self.product, location_id=default_location_id())
+        self.assertEqual(located.quantity, self.product.quantity)
@@ -1,10 +1,11 @@
+from django.conf import settings
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
 from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
-from . import views
+from . import asyncviews, views
 
 router = DefaultRouter()
 router.register(r'categories', views.CategoryViewSet)
@@ -13,6 +14,13 @@ router.register(r'products', views.ProductViewSet)
 router.register(r'stock-movements', views.StockMovementViewSet)
 router.register(r'sales', views.SaleViewSet)
 router.register(r'dashboard', views.DashboardViewSet, basename='dashboard')
+router.register(r'cache-stats', views.CacheStatsViewSet, basename='cache-stats')
+router.register(r'middleware-stats', views.MiddlewareStatsViewSet, basename='middleware-stats')
+router.register(r'jobs', views.JobViewSet, basename='job')
+router.register(r'reservations', views.ReservationViewSet, basename='reservation')
+router.register(r'purchase-orders', views.PurchaseOrderViewSet)
+router.register(r'locations', views.LocationViewSet)
+router.register(r'transfers', views.StockTransferViewSet)
 
 schema_view = get_schema_view(
     openapi.Info(
@@ -27,7 +35,17 @@ schema_view = get_schema_view(
     permission_classes=(permissions.AllowAny,),
 )
 
-urlpatterns = [
+urlpatterns = []
+if settings.ASYNC_READ_VIEWS:
+    # Ahead of the router: async GETs for these endpoints, everything else still reaches the viewsets.
+    urlpatterns += [
+        path('dashboard/', asyncviews.dashboard),
+        path('categories/', asyncviews.category_list),
+        path('suppliers/', asyncviews.supplier_list),
+        path('products/', asyncviews.product_list),
+    ]
+
+urlpatterns += [
     path('', include(router.urls)),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
@@ -1,28 +1,55 @@
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.core.files.storage import default_storage
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.db.models import Sum, F, Count
+from django.db.models import Sum, F, Count, Prefetch, ProtectedError
 from django.utils import timezone
 from datetime import timedelta
-from .models import Category, Supplier, Product, StockMovement, Sale
+from .models import (Category, Supplier, Product, StockMovement, Sale, DailySummary, Job, Reservation, PurchaseOrder,
+                     PurchaseOrderLine, Location, LocationStock, StockTransfer)
+from .aggregates import counters
+from .analytics import sales_analytics
+from .queries import OptimizedQuerysetMixin, optimize_queryset
+from .pagination import SaleCursorPagination, StockMovementCursorPagination
+from .cache import VersionedCacheMixin, metrics as cache_metrics
+from .middleware import metrics as middleware_metrics
+from .sync import DeltaSyncMixin
+from .search import ProductSearchFilter, search_products
+from .exports import FORMATS, CSVRenderer, NDJSONRenderer, export_rows
+from .imports import PARSERS, detect_format, import_catalog
+from .jobs import enqueue
+from .ledger import quantity_at
+from .purchasing import (PurchaseOrderClosed, cancel as cancel_order, generate as generate_orders, place as place_order,
+                         receive as receive_order)
+from .reservations import ReservationClosed, commit as commit_reservation, release as release_reservation
 from .forms import ProductForm, CategoryForm, SupplierForm, StockMovementForm, SaleForm
-from rest_framework import viewsets, permissions, status
+from .services import InsufficientStock, record_movement, record_sale, ingest_movements, ingest_sales
+from rest_framework import mixins, viewsets, permissions, status
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from .serializers import (
     CategorySerializer, SupplierSerializer, ProductSerializer,
-    StockMovementSerializer, SaleSerializer, DashboardSerializer
+    StockMovementSerializer, SaleSerializer, DashboardSerializer,
+    StockMovementRowSerializer, SaleRowSerializer, ExportFilterSerializer, JobSerializer, AnalyticsQuerySerializer,
+    ReservationSerializer, ReservationCommitSerializer, StockAtSerializer, LowStockProductSerializer,
+    PurchaseOrderSerializer, PurchaseOrderGenerateSerializer, LocationSerializer, LocationStockSerializer,
+    StockTransferSerializer
 )
 
 @login_required
 def dashboard(request):
-    total_products = Product.objects.count()
-    low_stock_products = Product.objects.filter(quantity__lte=F('reorder_level')).count()
-    total_sales = Sale.objects.filter(sale_date__gte=timezone.now() - timedelta(days=30)).aggregate(
-        total=Sum('total_price'))['total'] or 0
+    totals = counters()
+    total_products = totals['products']
+    low_stock_products = totals['low_stock_products']
+    total_sales = DailySummary.objects.filter(date__gte=timezone.localdate() - timedelta(days=30)).aggregate(
+        total=Sum('revenue'))['total'] or 0
     
     recent_movements = StockMovement.objects.select_related('product').order_by('-created_at')[:5]
-    low_stock_items = Product.objects.filter(quantity__lte=F('reorder_level')).select_related('category', 'supplier')
+    low_stock_items = Product.objects.filter(low_stock=True).select_related('category', 'supplier')
     
     context = {
         'total_products': total_products,
@@ -41,7 +68,7 @@ def product_list(request):
 @login_required
 def product_detail(request, pk):
     product = get_object_or_404(Product.objects.select_related('category', 'supplier'), pk=pk)
-    movements = product.movements.all().order_by('-created_at')[:10]
+    movements = product.stock_movements.all().order_by('-created_at')[:10]
     sales = product.sales.all().order_by('-sale_date')[:10]
     return render(request, 'core/product_detail.html', {
         'product': product,
@@ -81,9 +108,13 @@ def stock_movement_create(request):
         if form.is_valid():
             movement = form.save(commit=False)
             movement.created_by = request.user
-            movement.save()
-            messages.success(request, 'Stock movement recorded successfully.')
-            return redirect('product_detail', pk=movement.product.pk)
+            try:
+                record_movement(movement)
+            except InsufficientStock as exc:
+                form.add_error('quantity', str(exc))
+            else:
+                messages.success(request, 'Stock movement recorded successfully.')
+                return redirect('product_detail', pk=movement.product_id)
     else:
         form = StockMovementForm()
     return render(request, 'core/stock_movement_form.html', {'form': form})
@@ -95,9 +126,13 @@ def sale_create(request):
         if form.is_valid():
             sale = form.save(commit=False)
             sale.created_by = request.user
-            sale.save()
-            messages.success(request, 'Sale recorded successfully.')
-            return redirect('product_detail', pk=sale.product.pk)
+            try:
+                record_sale(sale)
+            except InsufficientStock as exc:
+                form.add_error('quantity', str(exc))
+            else:
+                messages.success(request, 'Sale recorded successfully.')
+                return redirect('product_detail', pk=sale.product_id)
     else:
         form = SaleForm()
     return render(request, 'core/sale_form.html', {'form': form})
@@ -112,85 +147,364 @@ def supplier_list(request):
     suppliers = Supplier.objects.all()
     return render(request, 'core/supplier_list.html', {'suppliers': suppliers})
 
-class CategoryViewSet(viewsets.ModelViewSet):
+def bulk_ingest(request, row_serializer_class, ingest):
+    rows = request.data
+    if not isinstance(rows, list):
+        return Response({'detail': 'Expected a list of rows.'}, status=status.HTTP_400_BAD_REQUEST)
+    max_rows = getattr(settings, 'BULK_INGEST_MAX_ROWS', 50000)
+    if len(rows) > max_rows:
+        return Response({'detail': f'At most {max_rows} rows per request.'}, status=status.HTTP_400_BAD_REQUEST)
+
+    row_serializer = row_serializer_class()
+    entries, errors = [], []
+    for index, row in enumerate(rows):
+        try:
+            entries.append((index, row_serializer.run_validation(row)))
+        except ValidationError as exc:
+            errors.append({'index': index, 'errors': exc.detail})
+
+    try:
+        created, rejected = ingest(entries, request.user)
+    except InsufficientStock as exc:
+        return Response({'detail': str(exc)}, status=status.HTTP_409_CONFLICT)
+    errors = sorted(errors + rejected, key=lambda error: error['index'])
+    return Response({'created': created, 'errors': errors},
+                    status=status.HTTP_201_CREATED if created else status.HTTP_400_BAD_REQUEST)
+
+def stream_export(request, name):
+    """Stream ``name`` (see core.exports) as CSV or NDJSON, filtered by ``?start=&end=&product=``."""
+    filters = ExportFilterSerializer(data=request.query_params)
+    filters.is_valid(raise_exception=True)
+    header, rows = export_rows(name, **filters.validated_data)
+    content_type, stream = FORMATS[request.accepted_renderer.format]
+    response = StreamingHttpResponse(stream(header, rows), content_type=content_type)
+    filename = f'{name}-{timezone.now():%Y%m%d-%H%M%S}.{request.accepted_renderer.format}'
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
+
+class CategoryViewSet(VersionedCacheMixin, DeltaSyncMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     filterset_fields = ['name']
     search_fields = ['name', 'description']
     permission_classes = [permissions.AllowAny]
 
-class SupplierViewSet(viewsets.ModelViewSet):
+class SupplierViewSet(VersionedCacheMixin, DeltaSyncMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Supplier.objects.all()
     serializer_class = SupplierSerializer
     filterset_fields = ['name']
     search_fields = ['name', 'contact_person', 'email', 'phone']
     permission_classes = [permissions.AllowAny]
 
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(VersionedCacheMixin, DeltaSyncMixin, OptimizedQuerysetMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
+    cache_models = (Product, Category, Supplier)
     filterset_fields = ['category', 'supplier', 'price']
-    search_fields = ['name', 'description', 'sku']
+    filter_backends = [ProductSearchFilter]
     permission_classes = [permissions.AllowAny]
 
+    @action(detail=False, methods=['post'], url_path='import', parser_classes=[MultiPartParser],
+            permission_classes=[permissions.IsAuthenticated])
+    def import_catalog(self, request):
+        """
+        Upsert products by SKU from an uploaded CSV or JSON ``file``; see core.imports.
+        Large files (or ``background=1``) are imported by a background job instead.
+        """
+        upload = request.FILES.get('file')
+        if upload is None:
+            raise ValidationError({'file': ['No file was submitted.']})
+        file_format = request.data.get('file_format') or detect_format(upload.name)
+        if file_format not in PARSERS:
+            raise ValidationError({'file_format': [f'Expected one of: {", ".join(PARSERS)}.']})
+        background = str(request.data.get('background', '')).lower() in ('1', 'true', 'yes')
+        if background or upload.size > settings.IMPORT_INLINE_MAX_BYTES:
+            path = default_storage.save(f'imports/{upload.name}', upload)
+            job = enqueue('import_catalog_file', user=request.user, path=path, file_format=file_format)
+            return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+        summary = import_catalog(PARSERS[file_format](upload))
+        imported = summary['created'] or summary['updated']
+        return Response(summary, status=status.HTTP_201_CREATED if imported else status.HTTP_400_BAD_REQUEST)
+
+    @action(detail=False, methods=['get'])
+    def suggest(self, request):
+        """Search-as-you-type: the ten best matches for ``?q=``, including partial last words."""
+        text = request.query_params.get('q', '')
+        if not text.strip():
+            return Response([])
+        matches = search_products(Product.objects.all(), text)[:10]
+        return Response(list(matches.values('id', 'name', 'sku')))
+
+    @action(detail=True, methods=['get'])
+    def stock_at(self, request, pk=None):
+        """The product's stock at ``?at=``, from the stock ledger."""
+        query = StockAtSerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        product = self.get_object()
+        at = query.validated_data['at']
+        return Response({'product': product.pk, 'at': at, 'quantity': quantity_at(product.pk, at)})
+
+    @action(detail=True, methods=['get'])
+    def locations(self, request, pk=None):
+        """The product's stock at each location; the quantities add up to the product's ``quantity``."""
+        product = self.get_object()
+        stock = LocationStock.objects.filter(product=product).select_related('product', 'location')
+        return Response(LocationStockSerializer(stock, many=True).data)
+
+    def get_serializer_class(self):
+        if self.action == 'low_stock':
+            return LowStockProductSerializer
+        return super().get_serializer_class()
+
     @action(detail=False, methods=['get'])
     def low_stock(self, request):
-        low_stock_products = self.queryset.filter(quantity__lte=F('reorder_level'))
+        """Products at their reorder level or at their forecast reorder point, with the forecast."""
+        low_stock_products = self.get_queryset().filter(low_stock=True)
         serializer = self.get_serializer(low_stock_products, many=True)
         return Response(serializer.data)
 
-class StockMovementViewSet(viewsets.ModelViewSet):
+class StockMovementViewSet(DeltaSyncMixin, OptimizedQuerysetMixin, mixins.CreateModelMixin,
+                           viewsets.ReadOnlyModelViewSet):
+    """Stock movements can only be added: a correction is a new ADJ movement, so stock and the ledger agree."""
     queryset = StockMovement.objects.all()
     serializer_class = StockMovementSerializer
-    filterset_fields = ['movement_type', 'product', 'created_at']
+    filterset_fields = ['movement_type', 'product', 'location', 'created_at']
     search_fields = ['product__name', 'reference_number', 'notes']
     permission_classes = [permissions.AllowAny]
+    pagination_class = StockMovementCursorPagination
+
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        return bulk_ingest(request, StockMovementRowSerializer, ingest_movements)
 
-    def perform_create(self, serializer):
-        movement = serializer.save()
-        product = movement.product
-        if movement.movement_type == 'IN':
-            product.quantity += movement.quantity
-        elif movement.movement_type == 'OUT':
-            product.quantity -= movement.quantity
-        product.save()
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer],
+            permission_classes=[permissions.IsAuthenticated])
+    def export(self, request):
+        return stream_export(request, 'stock-movements')
 
-class SaleViewSet(viewsets.ModelViewSet):
+class SaleViewSet(DeltaSyncMixin, OptimizedQuerysetMixin, mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """Sales can only be added; a return is booked as an IN stock movement."""
     queryset = Sale.objects.all()
     serializer_class = SaleSerializer
-    filterset_fields = ['product', 'sale_date']
+    filterset_fields = ['product', 'location', 'sale_date']
     search_fields = ['product__name']
     permission_classes = [permissions.AllowAny]
+    pagination_class = SaleCursorPagination
 
-    def perform_create(self, serializer):
-        sale = serializer.save()
-        product = sale.product
-        product.quantity -= sale.quantity
-        product.save()
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        return bulk_ingest(request, SaleRowSerializer, ingest_sales)
+
+    @action(detail=False, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer],
+            permission_classes=[permissions.IsAuthenticated])
+    def export(self, request):
+        return stream_export(request, 'sales')
+
+# The API dashboard's queries by name. They are independent of each other, so core.asyncviews runs them concurrently.
+DASHBOARD_QUERIES = {
+    'totals': counters,
+    'total_sales': lambda: DailySummary.objects.aggregate(total=Sum('revenue'))['total'] or 0,
+    'recent_sales': lambda: list(optimize_queryset(Sale.objects.order_by('-sale_date'), SaleSerializer)[:5]),
+    'recent_movements': lambda: list(
+        optimize_queryset(StockMovement.objects.order_by('-created_at'), StockMovementSerializer)[:5]),
+    # Low-stock products that sell, soonest out of stock first by the nightly forecast's days of cover.
+    'reorder_soon': lambda: list(
+        optimize_queryset(Product.objects.filter(low_stock=True, days_of_cover__isnull=False),
+                          LowStockProductSerializer).order_by('days_of_cover', 'pk')[:5]),
+}
+
+def dashboard_data(results):
+    """Serialized dashboard from the ``DASHBOARD_QUERIES`` results."""
+    totals = results['totals']
+    data = {
+        'total_products': totals['products'],
+        'total_categories': totals['categories'],
+        'total_suppliers': totals['suppliers'],
+        'low_stock_products': totals['low_stock_products'],
+        'total_sales': results['total_sales'],
+        'recent_sales': results['recent_sales'],
+        'recent_movements': results['recent_movements'],
+        'reorder_soon': results['reorder_soon'],
+    }
+    return DashboardSerializer(data).data
 
 class DashboardViewSet(viewsets.ViewSet):
     permission_classes = [permissions.AllowAny]
     def list(self, request):
-        # Get counts
-        total_products = Product.objects.count()
-        total_categories = Category.objects.count()
-        total_suppliers = Supplier.objects.count()
-        low_stock_products = Product.objects.filter(quantity__lte=F('reorder_level')).count()
-
-        # Get sales data
-        total_sales = Sale.objects.aggregate(total=Sum('total_amount'))['total'] or 0
-        recent_sales = Sale.objects.order_by('-sale_date')[:5]
-        recent_movements = StockMovement.objects.order_by('-created_at')[:5]
-
-        data = {
-            'total_products': total_products,
-            'total_categories': total_categories,
-            'total_suppliers': total_suppliers,
-            'low_stock_products': low_stock_products,
-            'total_sales': total_sales,
-            'recent_sales': recent_sales,
-            'recent_movements': recent_movements,
-        }
-
-        serializer = DashboardSerializer(data)
-        return Response(serializer.data) 
\ No newline at end of file
+        return Response(dashboard_data({name: query() for name, query in DASHBOARD_QUERIES.items()}))
+
+    @action(detail=False, methods=['get'], permission_classes=[permissions.IsAuthenticated])
+    def analytics(self, request):
+        """Revenue, units and margin per ``?period=`` day, week or month, optionally ``?group_by=`` category or supplier."""
+        query = AnalyticsQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(sales_analytics(**query.validated_data))
+
+class CacheStatsViewSet(viewsets.ViewSet):
+    permission_classes = [permissions.IsAdminUser]
+
+    def list(self, request):
+        return Response(cache_metrics())
+
+class MiddlewareStatsViewSet(viewsets.ViewSet):
+    """Time spent in each middleware, per stack, in this worker process (needs MIDDLEWARE_TIMING)."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def list(self, request):
+        return Response({'enabled': settings.MIDDLEWARE_TIMING, 'stacks': middleware_metrics()})
+
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Status of background jobs; staff see every job, other users the ones they started."""
+    serializer_class = JobSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        jobs = Job.objects.select_related('created_by')
+        if not self.request.user.is_staff:
+            jobs = jobs.filter(created_by=self.request.user)
+        for field in ('status', 'task', 'queue'):
+            if self.request.query_params.get(field):
+                jobs = jobs.filter(**{field: self.request.query_params[field]})
+        return jobs
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        job = self.get_object()
+        if not Job.objects.filter(pk=job.pk, status=Job.QUEUED).update(status=Job.CANCELLED,
+                                                                         finished_at=timezone.now()):
+            return Response({'detail': f'Only queued jobs can be cancelled; this one is {job.status}.'},
+                            status=status.HTTP_409_CONFLICT)
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data)
+
+    @action(detail=True, methods=['post'], permission_classes=[permissions.IsAdminUser])
+    def retry(self, request, pk=None):
+        job = self.get_object()
+        if not Job.objects.filter(pk=job.pk, status__in=[Job.FAILED, Job.CANCELLED]).update(
+                status=Job.QUEUED, attempts=0, run_at=timezone.now(), finished_at=None):
+            return Response({'detail': f'Only failed or cancelled jobs can be retried; this one is {job.status}.'},
+                            status=status.HTTP_409_CONFLICT)
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data)
+
+class ReservationViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """Checkout holds on stock: reserve, then commit as a sale or release. Staff see every reservation."""
+    serializer_class = ReservationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        reservations = Reservation.objects.select_related('product')
+        if not self.request.user.is_staff:
+            reservations = reservations.filter(created_by=self.request.user)
+        if self.request.query_params.get('status'):
+            reservations = reservations.filter(status=self.request.query_params['status'])
+        return reservations
+
+    @action(detail=True, methods=['post'])
+    def commit(self, request, pk=None):
+        """Record the reserved stock as a sale (``unit_price`` defaults to the product's price)."""
+        reservation = self.get_object()
+        details = ReservationCommitSerializer(data=request.data)
+        details.is_valid(raise_exception=True)
+        try:
+            sale = commit_reservation(reservation, **details.validated_data)
+        except ReservationClosed:
+            return Response({'detail': f'This reservation is {self.closed_status(reservation)}.'},
+                            status=status.HTTP_409_CONFLICT)
+        except InsufficientStock as exc:
+            raise ValidationError({'location': [str(exc)]})
+        return Response(SaleSerializer(sale, context=self.get_serializer_context()).data,
+                        status=status.HTTP_201_CREATED)
+
+    @action(detail=True, methods=['post'])
+    def release(self, request, pk=None):
+        reservation = self.get_object()
+        try:
+            release_reservation(reservation)
+        except ReservationClosed:
+            return Response({'detail': f'This reservation is {self.closed_status(reservation)}.'},
+                            status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(reservation).data)
+
+    def closed_status(self, reservation):
+        reservation.refresh_from_db(fields=['status'])
+        # Past its expiry but not swept yet.
+        return 'expired' if reservation.status == Reservation.HELD else reservation.status
+
+class LocationViewSet(viewsets.ModelViewSet):
+    """Stores and warehouses. Movements and sales without a location use the default one."""
+    queryset = Location.objects.all()
+    serializer_class = LocationSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def destroy(self, request, *args, **kwargs):
+        try:
+            return super().destroy(request, *args, **kwargs)
+        except ProtectedError:
+            return Response({'detail': 'This location has stock or stock history.'}, status=status.HTTP_409_CONFLICT)
+
+    @action(detail=True, methods=['get'])
+    def stock(self, request, pk=None):
+        """Stock held at the location, product by product (``?product=`` for one)."""
+        stock = LocationStock.objects.filter(location=self.get_object()).select_related('product', 'location')
+        if request.query_params.get('product'):
+            stock = stock.filter(product=request.query_params['product'])
+        page = self.paginate_queryset(stock)
+        return self.get_paginated_response(LocationStockSerializer(page, many=True).data)
+
+class StockTransferViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    """Stock moved between locations; each transfer records an OUT and an IN stock movement."""
+    queryset = StockTransfer.objects.select_related('product', 'source', 'destination', 'created_by')
+    serializer_class = StockTransferSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        transfers = super().get_queryset()
+        for name in ('product', 'source', 'destination'):
+            if self.request.query_params.get(name):
+                transfers = transfers.filter(**{name: self.request.query_params[name]})
+        return transfers
+
+class PurchaseOrderViewSet(viewsets.ReadOnlyModelViewSet):
+    """Orders to suppliers: generate drafts from low stock, then place, receive or cancel them."""
+    queryset = PurchaseOrder.objects.all()
+    serializer_class = PurchaseOrderSerializer
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get_queryset(self):
+        lines = PurchaseOrderLine.objects.select_related('product')
+        orders = super().get_queryset().select_related('supplier').prefetch_related(Prefetch('lines', queryset=lines))
+        for name in ('status', 'supplier'):
+            if self.request.query_params.get(name):
+                orders = orders.filter(**{name: self.request.query_params[name]})
+        return orders
+
+    @action(detail=False, methods=['post'])
+    def generate(self, request):
+        """Draft one order per supplier for every product at its reorder level or forecast reorder point."""
+        options = PurchaseOrderGenerateSerializer(data=request.data)
+        options.is_valid(raise_exception=True)
+        orders, lines = generate_orders(request.user, **options.validated_data)
+        return Response({'orders': orders, 'lines': lines},
+                        status=status.HTTP_201_CREATED if orders else status.HTTP_200_OK)
+
+    @action(detail=True, methods=['post'])
+    def place(self, request, pk=None):
+        return self.transition(place_order)
+
+    @action(detail=True, methods=['post'])
+    def receive(self, request, pk=None):
+        """Book every line in as stock, as one batch of IN stock movements."""
+        return self.transition(lambda order: receive_order(order, request.user))
+
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        return self.transition(cancel_order)
+
+    def transition(self, change):
+        order = self.get_object()
+        try:
+            change(order)
+        except PurchaseOrderClosed as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_409_CONFLICT)
+        return Response(self.get_serializer(order).data)
@@ -1,13 +1,19 @@
-import os
-from pathlib import Path
-from datetime import timedelta
-from dotenv import load_dotenv
-
-# Load environment variables
-load_dotenv()
-
-# Build paths inside the project like this: BASE_DIR / 'subdir'.
-BASE_DIR = Path(__file__).resolve().parent.parent
+"""
+Local development settings: everything from inventory/settings.py, with only
+what differs on a developer machine overridden below. That is SQLite and
+local-memory caches instead of PostgreSQL and Redis, DEBUG, relaxed CORS and
+cookies, and no apps (or their middleware and backends) from the packages
+that only production installs.
+"""
+from .settings import *  # noqa: F403
+
+# Production-only packages: their apps, middleware and backends are left out locally.
+PRODUCTION_ONLY = ('django.contrib.postgres', 'axes', 'auditlog', 'oauth2_provider', 'allauth', 'two_factor', 'otp',
+                   'defender', 'user_agents', 'ipware', 'honeypot', 'security', 'csp', 'password_validators')
+
+def local_only(paths):
+    """``paths`` (app labels or dotted paths) without the ones from PRODUCTION_ONLY packages."""
+    return [path for path in paths if not any(path == name or path.startswith(f'{name}.') for name in PRODUCTION_ONLY)]
 
 # SECURITY WARNING: keep the secret key used in production secret!
 SECRET_KEY = os.getenv('SECRET_KEY', 'django-insecure-dev-secret-key-change-in-production')
@@ -17,104 +23,30 @@ DEBUG = True
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '0.0.0.0']
 
-# Application definition
-INSTALLED_APPS = [
-    'django.contrib.admin',
-    'django.contrib.auth',
-    'django.contrib.contenttypes',
-    'django.contrib.sessions',
-    'django.contrib.messages',
-    'django.contrib.staticfiles',
-    'core.apps.CoreConfig',
-    'rest_framework',
-    'corsheaders',
-    'drf_yasg',
-]
+INSTALLED_APPS = local_only(INSTALLED_APPS) + ['drf_yasg']
 
-MIDDLEWARE = [
-    'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
-    'corsheaders.middleware.CorsMiddleware',
-    'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
-]
+API_MIDDLEWARE = local_only(API_MIDDLEWARE)
+SITE_MIDDLEWARE = local_only(SITE_MIDDLEWARE)
 
-ROOT_URLCONF = 'inventory.urls'
-
-TEMPLATES = [
-    {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
-        'DIRS': [],
-        'APP_DIRS': True,
-        'OPTIONS': {
-            'context_processors': [
-                'django.template.context_processors.debug',
-                'django.template.context_processors.request',
-                'django.contrib.auth.context_processors.auth',
-                'django.contrib.messages.context_processors.messages',
-            ],
-        },
-    },
-]
+AUTHENTICATION_BACKENDS = local_only(AUTHENTICATION_BACKENDS)
 
-WSGI_APPLICATION = 'inventory.wsgi.application'
+AUTH_PASSWORD_VALIDATORS = [validator for validator in AUTH_PASSWORD_VALIDATORS
+                            if local_only([validator['NAME']])]
 
 # Database configuration for local development
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # Reuse connections across requests, including those of the async views' query threads.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
     }
 }
 
-# Password validation
-AUTH_PASSWORD_VALIDATORS = [
-    {
-        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
-    },
-    {
-        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
-    },
-]
-
-# Internationalization
-LANGUAGE_CODE = 'en-us'
-TIME_ZONE = 'UTC'
-USE_I18N = True
-USE_TZ = True
-
-# Static files configuration
-STATIC_URL = '/static/'
-STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-STATICFILES_DIRS = [
-    os.path.join(BASE_DIR, 'static'),
-]
-
-# Media files configuration
-MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
-
-DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
-
-# REST Framework settings
-REST_FRAMEWORK = {
-    'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
-    ),
-    'DEFAULT_PERMISSION_CLASSES': (
-        'rest_framework.permissions.IsAuthenticated',
-    ),
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
-    'PAGE_SIZE': 10,
+# REST Framework: JWT only, no throttling, and the browsable API with form uploads
+REST_FRAMEWORK = {key: value for key, value in REST_FRAMEWORK.items() if not key.startswith('DEFAULT_THROTTLE_')}
+REST_FRAMEWORK.update({
+    'DEFAULT_AUTHENTICATION_CLASSES': tuple(local_only(REST_FRAMEWORK['DEFAULT_AUTHENTICATION_CLASSES'])),
     'DEFAULT_RENDERER_CLASSES': [
         'rest_framework.renderers.JSONRenderer',
         'rest_framework.renderers.BrowsableAPIRenderer',
@@ -124,58 +56,33 @@ REST_FRAMEWORK = {
         'rest_framework.parsers.FormParser',
         'rest_framework.parsers.MultiPartParser',
     ],
-}
+})
 
-# JWT settings
-SIMPLE_JWT = {
-    'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
-    'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
-    'ROTATE_REFRESH_TOKENS': True,
-    'BLACKLIST_AFTER_ROTATION': True,
-    'UPDATE_LAST_LOGIN': True,
-    'ALGORITHM': 'HS256',
-    'SIGNING_KEY': SECRET_KEY,
-    'VERIFYING_KEY': None,
-    'AUDIENCE': None,
-    'ISSUER': None,
-    'JWK_URL': None,
-    'LEEWAY': 0,
-    'AUTH_HEADER_TYPES': ('Bearer',),
-    'AUTH_HEADER_NAME': 'HTTP_AUTHORIZATION',
-    'USER_ID_FIELD': 'id',
-    'USER_ID_CLAIM': 'user_id',
-    'USER_AUTHENTICATION_RULE': 'rest_framework_simplejwt.authentication.default_user_authentication_rule',
-    'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
-    'TOKEN_TYPE_CLAIM': 'token_type',
-    'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
-    'JTI_CLAIM': 'jti',
-    'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
-    'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
-    'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
-}
+# JWT settings: longer-lived access tokens, signed with the local secret key
+SIMPLE_JWT = {**SIMPLE_JWT, 'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60), 'SIGNING_KEY': SECRET_KEY}
+
+# Cache configuration for local development: no Redis; sessions in the database so they survive restarts
+CACHES = {**CACHES, 'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+SESSION_ENGINE = 'django.contrib.sessions.backends.db'
 
 # CORS settings for local development
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
     "http://127.0.0.1:3000",
 ]
-
-CORS_ALLOW_CREDENTIALS = True
 CORS_ALLOW_ALL_ORIGINS = True  # Only for development!
 
 # Security settings for development
 SECURE_BROWSER_XSS_FILTER = False
 SECURE_CONTENT_TYPE_NOSNIFF = False
+SECURE_HSTS_SECONDS = 0
 SECURE_SSL_REDIRECT = False
 
 # Session settings for development
 SESSION_COOKIE_SECURE = False
 CSRF_COOKIE_SECURE = False
 
-# Email configuration for development
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
-
 # Login/logout URLs
 LOGIN_URL = '/admin/login/'
 LOGIN_REDIRECT_URL = '/admin/'
-LOGOUT_REDIRECT_URL = '/admin/login/' 
\ No newline at end of file
+LOGOUT_REDIRECT_URL = '/admin/login/'
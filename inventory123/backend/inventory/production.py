@@ -26,8 +26,8 @@ DATABASES = {
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
-# Add whitenoise middleware for static files
-MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
+# Add whitenoise middleware for static files (right after SecurityMiddleware; static files are never under /api/)
+SITE_MIDDLEWARE.insert(1, 'whitenoise.middleware.WhiteNoiseMiddleware')
 
 # Security settings for production
 SECURE_BROWSER_XSS_FILTER = True
@@ -71,12 +71,16 @@ LOGGING = {
             'format': '{levelname} {asctime} {module} {process:d} {thread:d} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'core.logs.JSONFormatter',
+        },
     },
     'handlers': {
         'console': {
             'level': 'INFO',
-            'class': 'logging.StreamHandler',
-            'formatter': 'verbose'
+            '()': 'core.logs.BackgroundHandler',
+            'target': 'logging.StreamHandler',
+            'formatter': 'json'
         },
     },
     'loggers': {
@@ -90,6 +94,16 @@ LOGGING = {
             'level': 'WARNING',
             'propagate': False,
         },
+        'inventory.access': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'inventory.audit': {
+            'handlers': ['console'],
+            'level': 'INFO',
+            'propagate': False,
+        },
     }
 }
 
@@ -101,7 +115,8 @@ CACHES = {
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
         }
-    }
+    },
+    RESPONSE_CACHE_ALIAS: RESPONSE_CACHE,
 }
 
 # Use cache for sessions
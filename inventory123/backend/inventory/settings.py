@@ -26,8 +26,10 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core.apps.CoreConfig',
     'rest_framework',
+    'rest_framework_simplejwt.token_blacklist',
     'corsheaders',
     'axes',
     'auditlog',
@@ -38,7 +40,6 @@ INSTALLED_APPS = [
     'two_factor',
     'otp',
     'defender',
-    'request_logging',
     'user_agents',
     'ipware',
     'honeypot',
@@ -46,14 +47,39 @@ INSTALLED_APPS = [
     'csp',
 ]
 
+# settings.MIDDLEWARE only picks a stack per request (core/middleware.py): API_MIDDLEWARE under API_PATH_PREFIX,
+# SITE_MIDDLEWARE for pages and the admin. The API authenticates with tokens, so it skips sessions, CSRF,
+# messages and the login-protection middleware; it keeps every security-header middleware.
 MIDDLEWARE = [
+    'core.middleware.RoutedMiddleware',
+]
+
+API_PATH_PREFIX = '/api/'
+
+API_MIDDLEWARE = [
+    'core.logs.AccessLogMiddleware',
+    # Security middleware (order matters)
+    'django.middleware.security.SecurityMiddleware',
+    'csp.middleware.CSPMiddleware',
+    'security.middleware.SecurityMiddleware',
+    'corsheaders.middleware.CorsMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'security.middleware.SSLRedirectMiddleware',
+    'security.middleware.StrictTransportSecurityMiddleware',
+    'security.middleware.ContentTypeNosniffMiddleware',
+    'security.middleware.XSSProtectionMiddleware',
+    'security.middleware.ReferrerPolicyMiddleware',
+]
+
+SITE_MIDDLEWARE = [
+    'core.logs.AccessLogMiddleware',
     # Security middleware (order matters)
     'django.middleware.security.SecurityMiddleware',
     'csp.middleware.CSPMiddleware',
     'security.middleware.SecurityMiddleware',
     'axes.middleware.AxesMiddleware',
     'defender.middleware.FailedLoginMiddleware',
-    'request_logging.middleware.LoggingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -69,6 +95,12 @@ MIDDLEWARE = [
     'security.middleware.ReferrerPolicyMiddleware',
 ]
 
+# Measure each middleware's time per request (Server-Timing header, /api/middleware-stats/)
+MIDDLEWARE_TIMING = os.getenv('MIDDLEWARE_TIMING', 'False').lower() == 'true'
+
+# The admin looks for its middleware in MIDDLEWARE; core.middleware checks SITE_MIDDLEWARE instead
+SILENCED_SYSTEM_CHECKS = ['admin.E408', 'admin.E409', 'admin.E410']
+
 ROOT_URLCONF = 'inventory.urls'
 
 TEMPLATES = [
@@ -98,6 +130,9 @@ DATABASES = {
         'PASSWORD': os.getenv('DB_PASSWORD', 'secure_password'),
         'HOST': os.getenv('DB_HOST', 'localhost'),
         'PORT': os.getenv('DB_PORT', '5432'),
+        # Reuse connections across requests, including those of the async views' query threads.
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
         'OPTIONS': {
             'sslmode': 'require',
         },
@@ -158,7 +193,7 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework settings with enhanced security
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.auth.CachedJWTAuthentication',
         'oauth2_provider.contrib.rest_framework.OAuth2Authentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
@@ -182,6 +217,72 @@ REST_FRAMEWORK = {
     ],
 }
 
+# Serve the dashboard and catalog list GETs from the async views in core.asyncviews (best under ASGI)
+ASYNC_READ_VIEWS = os.getenv('ASYNC_READ_VIEWS', 'True').lower() == 'true'
+
+# Largest batch accepted by the bulk stock-movement and sales endpoints
+BULK_INGEST_MAX_ROWS = int(os.getenv('BULK_INGEST_MAX_ROWS', 50000))
+
+# Upper bound for ?page_size= on cursor-paginated endpoints (sales, stock movements)
+API_MAX_PAGE_SIZE = int(os.getenv('API_MAX_PAGE_SIZE', 100))
+
+# Delta sync (?since=): rows per response, token rewind for late commits, and how long deletes are remembered
+SYNC_MAX_ROWS = int(os.getenv('SYNC_MAX_ROWS', 1000))
+SYNC_OVERLAP_SECONDS = int(os.getenv('SYNC_OVERLAP_SECONDS', 5))
+SYNC_TOMBSTONE_RETENTION_DAYS = int(os.getenv('SYNC_TOMBSTONE_RETENTION_DAYS', 30))
+
+# Most ranked matches the SQLite full-text fallback returns for one product search
+SEARCH_MAX_RESULTS = int(os.getenv('SEARCH_MAX_RESULTS', 1000))
+
+# Catalog uploads larger than this are imported by a background job
+IMPORT_INLINE_MAX_BYTES = int(os.getenv('IMPORT_INLINE_MAX_BYTES', 5 * 1024 * 1024))
+
+# Background jobs: most jobs per queue running at once across workers (e.g. "imports=1,images=2"),
+# seconds before a silent worker's job is requeued, and the retry backoff bounds in seconds
+JOB_QUEUE_LIMITS = {queue: int(limit) for queue, _, limit in
+                    (item.partition('=') for item in os.getenv('JOB_QUEUE_LIMITS', 'imports=1,images=2').split(',') if item)}
+JOB_LOCK_TIMEOUT = int(os.getenv('JOB_LOCK_TIMEOUT', 3600))
+# How often a worker renews the lock of the job it runs; keep it well below JOB_LOCK_TIMEOUT.
+JOB_HEARTBEAT = int(os.getenv('JOB_HEARTBEAT', 60))
+JOB_RETRY_DELAY = int(os.getenv('JOB_RETRY_DELAY', 10))
+JOB_RETRY_MAX_DELAY = int(os.getenv('JOB_RETRY_MAX_DELAY', 3600))
+
+# Sales analytics rollups: days kept at day resolution, and the local time (HH:MM) of the nightly compaction job
+SALES_ROLLUP_DAY_RETENTION = int(os.getenv('SALES_ROLLUP_DAY_RETENTION', 400))
+SALES_ROLLUP_COMPACT_AT = os.getenv('SALES_ROLLUP_COMPACT_AT', '00:30')
+
+# Checkout reservations (core.reservations): default and longest hold in seconds
+RESERVATION_TTL_SECONDS = int(os.getenv('RESERVATION_TTL_SECONDS', 600))
+RESERVATION_MAX_TTL_SECONDS = int(os.getenv('RESERVATION_MAX_TTL_SECONDS', 3600))
+
+# Stock ledger (core.ledger): daily snapshot time (HH:MM) and how far behind now the snapshot is taken, in seconds
+STOCK_SNAPSHOT_AT = os.getenv('STOCK_SNAPSHOT_AT', '01:00')
+STOCK_SNAPSHOT_LAG_SECONDS = int(os.getenv('STOCK_SNAPSHOT_LAG_SECONDS', 300))
+
+# Demand forecasts (core.forecast): nightly run time (HH:MM), days of sales read, moving-average window in days
+# and exponential smoothing factor
+FORECAST_AT = os.getenv('FORECAST_AT', '02:00')
+FORECAST_HISTORY_DAYS = int(os.getenv('FORECAST_HISTORY_DAYS', 365))
+FORECAST_WINDOW_DAYS = int(os.getenv('FORECAST_WINDOW_DAYS', 28))
+FORECAST_SMOOTHING = float(os.getenv('FORECAST_SMOOTHING', 0.1))
+# Reorder suggestions: supplier lead time and days between orders, and safety stock in standard deviations
+FORECAST_LEAD_TIME_DAYS = int(os.getenv('FORECAST_LEAD_TIME_DAYS', 7))
+FORECAST_REVIEW_DAYS = int(os.getenv('FORECAST_REVIEW_DAYS', 14))
+FORECAST_SAFETY_FACTOR = float(os.getenv('FORECAST_SAFETY_FACTOR', 1.65))
+
+# Access log (core.logs): share of successful GETs logged per path prefix (e.g. "/api/products/=0.1"),
+# and the duration in milliseconds from which every request is logged
+ACCESS_LOG_SAMPLE_RATES = {prefix: float(rate) for prefix, _, rate in
+                           (item.partition('=') for item in os.getenv(
+                               'ACCESS_LOG_SAMPLE_RATES',
+                               '/api/dashboard/=0.1,/api/products/=0.1,/api/categories/=0.1,/api/suppliers/=0.1',
+                           ).split(',') if item)}
+ACCESS_LOG_SLOW_MS = int(os.getenv('ACCESS_LOG_SLOW_MS', 1000))
+
+# Audit trail (core.audit): entries per batch insert, and the longest wait in seconds before a partial batch is written
+AUDIT_BATCH_SIZE = int(os.getenv('AUDIT_BATCH_SIZE', 500))
+AUDIT_FLUSH_SECONDS = float(os.getenv('AUDIT_FLUSH_SECONDS', 2))
+
 # JWT settings with enhanced security
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=15),
@@ -208,8 +309,15 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_EXP_CLAIM': 'refresh_exp',
     'SLIDING_TOKEN_LIFETIME': timedelta(minutes=5),
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
+    'TOKEN_OBTAIN_SERIALIZER': 'core.auth.TokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'core.auth.TokenRefreshSerializer',
 }
 
+# API authentication (core.auth): seconds a process reuses a loaded user, and whether to skip the lookup
+# entirely and build the user from the access token's claims
+AUTH_USER_CACHE_SECONDS = int(os.getenv('AUTH_USER_CACHE_SECONDS', 60))
+JWT_STATELESS_USER = os.getenv('JWT_STATELESS_USER', 'False').lower() == 'true'
+
 # CORS settings with enhanced security
 CORS_ALLOWED_ORIGINS = [
     "https://localhost:3000",
@@ -319,6 +427,9 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'core.logs.JSONFormatter',
+        },
     },
     'filters': {
         'require_debug_true': {
@@ -332,17 +443,20 @@ LOGGING = {
             'class': 'logging.StreamHandler',
             'formatter': 'simple'
         },
+        # File writes happen on a listener thread (core.logs.BackgroundHandler), not the request thread
         'file': {
             'level': 'INFO',
-            'class': 'logging.FileHandler',
+            '()': 'core.logs.BackgroundHandler',
+            'target': 'logging.FileHandler',
             'filename': os.path.join(BASE_DIR, 'logs', 'django.log'),
-            'formatter': 'verbose',
+            'formatter': 'json',
         },
         'security_file': {
             'level': 'WARNING',
-            'class': 'logging.FileHandler',
+            '()': 'core.logs.BackgroundHandler',
+            'target': 'logging.FileHandler',
             'filename': os.path.join(BASE_DIR, 'logs', 'security.log'),
-            'formatter': 'verbose',
+            'formatter': 'json',
         },
     },
     'loggers': {
@@ -365,7 +479,12 @@ LOGGING = {
             'level': 'WARNING',
             'propagate': False,
         },
-        'request_logging': {
+        'inventory.access': {
+            'handlers': ['file'],
+            'level': 'INFO',
+            'propagate': False,
+        },
+        'inventory.audit': {
             'handlers': ['file'],
             'level': 'INFO',
             'propagate': False,
@@ -403,14 +522,11 @@ EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD', '')
 DEFAULT_FROM_EMAIL = os.getenv('DEFAULT_FROM_EMAIL', 'noreply@inventory.com')
 
 # Audit logging
+# The core models have their own batched audit trail (core.audit)
 AUDITLOG_INCLUDE_ALL_MODELS = True
+AUDITLOG_EXCLUDE_TRACKING_MODELS = ('core',)
 AUDITLOG_EXCLUDE_TRACKING_FIELDS = ('created_at', 'updated_at')
 
-# Request logging
-REQUEST_LOGGING_ENABLE_COLORIZE = False
-REQUEST_LOGGING_HTTP_4XX_LOG_LEVEL = logging.WARNING
-REQUEST_LOGGING_SENSITIVE_HEADERS = ['authorization', 'cookie']
-
 # Honeypot settings
 HONEYPOT_FIELD_NAME = 'website'
 HONEYPOT_VALUE = ''
@@ -425,6 +541,20 @@ RATELIMIT_ENABLE = True
 RATELIMIT_USE_CACHE = 'default'
 
 # Cache configuration
+# Versioned response cache for the catalog endpoints (core.cache): local memory
+# per process by default, shared Redis when RESPONSE_CACHE_URL is set
+RESPONSE_CACHE_ALIAS = 'responses'
+RESPONSE_CACHE = {
+    'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+    'LOCATION': os.getenv('RESPONSE_CACHE_URL'),
+} if os.getenv('RESPONSE_CACHE_URL') else {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    'LOCATION': 'inventory-responses',
+    'OPTIONS': {
+        'MAX_ENTRIES': 5000,
+    }
+}
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.redis.RedisCache',
@@ -432,7 +562,8 @@ CACHES = {
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
         }
-    }
+    },
+    RESPONSE_CACHE_ALIAS: RESPONSE_CACHE,
 }
 
 # Use cache for sessions
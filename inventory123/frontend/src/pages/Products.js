@@ -80,7 +80,8 @@ function Products() {
   const handleSubmit = (e) => {
     e.preventDefault();
     if (selectedProduct) {
-      dispatch(updateProduct({ id: selectedProduct.id, ...formData }));
+      const { quantity, ...data } = formData;
+      dispatch(updateProduct({ id: selectedProduct.id, ...data }));
     } else {
       dispatch(createProduct(formData));
     }
@@ -223,6 +224,8 @@ function Products() {
               }
               margin="normal"
               required
+              disabled={Boolean(selectedProduct)}
+              helperText={selectedProduct ? 'Change stock with an adjustment movement' : ''}
             />
             <TextField
               fullWidth
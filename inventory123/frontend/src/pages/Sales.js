@@ -9,17 +9,11 @@ import {
   DialogActions,
   TextField,
   Typography,
-  IconButton,
   MenuItem,
 } from '@mui/material';
 import { DataGrid } from '@mui/x-data-grid';
-import { Add as AddIcon, Edit as EditIcon, Delete as DeleteIcon } from '@mui/icons-material';
-import {
-  fetchSales,
-  createSale,
-  updateSale,
-  deleteSale,
-} from '../store/slices/saleSlice';
+import { Add as AddIcon } from '@mui/icons-material';
+import { fetchSales, createSale } from '../store/slices/saleSlice';
 import { fetchProducts } from '../store/slices/productSlice';
 
 function Sales() {
@@ -27,7 +21,6 @@ function Sales() {
   const { items, loading, error } = useSelector((state) => state.sales);
   const { items: products } = useSelector((state) => state.products);
   const [open, setOpen] = useState(false);
-  const [selectedSale, setSelectedSale] = useState(null);
   const [formData, setFormData] = useState({
     product: '',
     quantity: '',
@@ -40,30 +33,19 @@ function Sales() {
     dispatch(fetchProducts());
   }, [dispatch]);
 
-  const handleOpen = (sale = null) => {
-    if (sale) {
-      setSelectedSale(sale);
-      setFormData({
-        product: sale.product,
-        quantity: sale.quantity,
-        unit_price: sale.unit_price,
-        sale_date: sale.sale_date ? sale.sale_date.substring(0, 16) : '',
-      });
-    } else {
-      setSelectedSale(null);
-      setFormData({
-        product: '',
-        quantity: '',
-        unit_price: '',
-        sale_date: '',
-      });
-    }
+  // Sales are never edited or deleted; a return is booked as a stock movement.
+  const handleOpen = () => {
+    setFormData({
+      product: '',
+      quantity: '',
+      unit_price: '',
+      sale_date: '',
+    });
     setOpen(true);
   };
 
   const handleClose = () => {
     setOpen(false);
-    setSelectedSale(null);
   };
 
   const handleSubmit = (e) => {
@@ -74,20 +56,10 @@ function Sales() {
       unit_price: Number(formData.unit_price),
       sale_date: formData.sale_date,
     };
-    if (selectedSale) {
-      dispatch(updateSale({ id: selectedSale.id, ...data }));
-    } else {
-      dispatch(createSale(data));
-    }
+    dispatch(createSale(data));
     handleClose();
   };
 
-  const handleDelete = (id) => {
-    if (window.confirm('Are you sure you want to delete this sale?')) {
-      dispatch(deleteSale(id));
-    }
-  };
-
   const columns = [
     {
       field: 'product',
@@ -102,21 +74,6 @@ function Sales() {
     { field: 'unit_price', headerName: 'Unit Price', width: 120, type: 'number' },
     { field: 'total_amount', headerName: 'Total', width: 120, type: 'number' },
     { field: 'sale_date', headerName: 'Sale Date', width: 180 },
-    {
-      field: 'actions',
-      headerName: 'Actions',
-      width: 120,
-      renderCell: (params) => (
-        <Box>
-          <IconButton onClick={() => handleOpen(params.row)}>
-            <EditIcon />
-          </IconButton>
-          <IconButton onClick={() => handleDelete(params.row.id)}>
-            <DeleteIcon />
-          </IconButton>
-        </Box>
-      ),
-    },
   ];
 
   if (loading) {
@@ -150,9 +107,7 @@ function Sales() {
       />
 
       <Dialog open={open} onClose={handleClose}>
-        <DialogTitle>
-          {selectedSale ? 'Edit Sale' : 'Add Sale'}
-        </DialogTitle>
+        <DialogTitle>Add Sale</DialogTitle>
         <DialogContent>
           <Box component="form" onSubmit={handleSubmit} sx={{ mt: 2 }}>
             <TextField
@@ -215,7 +170,7 @@ function Sales() {
         <DialogActions>
           <Button onClick={handleClose}>Cancel</Button>
           <Button onClick={handleSubmit} variant="contained">
-            {selectedSale ? 'Save' : 'Add'}
+            Add
           </Button>
         </DialogActions>
       </Dialog>
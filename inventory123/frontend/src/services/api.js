@@ -59,6 +59,40 @@ api.interceptors.response.use(
   }
 );
 
+// Follow `next` cursors until the last page and return every row in `data`
+const fetchAllPages = async (url, params) => {
+  let response = await api.get(url, { params });
+  const results = [...response.data.results];
+  while (response.data.next) {
+    response = await api.get(response.data.next);
+    results.push(...response.data.results);
+  }
+  return { ...response, data: results };
+};
+
+// Pull every change since `token` from a `?since=` endpoint; a missing or expired token does a full sync
+const syncChanges = async (url, token) => {
+  const changed = [];
+  const deleted = [];
+  let since = token || '0';
+  try {
+    for (;;) {
+      const { data } = await api.get(url, { params: { since } });
+      changed.push(...data.changed);
+      deleted.push(...data.deleted);
+      since = data.token;
+      if (data.complete) {
+        return { changed, deleted, token: since, reset: !token };
+      }
+    }
+  } catch (error) {
+    if (token && error.response?.status === 410) {
+      return syncChanges(url, null);
+    }
+    throw error;
+  }
+};
+
 // Authentication API
 export const authAPI = {
   login: (credentials) => api.post('/token/', credentials),
@@ -69,10 +103,20 @@ export const authAPI = {
 // Products API
 export const productsAPI = {
   getAll: (params) => api.get('/products/', { params }),
+  sync: (token) => syncChanges('/products/', token),
   getById: (id) => api.get(`/products/${id}/`),
   create: (data) => api.post('/products/', data),
   update: (id, data) => api.put(`/products/${id}/`, data),
   delete: (id) => api.delete(`/products/${id}/`),
+  importCatalog: (file) => {
+    const formData = new FormData();
+    formData.append('file', file);
+    return api.post('/products/import/', formData, {
+      headers: {
+        'Content-Type': 'multipart/form-data',
+      },
+    });
+  },
   uploadImage: (id, imageFile) => {
     const formData = new FormData();
     formData.append('image', imageFile);
@@ -87,6 +131,7 @@ export const productsAPI = {
 // Categories API
 export const categoriesAPI = {
   getAll: (params) => api.get('/categories/', { params }),
+  sync: (token) => syncChanges('/categories/', token),
   getById: (id) => api.get(`/categories/${id}/`),
   create: (data) => api.post('/categories/', data),
   update: (id, data) => api.put(`/categories/${id}/`, data),
@@ -96,6 +141,7 @@ export const categoriesAPI = {
 // Suppliers API
 export const suppliersAPI = {
   getAll: (params) => api.get('/suppliers/', { params }),
+  sync: (token) => syncChanges('/suppliers/', token),
   getById: (id) => api.get(`/suppliers/${id}/`),
   create: (data) => api.post('/suppliers/', data),
   update: (id, data) => api.put(`/suppliers/${id}/`, data),
@@ -104,20 +150,34 @@ export const suppliersAPI = {
 
 // Sales API
 export const salesAPI = {
-  getAll: (params) => api.get('/sales/', { params }),
+  getAll: (params) => fetchAllPages('/sales/', params),
+  getPage: (params) => api.get('/sales/', { params }),
+  getNextPage: (nextUrl) => api.get(nextUrl),
+  sync: (token) => syncChanges('/sales/', token),
   getById: (id) => api.get(`/sales/${id}/`),
   create: (data) => api.post('/sales/', data),
-  update: (id, data) => api.put(`/sales/${id}/`, data),
-  delete: (id) => api.delete(`/sales/${id}/`),
+  bulkCreate: (rows) => api.post('/sales/bulk/', rows),
+  export: (params) => api.get('/sales/export/', { params, responseType: 'blob' }),
 };
 
 // Stock Movements API
 export const stockMovementsAPI = {
-  getAll: (params) => api.get('/stock-movements/', { params }),
+  getAll: (params) => fetchAllPages('/stock-movements/', params),
+  getPage: (params) => api.get('/stock-movements/', { params }),
+  getNextPage: (nextUrl) => api.get(nextUrl),
+  sync: (token) => syncChanges('/stock-movements/', token),
   getById: (id) => api.get(`/stock-movements/${id}/`),
   create: (data) => api.post('/stock-movements/', data),
-  update: (id, data) => api.put(`/stock-movements/${id}/`, data),
-  delete: (id) => api.delete(`/stock-movements/${id}/`),
+  bulkCreate: (rows) => api.post('/stock-movements/bulk/', rows),
+  export: (params) => api.get('/stock-movements/export/', { params, responseType: 'blob' }),
+};
+
+// Background Jobs API
+export const jobsAPI = {
+  getAll: (params) => api.get('/jobs/', { params }),
+  getById: (id) => api.get(`/jobs/${id}/`),
+  cancel: (id) => api.post(`/jobs/${id}/cancel/`),
+  retry: (id) => api.post(`/jobs/${id}/retry/`),
 };
 
 // Dashboard API
@@ -1,16 +1,17 @@
 import { createSlice, createAsyncThunk } from '@reduxjs/toolkit';
 import axios from 'axios';
+import { categoriesAPI, apiUtils } from '../../services/api';
+import { mergeDelta, byName } from '../sync';
 
 const API_URL = 'http://localhost:8000/api';
 
 export const fetchCategories = createAsyncThunk(
   'categories/fetchAll',
-  async (_, { rejectWithValue }) => {
+  async (_, { getState, rejectWithValue }) => {
     try {
-      const response = await axios.get(`${API_URL}/categories/`);
-      return response.data;
+      return await categoriesAPI.sync(getState().categories.syncToken);
     } catch (error) {
-      return rejectWithValue(error.response.data);
+      return rejectWithValue(apiUtils.handleError(error));
     }
   }
 );
@@ -53,6 +54,7 @@ export const deleteCategory = createAsyncThunk(
 
 const initialState = {
   items: [],
+  syncToken: null,
   loading: false,
   error: null,
 };
@@ -73,7 +75,7 @@ const categorySlice = createSlice({
       })
       .addCase(fetchCategories.fulfilled, (state, action) => {
         state.loading = false;
-        state.items = action.payload;
+        mergeDelta(state, action.payload, byName);
       })
       .addCase(fetchCategories.rejected, (state, action) => {
         state.loading = false;
@@ -1,12 +1,12 @@
 import { createSlice, createAsyncThunk } from '@reduxjs/toolkit';
 import { productsAPI, apiUtils } from '../../services/api';
+import { mergeDelta, byName } from '../sync';
 
 export const fetchProducts = createAsyncThunk(
   'products/fetchAll',
-  async (_, { rejectWithValue }) => {
+  async (_, { getState, rejectWithValue }) => {
     try {
-      const response = await productsAPI.getAll();
-      return response.data;
+      return await productsAPI.sync(getState().products.syncToken);
     } catch (error) {
       return rejectWithValue(apiUtils.handleError(error));
     }
@@ -63,6 +63,7 @@ export const uploadProductImage = createAsyncThunk(
 
 const initialState = {
   items: [],
+  syncToken: null,
   loading: false,
   error: null,
 };
@@ -84,7 +85,7 @@ const productSlice = createSlice({
       })
       .addCase(fetchProducts.fulfilled, (state, action) => {
         state.loading = false;
-        state.items = action.payload;
+        mergeDelta(state, action.payload, byName);
       })
       .addCase(fetchProducts.rejected, (state, action) => {
         state.loading = false;
@@ -1,16 +1,17 @@
 import { createSlice, createAsyncThunk } from '@reduxjs/toolkit';
 import axios from 'axios';
+import { salesAPI, apiUtils } from '../../services/api';
+import { mergeDelta, newestFirst } from '../sync';
 
 const API_URL = 'http://localhost:8000/api';
 
 export const fetchSales = createAsyncThunk(
   'sales/fetchAll',
-  async (_, { rejectWithValue }) => {
+  async (_, { getState, rejectWithValue }) => {
     try {
-      const response = await axios.get(`${API_URL}/sales/`);
-      return response.data;
+      return await salesAPI.sync(getState().sales.syncToken);
     } catch (error) {
-      return rejectWithValue(error.response.data);
+      return rejectWithValue(apiUtils.handleError(error));
     }
   }
 );
@@ -27,32 +28,9 @@ export const createSale = createAsyncThunk(
   }
 );
 
-export const updateSale = createAsyncThunk(
-  'sales/update',
-  async ({ id, ...saleData }, { rejectWithValue }) => {
-    try {
-      const response = await axios.put(`${API_URL}/sales/${id}/`, saleData);
-      return response.data;
-    } catch (error) {
-      return rejectWithValue(error.response.data);
-    }
-  }
-);
-
-export const deleteSale = createAsyncThunk(
-  'sales/delete',
-  async (id, { rejectWithValue }) => {
-    try {
-      await axios.delete(`${API_URL}/sales/${id}/`);
-      return id;
-    } catch (error) {
-      return rejectWithValue(error.response.data);
-    }
-  }
-);
-
 const initialState = {
   items: [],
+  syncToken: null,
   loading: false,
   error: null,
 };
@@ -73,7 +51,7 @@ const saleSlice = createSlice({
       })
       .addCase(fetchSales.fulfilled, (state, action) => {
         state.loading = false;
-        state.items = action.payload;
+        mergeDelta(state, action.payload, newestFirst('sale_date'));
       })
       .addCase(fetchSales.rejected, (state, action) => {
         state.loading = false;
@@ -81,15 +59,6 @@ const saleSlice = createSlice({
       })
       .addCase(createSale.fulfilled, (state, action) => {
         state.items.push(action.payload);
-      })
-      .addCase(updateSale.fulfilled, (state, action) => {
-        const index = state.items.findIndex((item) => item.id === action.payload.id);
-        if (index !== -1) {
-          state.items[index] = action.payload;
-        }
-      })
-      .addCase(deleteSale.fulfilled, (state, action) => {
-        state.items = state.items.filter((item) => item.id !== action.payload);
       });
   },
 });
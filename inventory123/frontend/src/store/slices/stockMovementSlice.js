@@ -1,9 +1,44 @@
-import { createSlice } from '@reduxjs/toolkit';
+import { createSlice, createAsyncThunk } from '@reduxjs/toolkit';
+import { stockMovementsAPI, apiUtils } from '../../services/api';
+import { mergeDelta, newestFirst } from '../sync';
+
+export const fetchStockMovements = createAsyncThunk(
+  'stockMovements/fetchAll',
+  async (_, { getState, rejectWithValue }) => {
+    try {
+      return await stockMovementsAPI.sync(getState().stockMovements.syncToken);
+    } catch (error) {
+      return rejectWithValue(apiUtils.handleError(error));
+    }
+  }
+);
+
+const initialState = {
+  items: [],
+  syncToken: null,
+  loading: false,
+  error: null,
+};
 
 const stockMovementSlice = createSlice({
-  name: 'stockMovement',
-  initialState: [],
-  reducers: {}
+  name: 'stockMovements',
+  initialState,
+  reducers: {},
+  extraReducers: (builder) => {
+    builder
+      .addCase(fetchStockMovements.pending, (state) => {
+        state.loading = true;
+        state.error = null;
+      })
+      .addCase(fetchStockMovements.fulfilled, (state, action) => {
+        state.loading = false;
+        mergeDelta(state, action.payload, newestFirst('created_at'));
+      })
+      .addCase(fetchStockMovements.rejected, (state, action) => {
+        state.loading = false;
+        state.error = action.payload;
+      });
+  },
 });
 
-export default stockMovementSlice.reducer; 
\ No newline at end of file
+export default stockMovementSlice.reducer;
\ No newline at end of file
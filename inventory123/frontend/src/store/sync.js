@@ -0,0 +1,15 @@
+// Merge a delta-sync result ({ changed, deleted, token, reset }) into a slice's `items`
+export const mergeDelta = (state, { changed, deleted, token, reset }, compare) => {
+  const byId = new Map(reset ? [] : state.items.map((item) => [item.id, item]));
+  changed.forEach((item) => byId.set(item.id, item));
+  deleted.forEach((id) => byId.delete(id));
+  state.items = Array.from(byId.values());
+  if (compare) {
+    state.items.sort(compare);
+  }
+  state.syncToken = token;
+};
+
+export const byName = (a, b) => a.name.localeCompare(b.name);
+
+export const newestFirst = (field) => (a, b) => new Date(b[field]) - new Date(a[field]) || b.id - a.id;